@@ -1,7 +1,23 @@
 from flask import Flask
-from .config import load_configurations, configure_logging
+from .config import load_configurations, configure_logging, validate_access_token
+from .services.db import init_db
+from .services.migrations import init_migrations
+from .services.graph_client import init_graph_client
+from .services.outbound import init_outbound, dispatch
+from .services.progress import init_progress
+from .services.outbox import init_outbox
 from .services.scheduler_service import init_scheduler
-from .views import webhook_blueprint, debug_bp
+from .services.ingest import init_ingest
+from .services.dedup import init_dedup
+from .services.coalescer import init_coalescer
+from .services.response_cache import init_response_cache
+from .services.customer_service import init_customer_cache
+from .services.conversation_store import init_conversations
+from .services.llm_gateway import init_llm_gateway
+from .services.openai_service import init_openai
+from .services.recorder import init_recorder
+from .views import webhook_blueprint, debug_bp, metrics_bp, dispatch_coalesced
+from .utils.whatsapp_utils import send_message
 
 
 def create_app():
@@ -10,11 +26,57 @@ def create_app():
     app = Flask(__name__)
     load_configurations(app)
 
+    # Capa de datos: conexiones SQLite por thread (WAL) sobre DATABASE_PATH
+    init_db(app)
+
+    # Migraciones versionadas del esquema (PRAGMA user_version), no destructivas
+    init_migrations(app)
+
+    # Cliente compartido de la Graph API; valida el token al arrancar
+    validate_access_token(init_graph_client(app))
+
+    # Cola de salida con rate limiting (antes que el ingest: atexit drena en orden inverso)
+    init_outbound(app, send_fn=send_message)
+
+    # Outbox transaccional drenado por lotes a través del dispatcher
+    init_outbox(app, dispatch_fn=dispatch)
+
+    # Aviso de "procesando" sólo para respuestas lentas
+    init_progress(app, dispatch_fn=dispatch)
+
     # Inicializar scheduler con la instancia de la app
     init_scheduler(app)
 
+    # Pool de workers para procesar webhooks en background (INGEST_MODE=async)
+    init_ingest(app)
+
+    # Agrupación de ráfagas de mensajes del mismo remitente
+    init_coalescer(app, flush_fn=dispatch_coalesced)
+
+    # Deduplicación de webhooks redelivered
+    init_dedup(app)
+
+    # Cache de respuestas del LLM
+    init_response_cache(app)
+
+    # Cache de clientes por teléfono
+    init_customer_cache(app)
+
+    # Memoria de conversación por usuario
+    init_conversations(app)
+
+    # Cliente de OpenAI (OPENAI_BASE_URL) para el orchestrator y Whisper
+    init_openai(app)
+
+    # Límite de concurrencia, deadlines y circuit breaker hacia OpenAI
+    init_llm_gateway(app)
+
+    # Grabación opcional de webhooks para replay
+    init_recorder(app)
+
     # Registrar blueprints
     app.register_blueprint(webhook_blueprint)
     app.register_blueprint(debug_bp)
+    app.register_blueprint(metrics_bp)
 
     return app
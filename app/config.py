@@ -2,17 +2,14 @@ import sys
 import os
 from dotenv import load_dotenv
 import logging
-import requests
 from datetime import timedelta  # ← agregado para manejar el intervalo de recordatorios
 
-def validate_access_token(token):
+from app.utils.tracing import TraceIdFilter
+
+def validate_access_token(client):
+    """Valida el token contra /me usando el GraphClient compartido."""
     try:
-        resp = requests.get(
-            "https://graph.facebook.com/v23.0/me",
-            headers={"Authorization": f"Bearer {token}"}
-        )
-        if resp.status_code != 200:
-            raise ValueError("El token de acceso de WhatsApp no es válido o está expirado.")
+        client.me()
     except Exception as e:
         logging.error(f"[FATAL] Token inválido: {e}")
         raise SystemExit("Abortando: token de WhatsApp inválido.")
@@ -29,24 +26,108 @@ def load_configurations(app):
     app.config["PHONE_NUMBER_ID"]    = os.getenv("PHONE_NUMBER_ID")
     # Agregamos la versión de la API sin la 'v' delante
     app.config["GRAPH_API_VERSION"]  = os.getenv("GRAPH_API_VERSION", "23.0")
+    # Bases de las APIs externas; apuntarlas a benchmarks/mock_upstreams.py para pruebas de carga offline
+    app.config["GRAPH_API_BASE_URL"] = os.getenv("GRAPH_API_BASE_URL", "https://graph.facebook.com")
+    app.config["OPENAI_BASE_URL"]    = os.getenv("OPENAI_BASE_URL")
     app.config["VERIFY_TOKEN"]       = os.getenv("VERIFY_TOKEN")
     app.config["DEBUG"]              = os.getenv("DEBUG", "false").lower() == "true"
 
 
     # Ubicación de la base de datos SQLite para eventos y customers
     app.config["DATABASE_PATH"]      = os.getenv("DB_PATH", "threads_db.sqlite")
+    # Conexiones por thread en modo WAL; pragmas de la capa de datos (app/services/db.py)
+    app.config["DB_BUSY_TIMEOUT_MS"] = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    app.config["DB_SYNCHRONOUS"]     = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+    app.config["DB_CACHE_SIZE_KB"]   = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+    app.config["DB_MMAP_SIZE_MB"]    = int(os.getenv("DB_MMAP_SIZE_MB", "256"))
 
     # Días de antelación para el recordatorio (por defecto 1 día)
     advance_days = int(os.getenv("EVENT_ADVANCE_DAYS", "1"))
     app.config["EVENT_ADVANCE"]      = timedelta(days=advance_days)
 
+    # Ingest de webhooks: 'sync' procesa dentro del request, 'async' encola en un pool de workers
+    app.config["INGEST_MODE"]          = os.getenv("INGEST_MODE", "sync").lower()
+    app.config["INGEST_WORKERS"]       = int(os.getenv("INGEST_WORKERS", "4"))
+    app.config["INGEST_QUEUE_SIZE"]    = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+    app.config["INGEST_MAX_PER_KEY"]   = int(os.getenv("INGEST_MAX_PER_KEY", "20"))
+    app.config["INGEST_DRAIN_TIMEOUT"] = float(os.getenv("INGEST_DRAIN_TIMEOUT", "30"))
+
+    # Agrupación de ráfagas de texto por remitente (0 = desactivado; requiere INGEST_MODE=async)
+    app.config["COALESCE_WINDOW_MS"]   = int(os.getenv("COALESCE_WINDOW_MS", "0"))
+    app.config["COALESCE_MAX_WAIT_MS"] = int(os.getenv("COALESCE_MAX_WAIT_MS", str(app.config["COALESCE_WINDOW_MS"] * 3)))
+    app.config["COALESCE_MAX_MESSAGES"] = int(os.getenv("COALESCE_MAX_MESSAGES", "10"))
+
+    # Outbox transaccional: respuestas y recordatorios se persisten y un flusher los entrega
+    app.config["OUTBOX_ENABLED"]        = os.getenv("OUTBOX_ENABLED", "true").lower() == "true"
+    app.config["OUTBOX_BATCH_SIZE"]     = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    app.config["OUTBOX_FLUSH_INTERVAL"] = float(os.getenv("OUTBOX_FLUSH_INTERVAL", "1"))
+    app.config["OUTBOX_MAX_ATTEMPTS"]   = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+
+    # Cache en memoria phone → cliente delante de CustomerService.find_or_create (0 = desactivada)
+    app.config["CUSTOMER_CACHE_SIZE"]    = int(os.getenv("CUSTOMER_CACHE_SIZE", "10000"))
+
+    # Cache exacta de respuestas del LLM (0 = desactivada); persistencia opcional en SQLite
+    app.config["RESPONSE_CACHE_SIZE"]    = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    app.config["RESPONSE_CACHE_TTL"]     = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    app.config["RESPONSE_CACHE_PERSIST"] = os.getenv("RESPONSE_CACHE_PERSIST", "false").lower() == "true"
+
+    # Gateway del LLM: requests en vuelo, deadline por llamada (s), circuit breaker y hedging al p95
+    app.config["LLM_MAX_CONCURRENCY"]   = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    app.config["LLM_TIMEOUT"]           = float(os.getenv("LLM_TIMEOUT", "20"))
+    app.config["LLM_BREAKER_FAILURES"]  = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    app.config["LLM_BREAKER_RESET"]     = float(os.getenv("LLM_BREAKER_RESET", "30"))
+    app.config["LLM_HEDGE_ENABLED"]     = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    app.config["LLM_HEDGE_MIN_SAMPLES"] = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+    # Tool calls del LLM: pool para ejecutarlas en paralelo y timeout por defecto (s)
+    app.config["TOOL_WORKERS"]         = int(os.getenv("TOOL_WORKERS", "8"))
+    app.config["TOOL_TIMEOUT"]         = float(os.getenv("TOOL_TIMEOUT", "10"))
+
+    # Memoria de conversación por wa_id: ventana acotada por tokens + resumen de lo anterior
+    app.config["CONVERSATION_ENABLED"]        = os.getenv("CONVERSATION_ENABLED", "true").lower() == "true"
+    app.config["CONVERSATION_TOKEN_BUDGET"]   = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1000"))
+    app.config["CONVERSATION_SUMMARY_TOKENS"] = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "250"))
+    app.config["CONVERSATION_CACHE_SIZE"]     = int(os.getenv("CONVERSATION_CACHE_SIZE", "1000"))
+    app.config["CONVERSATION_IDLE_TIMEOUT"]   = float(os.getenv("CONVERSATION_IDLE_TIMEOUT", "1800"))
+    app.config["CONVERSATION_RETENTION_DAYS"] = float(os.getenv("CONVERSATION_RETENTION_DAYS", "30"))
+
+    # Aviso de progreso si la respuesta del LLM tarda: typing | read | text | none
+    app.config["PROGRESS_MODE"]         = os.getenv("PROGRESS_MODE", "typing").lower()
+    app.config["PROGRESS_THRESHOLD_MS"] = int(os.getenv("PROGRESS_THRESHOLD_MS", "2500"))
+
+    # Grabación de webhooks (teléfonos anonimizados) para benchmarks/replay_webhooks.py
+    app.config["RECORD_WEBHOOKS"]      = os.getenv("RECORD_WEBHOOKS", "false").lower() == "true"
+    app.config["RECORD_PATH"]          = os.getenv("RECORD_PATH", "requests.jsonl")
+    app.config["RECORD_SALT"]          = os.getenv("RECORD_SALT")
+
+    # Deduplicación de redeliveries de Meta por id de mensaje
+    app.config["DEDUP_ENABLED"]        = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    app.config["DEDUP_CACHE_SIZE"]     = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+    app.config["DEDUP_TTL_SECONDS"]    = float(os.getenv("DEDUP_TTL_SECONDS", "86400"))
+
+    # Cliente de la Graph API (pool keep-alive + reintentos)
+    app.config["GRAPH_POOL_SIZE"]      = int(os.getenv("GRAPH_POOL_SIZE", "10"))
+    app.config["GRAPH_TIMEOUT"]        = float(os.getenv("GRAPH_TIMEOUT", "10"))
+    app.config["GRAPH_MAX_RETRIES"]    = int(os.getenv("GRAPH_MAX_RETRIES", "4"))
+
+    # Cola de salida: senders concurrentes y token buckets (msg/s) por número y por destinatario
+    app.config["OUTBOUND_WORKERS"]             = int(os.getenv("OUTBOUND_WORKERS", "4"))
+    app.config["OUTBOUND_QUEUE_SIZE"]          = int(os.getenv("OUTBOUND_QUEUE_SIZE", "1000"))
+    app.config["OUTBOUND_RATE_PER_NUMBER"]     = float(os.getenv("OUTBOUND_RATE_PER_NUMBER", "80"))
+    app.config["OUTBOUND_BURST_PER_NUMBER"]    = float(os.getenv("OUTBOUND_BURST_PER_NUMBER", "80"))
+    app.config["OUTBOUND_RATE_PER_RECIPIENT"]  = float(os.getenv("OUTBOUND_RATE_PER_RECIPIENT", "1"))
+    app.config["OUTBOUND_BURST_PER_RECIPIENT"] = float(os.getenv("OUTBOUND_BURST_PER_RECIPIENT", "5"))
 
-    validate_access_token(app.config["ACCESS_TOKEN"])
     logging.info(f"[DEBUG] ACCESS_TOKEN = {app.config['ACCESS_TOKEN'][:10]}...")
 
 def configure_logging():
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        format="%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s",
         stream=sys.stdout,
+        # Reemplaza lo que haya configurado un import anterior (si no, basicConfig no hace nada)
+        force=True,
     )
+    # Trace id del mensaje en curso en cada línea de log
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceIdFilter())
@@ -4,6 +4,8 @@ import logging
 import hashlib
 import hmac
 
+from app.utils import tracing
+
 
 def validate_signature(payload, signature):
     """
@@ -31,7 +33,9 @@ def signature_required(f):
             7:
         ]  # Removing 'sha256='
         logging.info(f"🔐 Verificando firma: {signature}")
-        if not validate_signature(request.data.decode("utf-8"), signature):
+        with tracing.span("signature"):
+            valid = validate_signature(request.data.decode("utf-8"), signature)
+        if not valid:
             logging.warning("❌ Firma inválida. Rechazando request.")
             return jsonify({"status": "error", "message": "Invalid signature"}), 403
         else:
@@ -5,11 +5,11 @@ from datetime import datetime, date
 import logging
 
 
-logging.basicConfig(level=logging.INFO)
 class BotLogic:
     """
     Lógica local para manejo de consultas de fecha:
      - validate_date_format: comprueba si el mensaje es una fecha válida DD/MM/YYYY.
+     - describe_valid_date: confirma en texto una fecha DD/MM/YYYY válida.
      - get_day_of_date: devuelve el día de la semana para fecha YYYY-MM-DD.
      - calculate_days_until: calcula días hasta fecha YYYY-MM-DD.
     """
@@ -23,6 +23,14 @@ class BotLogic:
         except ValueError:
             return False
 
+    def describe_valid_date(self, message: str) -> str | None:
+        """
+        Si el mensaje es sólo una fecha DD/MM/YYYY válida, devuelve la confirmación.
+        """
+        if not self.validate_date_format(message):
+            return None
+        return f"✅ La fecha {message.strip()} es válida."
+
     def get_day_of_date(self, message: str) -> str | None:
         """
         Si el mensaje incluye 'qué día cae' y una fecha YYYY-MM-DD, devuelve texto descriptivo.
@@ -0,0 +1,166 @@
+import atexit
+import logging
+import threading
+import time
+
+# Variables internas
+_coalescer = None
+
+
+class MessageCoalescer:
+    """
+    Agrupa ráfagas de mensajes de texto de un mismo remitente ("hola" / "mañana" /
+    "a las 5 recordame el dentista") en un único lote.
+     - add: agrega un mensaje al buffer de la clave y reinicia la ventana (debounce).
+     - flush: entrega el buffer de la clave de inmediato.
+     - requeue: devuelve al buffer un lote que no se pudo entregar y lo reintenta.
+    El lote se entrega a flush_fn(key, items) cuando pasan `window` segundos sin
+    mensajes nuevos, o `max_wait` desde el primero, o se llega a `max_messages`.
+    """
+    def __init__(self, window: float, flush_fn, max_wait: float | None = None, max_messages: int = 10):
+        self.window = window
+        self.max_wait = max_wait if max_wait is not None else window * 3
+        self.max_messages = max(1, max_messages)
+        self._flush_fn = flush_fn
+        self._buffers = {}  # key -> {"items": [...], "first": ts, "timer": Timer}
+        self._lock = threading.Lock()
+        self.messages_in = 0
+        self.batches_out = 0
+        self.requeued = 0
+
+    def add(self, key, item) -> None:
+        with self._lock:
+            self.messages_in += 1
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = self._buffers[key] = {"items": [], "first": time.monotonic(), "timer": None}
+            buf["items"].append(item)
+            if buf["timer"] is not None:
+                buf["timer"].cancel()
+            if len(buf["items"]) >= self.max_messages:
+                items = self._pop(key)
+            else:
+                remaining = self.max_wait - (time.monotonic() - buf["first"])
+                self._arm(key, buf, min(self.window, remaining))
+                return
+        self._deliver(key, items)
+
+    def requeue(self, key, items) -> None:
+        """
+        Devuelve al frente del buffer de key un lote que flush_fn no pudo entregar
+        (p. ej. con el ingest saturado) y reintenta la entrega en `window` segundos.
+        Los mensajes que llegaron mientras tanto quedan detrás, en orden.
+        """
+        with self._lock:
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = self._buffers[key] = {"items": [], "first": time.monotonic(), "timer": None}
+            elif buf["timer"] is not None:
+                buf["timer"].cancel()
+            buf["items"][:0] = items
+            self.batches_out -= 1
+            self.requeued += 1
+            self._arm(key, buf, self.window)
+
+    def is_buffered(self, key) -> bool:
+        with self._lock:
+            return key in self._buffers
+
+    def flush(self, key) -> None:
+        with self._lock:
+            items = self._pop(key)
+        if items:
+            self._deliver(key, items)
+
+    def flush_all(self) -> None:
+        with self._lock:
+            keys = list(self._buffers)
+        for key in keys:
+            self.flush(key)
+
+    def _arm(self, key, buf, delay: float) -> None:
+        timer = threading.Timer(max(0.0, delay), self.flush, args=(key,))
+        timer.daemon = True
+        buf["timer"] = timer
+        timer.start()
+
+    def _pop(self, key) -> list:
+        buf = self._buffers.pop(key, None)
+        if buf is None:
+            return []
+        if buf["timer"] is not None:
+            buf["timer"].cancel()
+        self.batches_out += 1
+        return buf["items"]
+
+    def _deliver(self, key, items) -> None:
+        if len(items) > 1:
+            logging.info(f"🧩 Agrupando {len(items)} mensajes de {key} en una sola consulta")
+        try:
+            self._flush_fn(key, items)
+        except Exception:
+            logging.error(f"❌ Error entregando lote agrupado de {key}", exc_info=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window_ms": int(self.window * 1000),
+                "max_wait_ms": int(self.max_wait * 1000),
+                "buffered_keys": len(self._buffers),
+                "messages_in": self.messages_in,
+                "batches_out": self.batches_out,
+                "requeued": self.requeued,
+                # Cada lote es una llamada al LLM en lugar de una por mensaje
+                "llm_calls_saved": self.messages_in - self.batches_out
+                    - sum(len(b["items"]) for b in self._buffers.values()),
+            }
+
+
+def init_coalescer(app, flush_fn):
+    """
+    Debe llamarse desde create_app después de init_ingest. Sólo se activa con
+    COALESCE_WINDOW_MS > 0 y INGEST_MODE=async: en modo sync no hay worker que
+    procese el lote una vez respondido el webhook.
+    """
+    global _coalescer
+    window_ms = app.config.get("COALESCE_WINDOW_MS", 0)
+    if window_ms <= 0:
+        return
+    if app.config.get("INGEST_MODE") != "async":
+        logging.warning("⚠️ COALESCE_WINDOW_MS requiere INGEST_MODE=async; agrupación desactivada")
+        return
+    _coalescer = MessageCoalescer(
+        window=window_ms / 1000,
+        flush_fn=flush_fn,
+        max_wait=app.config["COALESCE_MAX_WAIT_MS"] / 1000,
+        max_messages=app.config["COALESCE_MAX_MESSAGES"],
+    )
+    # atexit es LIFO: se registra después de init_ingest para vaciar los buffers antes del drain
+    atexit.register(_coalescer.flush_all)
+
+
+def is_enabled() -> bool:
+    return _coalescer is not None
+
+
+def add(key, item) -> None:
+    _coalescer.add(key, item)
+
+
+def flush(key) -> None:
+    if _coalescer is not None:
+        _coalescer.flush(key)
+
+
+def requeue(key, items) -> None:
+    _coalescer.requeue(key, items)
+
+
+def is_buffered(key) -> bool:
+    return _coalescer is not None and _coalescer.is_buffered(key)
+
+
+def stats() -> dict:
+    if _coalescer is None:
+        return {"enabled": False}
+    return {"enabled": True, **_coalescer.stats()}
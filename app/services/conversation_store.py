@@ -0,0 +1,280 @@
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+from app.services.db import get_connection
+from app.utils.lru import LRUCache
+
+# Variables internas
+_store = None
+
+SUMMARY_LINE_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata (~4 caracteres por token + overhead del mensaje), sin tokenizer."""
+    return len(text or "") // 4 + 4
+
+
+def summarize_turns(summary: str, turns: list) -> str:
+    """
+    Resumen extractivo local: agrega al resumen previo una línea recortada por
+    turno que sale de la ventana. No llama al modelo, así que no suma latencia.
+    """
+    lines = [summary] if summary else []
+    for turn in turns:
+        who = "Usuario" if turn.role == "user" else "Asistente"
+        text = " ".join(turn.content.split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS - 1] + "…"
+        lines.append(f"{who}: {text}")
+    return "\n".join(lines)
+
+
+@dataclass
+class Turn:
+    id: int
+    role: str
+    content: str
+    tokens: int
+    created_at: float
+
+
+@dataclass
+class Conversation:
+    summary: str = ""
+    turns: list = field(default_factory=list)  # ventana activa, del más viejo al más nuevo
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) * bool(self.summary) + sum(t.tokens for t in self.turns)
+
+
+class ConversationStore:
+    """
+    Memoria de conversación por wa_id.
+     - Nivel caliente: LRU en memoria con la ventana activa de cada chat.
+     - Persistencia: tablas SQLite conversation_turns / conversation_summaries.
+    La ventana se recorta a un presupuesto de tokens: los turnos más viejos se
+    pliegan en un resumen, así el prompt no crece aunque el chat sea largo.
+    Tras `idle_timeout` segundos sin actividad empieza una sesión nueva: la
+    ventana anterior pasa al resumen y el primer mensaje va sin historial.
+    Los turnos plegados se borran al resumirse, y las conversaciones sin
+    actividad en `retention` segundos se eliminan (texto de los usuarios incluido).
+    """
+    PURGE_EVERY = 500
+
+    def __init__(self, db_path: str, token_budget: int = 1000, summary_tokens: int = 250,
+                 maxsize: int = 1000, idle_timeout: float = 1800, retention: float = 30 * 86400,
+                 summarize_fn=summarize_turns):
+        self.db_path = db_path
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.idle_timeout = idle_timeout
+        self.retention = retention
+        self.summarize_fn = summarize_fn
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.appended = 0
+        self.rolled_up = 0
+        self.purged = 0
+        conn = get_connection(db_path)
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    wa_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_conversation_turns_wa_id ON conversation_turns (wa_id, id)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_summaries (
+                    wa_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    summarized_until INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _load(self, wa_id: str) -> Conversation:
+        conversation = self._cache.get(wa_id)
+        if conversation is not None:
+            return conversation
+        conn = get_connection(self.db_path)
+        row = conn.execute(
+            "SELECT summary, summarized_until FROM conversation_summaries WHERE wa_id = ?", (wa_id,)
+        ).fetchone()
+        summary, until = row if row else ("", 0)
+        rows = conn.execute(
+            "SELECT id, role, content, tokens, created_at FROM conversation_turns"
+            " WHERE wa_id = ? AND id > ? ORDER BY id",
+            (wa_id, until),
+        ).fetchall()
+        conversation = Conversation(summary=summary, turns=[Turn(*r) for r in rows])
+        self._cache.set(wa_id, conversation)
+        return conversation
+
+    def _idle(self, conversation: Conversation, now: float) -> bool:
+        return bool(conversation.turns) and now - conversation.turns[-1].created_at > self.idle_timeout
+
+    def history(self, wa_id: str) -> list:
+        """Mensajes para el prompt: resumen (si hay) + ventana activa. Vacío si la sesión expiró."""
+        with self._lock:
+            conversation = self._load(wa_id)
+            if not conversation.turns or self._idle(conversation, time.time()):
+                return []
+            messages = []
+            if conversation.summary:
+                messages.append({
+                    "role": "system",
+                    "content": f"Resumen de la conversación anterior:\n{conversation.summary}",
+                })
+            messages.extend({"role": t.role, "content": t.content} for t in conversation.turns)
+            return messages
+
+    def append(self, wa_id: str, user_text: str, reply_text: str) -> None:
+        """Registra el intercambio y recorta la ventana al presupuesto de tokens."""
+        now = time.time()
+        with self._lock:
+            conversation = self._load(wa_id)
+            conn = get_connection(self.db_path)
+            try:
+                with conn:
+                    rolled = []
+                    if self._idle(conversation, now):
+                        rolled, conversation.turns = conversation.turns, []
+                    for role, content in (("user", user_text), ("assistant", reply_text)):
+                        tokens = estimate_tokens(content)
+                        cur = conn.execute(
+                            "INSERT INTO conversation_turns (wa_id, role, content, tokens, created_at)"
+                            " VALUES (?, ?, ?, ?, ?)",
+                            (wa_id, role, content, tokens, now),
+                        )
+                        conversation.turns.append(Turn(cur.lastrowid, role, content, tokens, now))
+                    # Plegamos de a pares (pregunta + respuesta), siempre dejando el último intercambio
+                    while conversation.tokens > self.token_budget and len(conversation.turns) > 2:
+                        rolled.extend(conversation.turns[:2])
+                        conversation.turns = conversation.turns[2:]
+                    if rolled:
+                        conversation.summary = self._trim_summary(self.summarize_fn(conversation.summary, rolled))
+                        conn.execute(
+                            "INSERT INTO conversation_summaries (wa_id, summary, summarized_until, updated_at)"
+                            " VALUES (?, ?, ?, ?)"
+                            " ON CONFLICT(wa_id) DO UPDATE SET summary = excluded.summary,"
+                            " summarized_until = excluded.summarized_until, updated_at = excluded.updated_at",
+                            (wa_id, conversation.summary, rolled[-1].id, now),
+                        )
+                        # Lo plegado ya vive en el resumen: no se guarda el texto crudo
+                        conn.execute(
+                            "DELETE FROM conversation_turns WHERE wa_id = ? AND id <= ?",
+                            (wa_id, rolled[-1].id),
+                        )
+            except sqlite3.Error:
+                # La ventana en memoria quedó a medias: se recarga desde la BD en el próximo acceso
+                self._cache.pop(wa_id)
+                raise
+            self.appended += 1
+            self.rolled_up += len(rolled)
+            purge = self.appended % self.PURGE_EVERY == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """
+        Borra las conversaciones sin actividad en `retention` segundos y los turnos
+        ya plegados en el resumen (p. ej. de versiones que no los borraban).
+        Devuelve las filas eliminadas.
+        """
+        cutoff = time.time() - self.retention
+        conn = get_connection(self.db_path)
+        with self._lock:
+            with conn:
+                turns = conn.execute(
+                    "DELETE FROM conversation_turns WHERE created_at < ? RETURNING wa_id", (cutoff,)
+                ).fetchall()
+                summaries = conn.execute(
+                    "DELETE FROM conversation_summaries WHERE updated_at < ? RETURNING wa_id", (cutoff,)
+                ).fetchall()
+                rolled = conn.execute(
+                    """
+                    DELETE FROM conversation_turns WHERE id <= (
+                        SELECT summarized_until FROM conversation_summaries s
+                        WHERE s.wa_id = conversation_turns.wa_id
+                    )
+                    """
+                ).rowcount
+            # La ventana en memoria de esos chats ya no coincide con la BD
+            for wa_id in {row[0] for row in turns + summaries}:
+                self._cache.pop(wa_id)
+            deleted = len(turns) + len(summaries) + rolled
+            self.purged += deleted
+        if deleted:
+            logging.info(f"💬 Memoria de conversación: {deleted} filas vencidas o ya resumidas eliminadas")
+        return deleted
+
+    def _trim_summary(self, summary: str) -> str:
+        """Descarta las líneas más viejas del resumen hasta entrar en summary_tokens."""
+        lines = summary.split("\n")
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def stats(self) -> dict:
+        return {
+            "token_budget": self.token_budget,
+            "exchanges": self.appended,
+            "turns_summarized": self.rolled_up,
+            "rows_purged": self.purged,
+            "memory": self._cache.stats(),
+        }
+
+
+def init_conversations(app):
+    """Debe llamarse desde create_app. Respeta CONVERSATION_ENABLED."""
+    global _store
+    if not app.config.get("CONVERSATION_ENABLED", True):
+        return
+    _store = ConversationStore(
+        app.config["DATABASE_PATH"],
+        token_budget=app.config["CONVERSATION_TOKEN_BUDGET"],
+        summary_tokens=app.config["CONVERSATION_SUMMARY_TOKENS"],
+        maxsize=app.config["CONVERSATION_CACHE_SIZE"],
+        idle_timeout=app.config["CONVERSATION_IDLE_TIMEOUT"],
+        retention=app.config["CONVERSATION_RETENTION_DAYS"] * 86400,
+    )
+    _store.purge_expired()
+    logging.info(f"💬 Memoria de conversación: {app.config['CONVERSATION_TOKEN_BUDGET']} tokens por chat")
+
+
+def history(wa_id: str) -> list:
+    if _store is None:
+        return []
+    return _store.history(wa_id)
+
+
+def append(wa_id: str, user_text: str, reply_text: str) -> None:
+    if _store is None or not user_text or not reply_text:
+        return
+    try:
+        _store.append(wa_id, user_text, reply_text)
+    except sqlite3.Error as e:
+        # Perder un turno de memoria no debe impedir la respuesta
+        logging.error(f"💬 No se pudo guardar la conversación de {wa_id}: {e}")
+
+
+def stats() -> dict:
+    if _store is None:
+        return {"enabled": False}
+    return {"enabled": True, **_store.stats()}
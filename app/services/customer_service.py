@@ -1,4 +1,9 @@
 from .db import get_connection
+from app.utils.lru import LRUCache
+
+# Variables internas: cache phone → {id, phone, name} (el id de un teléfono nunca cambia)
+_cache = None
+
 
 class CustomerService:
     @staticmethod
@@ -15,25 +20,47 @@ class CustomerService:
         return { key: row[key] for key in row.keys() }
 
     @staticmethod
-    def find_or_create(phone: str) -> dict:
+    def find_or_create(phone: str, name: str | None = None) -> dict:
         """
         Busca un cliente por su número de WhatsApp; si no existe, lo crea.
-        Devuelve un dict con {id, phone, name}.
+        name es el nombre de perfil de WhatsApp: se guarda al crear y se
+        actualiza si cambió. Devuelve un dict con {id, phone, name}.
         """
+        # Sin contacto en el payload el "nombre" es el propio número
+        if not name or name == phone:
+            name = None
+        if _cache is not None:
+            customer = _cache.get(phone)
+            if customer is not None and (name is None or name == customer["name"]):
+                return dict(customer)
+
+        # Un único upsert atómico: dos primeros mensajes simultáneos del mismo
+        # número obtienen la misma fila (el UNIQUE de phone resuelve la carrera)
         conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, phone, name FROM customers WHERE phone = ?", (phone,)
-        )
-        row = cur.fetchone()
-        if row:
-            return {key: row[key] for key in row.keys()}
+        with conn:
+            row = conn.execute(
+                """
+                INSERT INTO customers (phone, name) VALUES (?, ?)
+                ON CONFLICT (phone) DO UPDATE SET name = COALESCE(?, customers.name)
+                RETURNING id, phone, name
+                """,
+                (phone, name or f"Cliente {phone}", name),
+            ).fetchone()
+        customer = {key: row[key] for key in row.keys()}
+        if _cache is not None:
+            _cache.set(phone, customer)
+        return dict(customer)
 
-        # Si no existe, crearlo con valores por defecto
-        cur.execute(
-            "INSERT INTO customers (phone, name) VALUES (?, ?)",
-            (phone, f"Cliente {phone}")
-        )
-        conn.commit()
-        new_id = cur.lastrowid
-        return {"id": new_id, "phone": phone, "name": f"Cliente {phone}"}
\ No newline at end of file
+
+def init_customer_cache(app):
+    """Debe llamarse desde create_app. CUSTOMER_CACHE_SIZE=0 la desactiva."""
+    global _cache
+    if app.config.get("CUSTOMER_CACHE_SIZE", 0) <= 0:
+        return
+    _cache = LRUCache(maxsize=app.config["CUSTOMER_CACHE_SIZE"])
+
+
+def stats() -> dict:
+    if _cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_cache.stats()}
@@ -1,21 +1,87 @@
+import logging
 import sqlite3
-from threading import Lock
-
-# Para evitar problemas de concurrencia en Flask
-_conn = None
-_lock = Lock()
-
-def get_connection():
-    global _conn
-    if _conn is None:
-        # Conexión única para toda la app
-        _conn = sqlite3.connect(
-            'threads_db.sqlite',
-            check_same_thread=False,
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        _conn.row_factory = sqlite3.Row
-    return _conn
+import threading
+
+# Una conexión por thread y por archivo: sqlite3.Connection no es segura para
+# usar desde varios threads a la vez (ingest, tools, outbox y scheduler corren
+# en paralelo). Con WAL los lectores no bloquean al escritor ni entre sí.
+_local = threading.local()
+
+# Configuración de la capa de datos (la completa init_db desde app.config)
+_db_path = "threads_db.sqlite"
+_settings = {
+    "busy_timeout_ms": 5000,   # espera ante un writer concurrente antes de "database is locked"
+    "synchronous": "NORMAL",   # con WAL: durable ante crash del proceso, fsync sólo en checkpoints
+    "cache_size_kb": 16384,    # page cache por conexión
+    "mmap_size_mb": 256,       # lecturas vía mmap en lugar de read()
+}
+
+
+def configure(db_path: str, **settings) -> None:
+    """Fija la ruta y los pragmas para las conexiones que se abran de acá en adelante."""
+    global _db_path
+    if settings.get("synchronous") and settings["synchronous"].upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        raise ValueError(f"PRAGMA synchronous inválido: {settings['synchronous']}")
+    _db_path = db_path
+    _settings.update({k: v for k, v in settings.items() if v is not None})
+
+
+def connect(db_path: str | None = None) -> sqlite3.Connection:
+    """Conexión nueva con WAL y los pragmas configurados (el caller la administra)."""
+    conn = sqlite3.connect(
+        db_path or _db_path,
+        timeout=_settings["busy_timeout_ms"] / 1000,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+    )
+    conn.row_factory = sqlite3.Row
+    # journal_mode persiste en el archivo: sobre una BD ya en WAL es un no-op
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={_settings['synchronous']}")
+    conn.execute(f"PRAGMA busy_timeout={int(_settings['busy_timeout_ms'])}")
+    conn.execute(f"PRAGMA cache_size={-int(_settings['cache_size_kb'])}")
+    conn.execute(f"PRAGMA mmap_size={int(_settings['mmap_size_mb']) * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Las FKs de SQLite se aplican por conexión y vienen apagadas (ver migrations)
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def get_connection(db_path: str | None = None) -> sqlite3.Connection:
+    """
+    Conexión del thread actual a db_path (por defecto DATABASE_PATH). No hay que
+    cerrarla: vive lo que vive el thread. Las escrituras van en `with conn:` para
+    que un error haga rollback y no deje el lock de escritura tomado.
+    """
+    path = db_path or _db_path
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = connect(path)
+    return conn
+
+
+def close_connection() -> None:
+    """Cierra las conexiones del thread actual (p. ej. al terminar un worker)."""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+
 def get_db_path() -> str:
-    """Devuelve la ruta absoluta de la base de datos SQLite."""
-    return "threads_db.sqlite"
\ No newline at end of file
+    """Devuelve la ruta de la base de datos SQLite configurada."""
+    return _db_path
+
+
+def init_db(app):
+    """Debe llamarse desde create_app antes que cualquier servicio que use la BD."""
+    configure(
+        app.config["DATABASE_PATH"],
+        busy_timeout_ms=app.config.get("DB_BUSY_TIMEOUT_MS"),
+        synchronous=app.config.get("DB_SYNCHRONOUS"),
+        cache_size_kb=app.config.get("DB_CACHE_SIZE_KB"),
+        mmap_size_mb=app.config.get("DB_MMAP_SIZE_MB"),
+    )
+    mode = get_connection().execute("PRAGMA journal_mode").fetchone()[0]
+    logging.info(f"🗄️ SQLite en {_db_path} (journal_mode={mode}, synchronous={_settings['synchronous']})")
@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+
+from app.services.db import get_connection
+from app.utils.lru import LRUCache
+
+# Variables internas
+_dedup = None
+
+
+class MessageDeduplicator:
+    """
+    Descarta webhooks redelivered por Meta usando el id del mensaje de WhatsApp.
+    Primer nivel: LRU en memoria. Segundo nivel: tabla SQLite con expiración por TTL,
+    para sobrevivir reinicios y compartir estado entre procesos.
+    """
+    PURGE_EVERY = 500
+
+    def __init__(self, db_path: str, maxsize: int = 10000, ttl: float = 86400):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.duplicates = 0
+        self.new = 0
+        conn = get_connection(db_path)
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS processed_messages (
+                    message_id TEXT PRIMARY KEY,
+                    seen_at REAL NOT NULL
+                )
+                """
+            )
+
+    def seen(self, message_id: str) -> bool:
+        """
+        Registra message_id como procesado. Devuelve True si ya se había visto
+        dentro del TTL (es un duplicado y no hay que procesarlo de nuevo).
+        """
+        if message_id in self._cache:
+            with self._lock:
+                self.duplicates += 1
+            return True
+
+        now = time.time()
+        conn = get_connection(self.db_path)
+        with conn:
+            # INSERT OR IGNORE es atómico: si otro worker lo insertó primero, rowcount = 0
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO processed_messages (message_id, seen_at) VALUES (?, ?)",
+                (message_id, now),
+            )
+            duplicate = cur.rowcount == 0
+            if duplicate:
+                # Una fila expirada cuenta como mensaje nuevo
+                cur = conn.execute(
+                    "UPDATE processed_messages SET seen_at = ? WHERE message_id = ? AND seen_at < ?",
+                    (now, message_id, now - self.ttl),
+                )
+                duplicate = cur.rowcount == 0
+
+        self._cache.set(message_id, True)
+        purge = False
+        with self._lock:
+            if duplicate:
+                self.duplicates += 1
+            else:
+                self.new += 1
+                self._inserts += 1
+                purge = self._inserts % self.PURGE_EVERY == 0
+        if purge:
+            self.purge_expired()
+        return duplicate
+
+    def forget(self, message_id: str) -> None:
+        """Olvida message_id (p. ej. si no se pudo encolar) para que la redelivery se procese."""
+        self._cache.pop(message_id)
+        conn = get_connection(self.db_path)
+        with conn:
+            conn.execute("DELETE FROM processed_messages WHERE message_id = ?", (message_id,))
+
+    def purge_expired(self) -> int:
+        conn = get_connection(self.db_path)
+        with conn:
+            cur = conn.execute(
+                "DELETE FROM processed_messages WHERE seen_at < ?",
+                (time.time() - self.ttl,),
+            )
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        return {
+            # hits = redeliveries descartadas (llamadas a OpenAI evitadas)
+            "hits": self.duplicates,
+            "misses": self.new,
+            "memory": self._cache.stats(),
+        }
+
+
+def init_dedup(app):
+    """Debe llamarse desde create_app. Respeta DEDUP_ENABLED."""
+    global _dedup
+    if not app.config.get("DEDUP_ENABLED", True):
+        return
+    _dedup = MessageDeduplicator(
+        app.config["DATABASE_PATH"],
+        maxsize=app.config["DEDUP_CACHE_SIZE"],
+        ttl=app.config["DEDUP_TTL_SECONDS"],
+    )
+
+
+def is_duplicate(message_id: str | None) -> bool:
+    if _dedup is None or not message_id:
+        return False
+    if _dedup.seen(message_id):
+        logging.info(f"♻️ Mensaje {message_id} ya procesado, se ignora la redelivery")
+        return True
+    return False
+
+
+def forget(message_id: str | None) -> None:
+    if _dedup is not None and message_id:
+        _dedup.forget(message_id)
+
+
+def stats() -> dict:
+    if _dedup is None:
+        return {"enabled": False}
+    return {"enabled": True, **_dedup.stats()}
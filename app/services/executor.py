@@ -0,0 +1,168 @@
+import logging
+import queue
+import threading
+from collections import deque
+
+
+class QueueFullError(RuntimeError):
+    """La cola del executor está llena o el executor ya no acepta trabajo."""
+
+
+_STOP = object()
+
+
+class BoundedExecutor:
+    """
+    Pool de threads en proceso con cola acotada.
+     - submit: encola una tarea; lanza QueueFullError si no hay lugar.
+     - shutdown: deja de aceptar tareas y, si drain=True, espera que se vacíe la cola.
+    """
+    def __init__(self, workers: int = 4, queue_size: int = 100, name: str = "executor"):
+        self.name = name
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._threads = []
+        self._accepting = True
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, *args, **kwargs) -> None:
+        if not self._accepting:
+            with self._lock:
+                self._rejected += 1
+            raise QueueFullError(f"{self.name} está apagándose")
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise QueueFullError(f"{self.name}: cola llena ({self._queue.maxsize})")
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                fn, args, kwargs = item
+                try:
+                    fn(*args, **kwargs)
+                    with self._lock:
+                        self._completed += 1
+                except Exception:
+                    with self._lock:
+                        self._failed += 1
+                    logging.error(f"❌ [{self.name}] Error en tarea en background", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, drain: bool = True, timeout: float | None = None) -> None:
+        """
+        Deja de aceptar tareas. Con drain=True los workers terminan lo encolado
+        antes de salir; si no, se descartan las tareas pendientes.
+        """
+        if not self._accepting:
+            return
+        self._accepting = False
+        if not drain:
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+            except queue.Empty:
+                pass
+        logging.info(f"🛑 [{self.name}] Drenando {self._queue.qsize()} tareas pendientes...")
+        for _ in self._threads:
+            # put bloqueante: los sentinels van detrás de las tareas pendientes
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "accepting": self._accepting,
+            }
+
+
+class KeyedExecutor:
+    """
+    Ejecuta tareas agrupadas por clave (p. ej. wa_id del remitente) sobre un
+    BoundedExecutor compartido: las tareas de una misma clave corren en orden
+    estricto, una por vez; claves distintas corren en paralelo.
+    """
+    def __init__(self, pool: BoundedExecutor, max_per_key: int = 20):
+        self._pool = pool
+        self.max_per_key = max(1, max_per_key)
+        self._queues = {}  # key -> deque de tareas pendientes (incluye la que corre)
+        self._lock = threading.Lock()
+        self._rejected = 0
+
+    def submit(self, key, fn, *args, **kwargs) -> None:
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                q = self._queues[key] = deque()
+            if len(q) >= self.max_per_key:
+                self._rejected += 1
+                raise QueueFullError(f"{self._pool.name}: cola llena para {key} ({self.max_per_key})")
+            q.append((fn, args, kwargs))
+            if len(q) > 1:
+                # Ya hay un drain en curso para esta clave: la tarea corre cuando le toque
+                return
+            try:
+                self._pool.submit(self._drain, key)
+            except QueueFullError:
+                del self._queues[key]
+                self._rejected += 1
+                raise
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                fn, args, kwargs = self._queues[key][0]
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logging.error(f"❌ [{self._pool.name}] Error en tarea para {key}", exc_info=True)
+            with self._lock:
+                q = self._queues[key]
+                q.popleft()
+                if not q:
+                    del self._queues[key]
+                    return
+                # Cedemos el worker a otras claves; si el pool no acepta, seguimos acá
+                try:
+                    self._pool.submit(self._drain, key)
+                    return
+                except QueueFullError:
+                    continue
+
+    def shutdown(self, drain: bool = True, timeout: float | None = None) -> None:
+        self._pool.shutdown(drain=drain, timeout=timeout)
+
+    def stats(self, top: int = 20) -> dict:
+        with self._lock:
+            depths = {key: len(q) for key, q in self._queues.items()}
+            rejected = self._rejected
+        deepest = sorted(depths.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        return {
+            "active_keys": len(depths),
+            "queued": sum(depths.values()),
+            "max_per_key": self.max_per_key,
+            "rejected_per_key": rejected,
+            "queue_depths": dict(deepest),
+            "pool": self._pool.stats(),
+        }
@@ -0,0 +1,180 @@
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Códigos de error de Meta que indican throttling (se reintentan con backoff)
+# https://developers.facebook.com/docs/whatsapp/cloud-api/support/error-codes
+THROTTLING_CODES = {
+    4,       # API Too Many Calls
+    17,      # API User Too Many Calls
+    32,      # API Page Too Many Calls
+    613,     # Calls to this API have exceeded the rate limit
+    80007,   # Rate limit issues (WABA)
+    130429,  # Rate limit hit (throughput del número)
+    131048,  # Spam rate limit hit
+    131056,  # Pair rate limit hit (demasiados mensajes al mismo destinatario)
+}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Variables internas
+_client = None
+
+
+class GraphAPIError(Exception):
+    def __init__(self, status: int, code: int | None, message: str):
+        super().__init__(f"Graph API {status} (code={code}): {message}")
+        self.status = status
+        self.code = code
+
+    @property
+    def throttled(self) -> bool:
+        return self.status == 429 or self.code in THROTTLING_CODES
+
+
+class GraphClient:
+    """
+    Cliente reutilizable de la Graph API de WhatsApp.
+     - Session con pool de conexiones keep-alive (sin handshake TLS por mensaje).
+     - Reintentos con backoff exponencial y jitter ante 429/5xx, errores de red
+       y códigos de throttling de Meta (respetando Retry-After si viene).
+     - Las requests no idempotentes (POST /messages) sólo se reintentan cuando
+       Meta seguro no las procesó: throttling o conexión que no llegó a abrirse.
+       Un timeout de lectura o un 5xx pueden llegar con el mensaje ya aceptado.
+    """
+    def __init__(
+        self,
+        access_token: str,
+        phone_number_id: str,
+        api_version: str = "23.0",
+        base_url: str = "https://graph.facebook.com",
+        pool_size: int = 10,
+        timeout: float = 10,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+    ):
+        self.phone_number_id = phone_number_id
+        self.base_url = f"{base_url.rstrip('/')}/v{api_version}"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.throttled = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {access_token}"})
+
+    def warm_up(self) -> None:
+        """Abre una conexión al host para que el primer mensaje no pague el handshake TLS."""
+        try:
+            self.session.head(self.base_url, timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.warning(f"⚠️ [graph] No se pudo precalentar la conexión: {e}")
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        # Full jitter: uniforme entre 0 y el tope exponencial
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _error_code(resp: requests.Response) -> tuple[int | None, str]:
+        try:
+            error = resp.json().get("error", {})
+            return error.get("code"), error.get("message", resp.text)
+        except ValueError:
+            return None, resp.text
+
+    @staticmethod
+    def _not_sent(e: requests.RequestException) -> bool:
+        """True si la request falló antes de enviarse (no se pudo abrir la conexión)."""
+        if isinstance(e, requests.ConnectTimeout):
+            return True
+        reason = getattr(e.args[0], "reason", e.args[0]) if e.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def request(self, method: str, path_or_url: str, idempotent: bool | None = None, **kwargs) -> requests.Response:
+        """
+        Hace la request con reintentos. path_or_url puede ser una ruta relativa a
+        la versión de la API ('/me') o una URL absoluta (descarga de media).
+        idempotent (por defecto según el método) decide si se reintenta ante
+        errores en los que la request pudo haberse procesado.
+        """
+        url = path_or_url if path_or_url.startswith("http") else f"{self.base_url}{path_or_url}"
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries or not (idempotent or self._not_sent(e)):
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"⚠️ [graph] {method} {url} falló ({e}); reintento en {delay:.2f}s")
+            else:
+                if resp.ok:
+                    return resp
+                code, message = self._error_code(resp)
+                error = GraphAPIError(resp.status_code, code, message)
+                if error.throttled:
+                    self.throttled += 1
+                retryable = error.throttled or (idempotent and resp.status_code in RETRYABLE_STATUS)
+                if not retryable or attempt >= self.max_retries:
+                    logging.error(f"❌ [graph] {method} {url} → {resp.status_code}:\n{resp.text}")
+                    raise error
+                delay = self._backoff(attempt, resp.headers.get("Retry-After"))
+                logging.warning(f"⚠️ [graph] {error}; reintento en {delay:.2f}s")
+            attempt += 1
+            self.retries += 1
+            time.sleep(delay)
+
+    def send_message(self, payload: dict) -> dict:
+        return self.request("POST", f"/{self.phone_number_id}/messages", idempotent=False, json=payload).json()
+
+    def get_media_url(self, media_id: str) -> str:
+        return self.request("GET", f"/{media_id}").json().get("url")
+
+    def download_media(self, url: str) -> bytes:
+        return self.request("GET", url).content
+
+    def me(self) -> dict:
+        return self.request("GET", "/me").json()
+
+    def stats(self) -> dict:
+        return {"retries": self.retries, "throttled": self.throttled}
+
+
+def init_graph_client(app) -> GraphClient:
+    """Debe llamarse desde create_app: construye el cliente compartido y precalienta el pool."""
+    global _client
+    _client = GraphClient(
+        access_token=app.config["ACCESS_TOKEN"],
+        phone_number_id=app.config["PHONE_NUMBER_ID"],
+        api_version=app.config["GRAPH_API_VERSION"],
+        base_url=app.config["GRAPH_API_BASE_URL"],
+        pool_size=app.config["GRAPH_POOL_SIZE"],
+        timeout=app.config["GRAPH_TIMEOUT"],
+        max_retries=app.config["GRAPH_MAX_RETRIES"],
+    )
+    _client.warm_up()
+    return _client
+
+
+def get_graph_client() -> GraphClient:
+    if _client is None:
+        raise RuntimeError("GraphClient no iniciado: llama a init_graph_client(app) desde create_app()")
+    return _client
@@ -0,0 +1,66 @@
+import atexit
+import logging
+import time
+
+from app.services.executor import BoundedExecutor, KeyedExecutor
+from app.utils import tracing
+
+# Variables internas
+_app = None
+_executor = None
+
+
+def init_ingest(app):
+    """
+    Debe llamarse desde create_app. Si INGEST_MODE es 'async', crea el pool de
+    workers que procesa los webhooks fuera del request HTTP, particionado por
+    remitente: mensajes de un mismo wa_id en orden, remitentes distintos en paralelo.
+    """
+    global _app, _executor
+    _app = app
+    if app.config.get("INGEST_MODE") != "async":
+        return
+    pool = BoundedExecutor(
+        workers=app.config["INGEST_WORKERS"],
+        queue_size=app.config["INGEST_QUEUE_SIZE"],
+        name="ingest",
+    )
+    _executor = KeyedExecutor(pool, max_per_key=app.config["INGEST_MAX_PER_KEY"])
+    atexit.register(shutdown_ingest)
+    logging.info(
+        f"📥 Ingest asíncrono: {pool.workers} workers, cola de {app.config['INGEST_QUEUE_SIZE']}, "
+        f"máx. {app.config['INGEST_MAX_PER_KEY']} por remitente"
+    )
+
+
+def is_async() -> bool:
+    return _executor is not None
+
+
+def submit(key, fn, *args, **kwargs) -> None:
+    """
+    Encola fn en la partición de key para ejecutarse en un worker dentro del
+    app_context. Lanza QueueFullError si la cola global o la de key están llenas.
+    """
+    app = _app
+    enqueued = time.perf_counter()
+
+    def _run():
+        tracing.observe("ingest_queue", time.perf_counter() - enqueued)
+        with app.app_context():
+            fn(*args, **kwargs)
+
+    _executor.submit(key, tracing.bind(_run))
+
+
+def shutdown_ingest():
+    """Drena la cola pendiente (hasta INGEST_DRAIN_TIMEOUT segundos) antes de salir."""
+    if _executor is None:
+        return
+    _executor.shutdown(drain=True, timeout=_app.config.get("INGEST_DRAIN_TIMEOUT"))
+
+
+def stats() -> dict:
+    if _executor is None:
+        return {"mode": "sync"}
+    return {"mode": "async", **_executor.stats()}
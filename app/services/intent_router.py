@@ -0,0 +1,220 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+
+from app.utils.datetime_utils import parse_spanish_datetime
+
+# Tipos de ruta
+ROUTE_BOTLOGIC = "botlogic"  # método de BotLogic que devuelve el texto (o None)
+ROUTE_TOOL = "tool"          # función local del Orchestrator + render de tool_renderers
+ROUTE_LOCAL = "local"        # respuesta armada en el Orchestrator sin herramientas
+ROUTE_LLM = "llm"            # OpenAI; target = función a forzar (o None = "auto")
+
+# Rasgos estructurales, compilados una sola vez
+FEATURES = {
+    "dmy_date": re.compile(r"^\s*\d{1,2}/\d{1,2}/\d{4}\s*$"),
+    "iso_date": re.compile(r"\b\d{4}-\d{2}-\d{2}\b"),
+    "short_date": re.compile(r"\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b"),
+    "clock_time": re.compile(r"\b(?:a\s+las?|[0-2]?\d:[0-5]\d)\b"),
+    "relative_time": re.compile(r"\b(?:dentro\s+de|en)\s+(?:\d+|un|una|media)\s+(?:hora|horas|minuto|minutos|min)\b"),
+}
+
+_LOCATION = re.compile(
+    r"\b(?:en|de|para)\s+([A-Za-zÁÉÍÓÚÑáéíóúñ][A-Za-zÁÉÍÓÚÑáéíóúñ ]{1,40}?)\s*(?:hoy|mañana|ahora|\?|$)",
+    re.IGNORECASE,
+)
+_NOT_A_PLACE = {"hoy", "mañana", "manana", "ahora", "la semana", "el finde"}
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes; conserva dígitos, '/' y ':' para los rasgos de fecha/hora."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def extract_location(text: str) -> dict | None:
+    match = _LOCATION.search(text.strip())
+    if not match:
+        return None
+    location = match.group(1).strip()
+    if location.lower() in _NOT_A_PLACE:
+        return None
+    return {"location": location}
+
+
+def extract_event(text: str) -> dict | None:
+    """Args de create_event si el parser local resuelve fecha, hora y actividad sin ambigüedad."""
+    parsed = parse_spanish_datetime(text)
+    if parsed is None or not parsed.confident:
+        return None
+    return {"date": parsed.date_str, "title": parsed.title}
+
+
+@dataclass
+class Intent:
+    name: str
+    route: str
+    target: str | None = None
+    keywords: dict = field(default_factory=dict)   # palabra/frase normalizada -> peso
+    features: dict = field(default_factory=dict)   # nombre de FEATURES -> peso
+    requires: tuple = ()                           # FEATURES obligatorios
+    trigger: bool = False                          # exige una palabra clave; los rasgos sólo suman encima
+    threshold: float = 1.0
+    extract: object = None                         # fn(texto) -> dict de args | None
+    llm_target: str | None = None                  # función a forzar en el LLM si extract devuelve None
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    score: float
+    route: str
+    target: str | None = None
+    args: dict = field(default_factory=dict)
+
+
+# Tabla de ruteo: el orden desempata puntajes iguales
+INTENTS = [
+    Intent(
+        "date_valid", ROUTE_BOTLOGIC, "describe_valid_date",
+        features={"dmy_date": 1.0}, requires=("dmy_date",),
+    ),
+    Intent(
+        "day_of_date", ROUTE_BOTLOGIC, "get_day_of_date",
+        keywords={"que dia cae": 1.0, "dia cae": 1.0}, requires=("iso_date",),
+    ),
+    Intent(
+        "days_until", ROUTE_BOTLOGIC, "calculate_days_until",
+        keywords={"cuantos dias faltan": 1.0, "faltan": 0.9}, requires=("iso_date",),
+        threshold=0.9,
+    ),
+    Intent(
+        "create_event", ROUTE_TOOL, "create_event",
+        keywords={
+            "agendar": 1.0, "agendame": 1.0, "programar": 1.0, "programame": 1.0,
+            "crear evento": 1.0, "recordar": 1.0, "recordame": 1.0,
+            "recuerdame": 1.0, "recordatorio": 1.0, "avisame": 1.0,
+        },
+        # Sin verbo de acción ("¿abren a las 9?", "¿qué tengo en la agenda?") no se fuerza create_event
+        features={"short_date": 0.6, "clock_time": 0.6, "relative_time": 0.6},
+        trigger=True,
+        extract=extract_event, llm_target="create_event",
+    ),
+    Intent(
+        "weather", ROUTE_TOOL, "get_weather",
+        keywords={
+            "clima": 1.0, "que tiempo hace": 1.0, "temperatura": 1.0, "pronostico": 1.0,
+            "llover": 1.0, "lluvia": 1.0, "llueve": 1.0,
+        },
+        extract=extract_location,
+    ),
+    Intent(
+        "lookup_customer", ROUTE_TOOL, "lookup_customer",
+        keywords={
+            "mis datos": 1.0, "mi informacion": 1.0, "quien soy": 1.0, "mi perfil": 1.0,
+            "mi numero de cliente": 1.0,
+        },
+    ),
+    Intent(
+        "capabilities", ROUTE_LOCAL, "describe_capabilities",
+        keywords={
+            "que podes hacer": 1.0, "que puedes hacer": 1.0, "que sabes hacer": 1.0,
+            "ayuda": 1.0, "funciones": 1.0, "comandos": 1.0,
+        },
+    ),
+]
+
+FALLBACK = IntentMatch("fallback", 0.0, ROUTE_LLM)
+COMPOUND = "compound"  # varias herramientas en un mismo mensaje
+
+
+class IntentRouter:
+    """
+    Motor único de intenciones para todos los mensajes entrantes.
+    Todas las palabras clave se compilan en una sola alternancia con grupos con
+    nombre, de modo que una pasada de finditer detecta las de todos los intents;
+    los rasgos de fecha/hora son regex precompiladas. Cada intent suma
+    max(peso de palabra clave) + pesos de rasgos y gana el de mayor puntaje
+    que supere su umbral; si ninguno, el mensaje va al LLM. Los intents con
+    `trigger` sólo compiten si apareció alguna de sus palabras clave.
+    """
+    def __init__(self, intents: list = None):
+        self.intents = intents or INTENTS
+        self._group_to_intent = {}
+        self._routes = {intent.name: intent.route for intent in self.intents}
+        alternatives = []
+        keywords = []
+        for i, intent in enumerate(self.intents):
+            for j, (keyword, weight) in enumerate(intent.keywords.items()):
+                keywords.append((keyword, f"k{i}_{j}", i, weight))
+        # Frases más largas primero para que "cuantos dias faltan" gane a "faltan"
+        for keyword, group, i, weight in sorted(keywords, key=lambda k: -len(k[0])):
+            pattern = r"\s+".join(re.escape(word) for word in keyword.split())
+            alternatives.append(f"(?P<{group}>{pattern})")
+            self._group_to_intent[group] = (i, weight)
+        self._keywords = re.compile(r"\b(?:" + "|".join(alternatives) + r")\b") if alternatives else None
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        self.local = 0
+        self.llm = 0
+
+    def match(self, text: str) -> list:
+        """Devuelve todos los IntentMatch que superan su umbral, de mayor a menor puntaje."""
+        normalized = normalize(text)
+        keyword_scores = {}
+        if self._keywords is not None:
+            for m in self._keywords.finditer(normalized):
+                i, weight = self._group_to_intent[m.lastgroup]
+                keyword_scores[i] = max(keyword_scores.get(i, 0.0), weight)
+
+        present = {name for name, regex in FEATURES.items() if regex.search(normalized)}
+        matches = []
+        for i, intent in enumerate(self.intents):
+            if any(req not in present for req in intent.requires):
+                continue
+            if intent.trigger and i not in keyword_scores:
+                continue
+            score = keyword_scores.get(i, 0.0) + sum(
+                weight for name, weight in intent.features.items() if name in present
+            )
+            if score < intent.threshold:
+                continue
+            args = {}
+            if intent.extract is not None:
+                args = intent.extract(text)
+                if args is None:
+                    # Falta un argumento o es ambiguo: el LLM decide
+                    matches.append((score, -i, IntentMatch(intent.name, score, ROUTE_LLM, intent.llm_target)))
+                    continue
+            matches.append((score, -i, IntentMatch(intent.name, score, intent.route, intent.target, args)))
+        return [m for _, _, m in sorted(matches, key=lambda t: (t[0], t[1]), reverse=True)]
+
+    def route(self, text: str) -> IntentMatch:
+        matches = self.match(text)
+        if not matches:
+            return FALLBACK
+        # Pedido compuesto ("recordame ... y decime el clima"): el LLM arma las tool calls en paralelo
+        tools = {m.intent for m in matches if self._routes[m.intent] == ROUTE_TOOL}
+        if len(tools) > 1:
+            return IntentMatch(COMPOUND, matches[0].score, ROUTE_LLM)
+        return matches[0]
+
+    def record(self, match: IntentMatch, handled_locally: bool) -> None:
+        with self._lock:
+            self.counts[match.intent] += 1
+            if handled_locally:
+                self.local += 1
+            else:
+                self.llm += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.local + self.llm
+            return {
+                "intents": dict(self.counts),
+                "handled_locally": self.local,
+                "sent_to_llm": self.llm,
+                "local_ratio": round(self.local / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,312 @@
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import openai
+
+from app.services.outbound import percentiles
+from app.utils import tracing
+
+# Variables internas
+_gateway = None
+
+# Respuesta cuando el circuito está abierto o no hay capacidad dentro del deadline
+CANNED_REPLY = (
+    "Estoy con mucha demanda en este momento y no puedo responderte bien ahora. "
+    "¿Me escribís de nuevo en unos minutos? 🙏"
+)
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+class LLMUnavailableError(RuntimeError):
+    """El gateway no pudo obtener respuesta: circuito abierto, saturado o deadline vencido."""
+
+
+def is_provider_failure(e: Exception) -> bool:
+    """
+    Fallas del proveedor, las únicas que cuentan para el breaker: timeouts, errores
+    de conexión, 429 y 5xx. Un 4xx (request inválida, auth, contexto excedido) es
+    un problema de la request y no dice nada de la salud de OpenAI.
+    """
+    if isinstance(e, (openai.APIConnectionError, TimeoutError, ConnectionError)):  # incluye APITimeoutError
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    closed → open tras `failure_threshold` fallas seguidas; open → half_open pasado
+    `reset_timeout`, donde se deja pasar una sola llamada de prueba: si sale bien
+    se cierra, si falla vuelve a abrirse.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """La llamada de prueba no llegó a salir (p. ej. sin capacidad): otra puede tomar su lugar."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened_count += 1
+                    logging.warning(f"🔌 Circuito del LLM abierto tras {self.failures} fallas")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.opened_count}
+
+
+class LatencyHistogram:
+    """Histograma acumulado (buckets fijos, estilo Prometheus) + muestras recientes para percentiles."""
+    def __init__(self, buckets=LATENCY_BUCKETS_MS, window: int = 500):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.sum_ms += ms
+            self._recent.append(ms)
+
+    def quantile(self, q: float, min_samples: int = 1) -> float | None:
+        with self._lock:
+            if len(self._recent) < min_samples:
+                return None
+            ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, n in zip((*self.buckets, "+Inf"), self.counts):
+                running += n
+                cumulative[str(bound)] = running
+            return {
+                "count": self.count,
+                "sum_ms": round(self.sum_ms, 1),
+                "buckets_ms": cumulative,
+                **percentiles(list(self._recent)),
+            }
+
+
+class LLMGateway:
+    """
+    Punto único de salida hacia chat.completions:
+     - semáforo global: como mucho `max_concurrency` requests en vuelo (hedges incluidos);
+     - deadline por llamada, propagado como timeout al cliente de OpenAI;
+     - circuit breaker (sólo fallas del proveedor): abierto, se responde CANNED_REPLY sin llamar;
+     - hedging opcional: si la respuesta tarda más que el p95 reciente del modelo,
+       se dispara un duplicado y gana la primera respuesta exitosa;
+     - histograma de latencia por modelo.
+    Basado en threads (no asyncio) como el resto de los pools de la app.
+    """
+    def __init__(self, max_concurrency: int = 8, timeout: float = 20, hedge: bool = False,
+                 hedge_min_samples: int = 20, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        # Un hilo por slot: los perdedores de un hedge terminan en background
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.rejected = 0
+        self.short_circuited = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def histogram(self, model: str) -> LatencyHistogram:
+        with self._lock:
+            if model not in self._histograms:
+                self._histograms[model] = LatencyHistogram()
+            return self._histograms[model]
+
+    def _launch(self, client, deadline: float, kwargs: dict):
+        """Envía una request al pool con un slot ya adquirido; el slot se libera al terminar."""
+        def call():
+            start = time.perf_counter()
+            try:
+                # El cliente de OpenAI acepta timeout por request: no dejamos hilos colgados más allá del deadline
+                return client.chat.completions.create(timeout=max(0.1, deadline - time.monotonic()), **kwargs), start
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self._slots.release()
+
+        with self._lock:
+            self.in_flight += 1
+        return self._pool.submit(tracing.bind(call))
+
+    def create(self, client, timeout: float | None = None, **kwargs):
+        """Equivalente a client.chat.completions.create(**kwargs) con las protecciones del gateway."""
+        model = kwargs.get("model", "unknown")
+        timeout = timeout or self.timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._lock:
+            self.calls += 1
+
+        if not self.breaker.allow():
+            with self._lock:
+                self.short_circuited += 1
+            raise LLMUnavailableError("circuito abierto")
+        if not self._slots.acquire(timeout=timeout):
+            # Saturación propia, no falla del proveedor: no cuenta para el breaker
+            self.breaker.release_probe()
+            with self._lock:
+                self.rejected += 1
+            raise LLMUnavailableError("sin capacidad para llamar al LLM")
+
+        histogram = self.histogram(model)
+        pending = {self._launch(client, deadline, kwargs)}
+        hedge = None
+        hedge_at = None
+        if self.hedge:
+            p95 = histogram.quantile(0.95, self.hedge_min_samples)
+            hedge_at = started + p95 / 1000 if p95 is not None else None
+        last_error = None
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait_until = hedge_at if hedge_at is not None and hedge is None else deadline
+            done, pending = wait(pending, timeout=max(0.0, min(wait_until, deadline) - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    completion, start = future.result()
+                except Exception as e:
+                    if not is_provider_failure(e):
+                        # Error de la request: el hedge fallaría igual y no se registra en el breaker
+                        self.breaker.release_probe()
+                        with self._lock:
+                            self.errors += 1
+                        raise
+                    # Error del proveedor: si hay otra request en vuelo, la esperamos
+                    last_error = e
+                    continue
+                histogram.observe((time.perf_counter() - start) * 1000)
+                self.breaker.record_success()
+                if future is hedge:
+                    with self._lock:
+                        self.hedges_won += 1
+                return completion
+            if not done and hedge is None and hedge_at is not None and time.monotonic() >= hedge_at:
+                # Sin respuesta al p95 del modelo: duplicamos la request si hay un slot libre ya mismo
+                hedge = False
+                if self._slots.acquire(blocking=False):
+                    hedge = self._launch(client, deadline, kwargs)
+                    pending.add(hedge)
+                    with self._lock:
+                        self.hedges_fired += 1
+                    logging.info(f"🐇 Hedge de {model} tras {(hedge_at - started) * 1000:.0f} ms")
+
+        self.breaker.record_failure()
+        if not pending and last_error is not None:
+            with self._lock:
+                self.errors += 1
+            raise last_error
+        with self._lock:
+            self.timeouts += 1
+        raise LLMUnavailableError(f"deadline de {timeout}s vencido para {model}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = dict(self._histograms)
+            counters = {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "short_circuited": self.short_circuited,
+                "hedging": self.hedge,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+            }
+        return {
+            **counters,
+            "breaker": self.breaker.stats(),
+            "latency": {model: h.stats() for model, h in models.items()},
+        }
+
+
+def init_llm_gateway(app):
+    """Debe llamarse desde create_app."""
+    global _gateway
+    _gateway = LLMGateway(
+        max_concurrency=app.config["LLM_MAX_CONCURRENCY"],
+        timeout=app.config["LLM_TIMEOUT"],
+        hedge=app.config["LLM_HEDGE_ENABLED"],
+        hedge_min_samples=app.config["LLM_HEDGE_MIN_SAMPLES"],
+        failure_threshold=app.config["LLM_BREAKER_FAILURES"],
+        reset_timeout=app.config["LLM_BREAKER_RESET"],
+    )
+    logging.info(
+        f"🚦 Gateway LLM: {app.config['LLM_MAX_CONCURRENCY']} en vuelo, deadline {app.config['LLM_TIMEOUT']}s, "
+        f"hedging {'on' if app.config['LLM_HEDGE_ENABLED'] else 'off'}"
+    )
+
+
+def create(client, **kwargs):
+    """Usa el gateway si está inicializado; si no (scripts, benchmarks), llama al cliente directo."""
+    if _gateway is None:
+        return client.chat.completions.create(**kwargs)
+    return _gateway.create(client, **kwargs)
+
+
+def stats() -> dict:
+    if _gateway is None:
+        return {"enabled": False}
+    return {"enabled": True, **_gateway.stats()}
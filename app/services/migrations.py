@@ -0,0 +1,159 @@
+import logging
+import sqlite3
+
+from app.services.db import connect
+from app.utils.datetime_utils import parse_iso8601, format_db_datetime
+
+# Migraciones del esquema de dominio (customers, eventos), en orden. La versión
+# aplicada se guarda en PRAGMA user_version. Nunca se borran datos: cada paso
+# es idempotente sobre una BD creada por el init_db.py histórico o vacía.
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+@migration(1, "esquema base de customers y eventos")
+def _baseline(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            phone TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            date TEXT NOT NULL,
+            customer_id INTEGER NOT NULL
+        )
+        """
+    )
+
+
+@migration(2, "eventos.date en formato canónico 'YYYY-MM-DD HH:MM:SS'")
+def _canonical_dates(conn):
+    updates, invalid = [], 0
+    for event_id, value in conn.execute("SELECT id, date FROM eventos"):
+        try:
+            canonical = format_db_datetime(parse_iso8601(value))
+        except (ValueError, TypeError):
+            invalid += 1
+            continue
+        if canonical != value:
+            updates.append((canonical, event_id))
+    conn.executemany("UPDATE eventos SET date = ? WHERE id = ?", updates)
+    logging.info(f"🗄️ Fechas normalizadas: {len(updates)}")
+    if invalid:
+        logging.warning(f"⚠️ {invalid} eventos con fecha no reconocida quedaron sin normalizar")
+
+
+@migration(3, "foreign key eventos.customer_id → customers.id e índices por fecha y cliente")
+def _eventos_foreign_key(conn):
+    # SQLite no agrega FKs con ALTER TABLE: se reconstruye la tabla
+    # (https://www.sqlite.org/lang_altertable.html#otheralter)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'eventos'").fetchone()
+    sequence = row[0] if row else None
+
+    conn.execute(
+        """
+        CREATE TABLE eventos_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            date TEXT NOT NULL,  -- 'YYYY-MM-DD HH:MM:SS' (datetime_utils.DB_FORMAT): ordenable como texto
+            customer_id INTEGER NOT NULL REFERENCES customers (id) ON DELETE CASCADE
+        )
+        """
+    )
+    # Eventos de clientes inexistentes: se apartan en vez de borrarse
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS eventos_orphans (
+            id INTEGER PRIMARY KEY,
+            titulo TEXT NOT NULL,
+            date TEXT NOT NULL,
+            customer_id INTEGER
+        )
+        """
+    )
+    orphans = conn.execute(
+        """
+        INSERT INTO eventos_orphans (id, titulo, date, customer_id)
+        SELECT id, titulo, date, customer_id FROM eventos
+        WHERE customer_id NOT IN (SELECT id FROM customers)
+        """
+    ).rowcount
+    conn.execute(
+        """
+        INSERT INTO eventos_new (id, titulo, date, customer_id)
+        SELECT id, titulo, date, customer_id FROM eventos
+        WHERE customer_id IN (SELECT id FROM customers)
+        """
+    )
+    conn.execute("DROP TABLE eventos")
+    conn.execute("ALTER TABLE eventos_new RENAME TO eventos")
+    if sequence is not None:
+        # Conservar el contador: ids de eventos borrados no se reutilizan (jobs reminder_event_{id})
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'eventos'", (sequence,))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_eventos_date ON eventos (date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_eventos_customer_id ON eventos (customer_id)")
+    if orphans:
+        logging.warning(f"⚠️ {orphans} eventos sin cliente movidos a eventos_orphans")
+
+
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path: str | None = None) -> list:
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción junto
+    con el nuevo user_version. Seguro con varios procesos arrancando a la vez:
+    BEGIN IMMEDIATE serializa y la versión se relee con el lock tomado.
+    Devuelve las versiones aplicadas.
+    """
+    conn = connect(db_path)
+    conn.isolation_level = None  # transacciones explícitas
+    # foreign_keys no se puede cambiar dentro de una transacción; la
+    # reconstrucción de tablas lo requiere apagado
+    conn.execute("PRAGMA foreign_keys=OFF")
+    applied = []
+    try:
+        for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if current_version(conn) >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if current_version(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                logging.info(f"🗄️ Migración {version}: {description}")
+                fn(conn)
+                violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(f"migración {version}: {len(violations)} violaciones de foreign key")
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
+
+
+def init_migrations(app):
+    """Debe llamarse desde create_app después de init_db."""
+    applied = migrate(app.config["DATABASE_PATH"])
+    if applied:
+        logging.info(f"🗄️ Esquema migrado a la versión {applied[-1]}")
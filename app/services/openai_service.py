@@ -6,6 +6,7 @@ import logging
 from dotenv import load_dotenv
 from openai import OpenAI
 from .orchestrator import Orchestrator
+from app.utils import tracing
 
 # Cargamos variables de entorno
 load_dotenv()
@@ -13,11 +14,25 @@ load_dotenv()
 # Inicializar cliente de OpenAI con la API Key del entorno
 # Elimina la línea siguiente si se prefiere tomar la API Key hardcodeada (no recomendado)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+# None → endpoint oficial; configurable para usar benchmarks/mock_upstreams.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 
 # Instanciamos el orchestrator para function-calling
 orchestrator = Orchestrator(client)
 
+
+def init_openai(app):
+    """
+    Debe llamarse desde create_app. Reconstruye el cliente con OPENAI_BASE_URL
+    de app.config (el de arriba sólo sirve a scripts que importan el módulo sin app).
+    """
+    global client
+    base_url = app.config.get("OPENAI_BASE_URL") or None
+    client = OpenAI(api_key=OPENAI_API_KEY, base_url=base_url)
+    orchestrator.client = client
+    logging.info(f"🤖 Cliente de OpenAI → {base_url or 'endpoint oficial'}")
+
 # (Opcional) Código legacy comentado para beta-assistants y threads
 # Mantener este bloque comentado para posible rollback
 # def upload_file(path):
@@ -64,9 +79,15 @@ def generate_response(message_body, wa_id, name):
     Utiliza function-calling para delegar lógica al orchestrator.
     """
     try:
-        return orchestrator.handle_message(message_body, wa_id)
+        return orchestrator.handle_message(message_body, wa_id, name)
     except Exception as e:
         logging.error(f"Error en orchestrator: {e}")
         # En caso de fallo, devolvemos un mensaje genérico
         return "Lo siento, ha ocurrido un error procesando tu solicitud. Por favor, intenta nuevamente más tarde."
 
+
+def transcribe_audio(audio: bytes, filename: str = "audio.ogg") -> str | None:
+    """Transcribe una nota de voz con Whisper usando el cliente compartido (sin archivo temporal)."""
+    with tracing.span("transcription"):
+        transcript = client.audio.transcriptions.create(model="whisper-1", file=(filename, audio))
+    return transcript.text
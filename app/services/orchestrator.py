@@ -1,9 +1,12 @@
-import re
 import json
 import os
+import hashlib
 import logging
-from datetime import timedelta, datetime
-from zoneinfo import ZoneInfo
+import time
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import timedelta
 
 from openai import OpenAI
 from flask import current_app
@@ -13,7 +16,13 @@ from app.services.bot_logic import BotLogic
 from app.services.customer_service import CustomerService
 from app.services.calendar_service import CalendarService
 from app.services.scheduler_service import schedule_event_reminder, scheduler
-from app.utils.datetime_utils import parse_iso8601
+from app.services import response_cache, conversation_store, llm_gateway
+from app.services.llm_gateway import LLMUnavailableError
+from app.services.tool_renderers import split_catalog
+from app.services.prompt_builder import PromptBuilder
+from app.services.intent_router import IntentRouter, IntentMatch, ROUTE_BOTLOGIC, ROUTE_LOCAL, ROUTE_TOOL
+from app.utils.datetime_utils import parse_iso8601, local_now
+from app.utils import tracing
 
 
 def log_http_response(response):
@@ -21,116 +30,283 @@ def log_http_response(response):
     logging.info(f"Content-type: {response.headers.get('content-type')}")
     logging.info(f"Body: {response.text}")
 
+@dataclass
+class ConversationContext:
+    """Estado de un mensaje en curso; se pasa explícito a las herramientas."""
+    phone: str
+    customer: dict
+    history: list = field(default_factory=list)
+
+    @property
+    def customer_id(self) -> int | None:
+        return self.customer.get("id")
+
+
 class Orchestrator:
+    # Funciones cuyo resultado no se cachea: efectos secundarios, datos del usuario o del momento
+    UNCACHEABLE_FUNCTIONS = {"create_event", "lookup_customer", "get_weather"}
+    # Funciones con efectos secundarios: se espera su resultado real, sin timeout.
+    # Cortarlas no las cancela (el evento se crearía igual) y el usuario reintentaría
+    SIDE_EFFECT_FUNCTIONS = {"create_event"}
+    # Pool y timeout por defecto de las tool calls (overridables con TOOL_WORKERS / TOOL_TIMEOUT)
+    DEFAULT_TOOL_WORKERS = 8
+    DEFAULT_TOOL_TIMEOUT = 10.0
+
     def __init__(self, client: OpenAI, catalog_path: str = "functions_catalog.json"):
         """
         Orchestrator que centraliza lógica local (botlogic) y function-calling.
         """
         self.client = client
         self.logic = BotLogic()
-        # Carga catálogo de funciones para el modelo
+        self.router = IntentRouter()
+        # Carga catálogo de funciones para el modelo y las plantillas de render local
         with open(catalog_path, encoding="utf-8") as f:
-            self.functions = json.load(f)
-
-    def handle_message(self, message: str, phone: str) -> str | dict:
-        # 0) Registramos o buscamos usuario automático
-        user = CustomerService.find_or_create(phone)
-        self.current_customer_id = user.get("id")
-        self.current_phone = phone
-
-        # 1) Preprocesamiento local usando botlogic
-        if self.logic.validate_date_format(message):
-            if re.search(r"\b(día cae|qué día)\b", message, re.IGNORECASE):
-                return self.logic.get_day_of_date(message)
-            return self.logic.calculate_days_until(message)
-
-        # 2) Detectar intención de crear evento o consultar clima
-        should_create_event = bool(
-            re.search(r"\b(agendar|programar|crear evento|reunión|recordar|recordame)\b", message, re.IGNORECASE)
-            or re.search(r"\d{1,2}/\d{1,2}/\d{4}", message)
-            or re.search(r"\ba\slas\b|\b[0-2]?\d:[0-5]\d", message)
-        )
-        initial_call = {"name": "create_event"} if should_create_event else "auto"
-        # 3) Construcción del prompt
-        local_now = datetime.now(ZoneInfo("America/Montevideo"))
-        today_str = local_now.strftime("%d/%m/%Y")
-        time_str = local_now.strftime("%H:%M")
-        system_prompt = (
-            "Eres un asistente de WhatsApp cálido y natural. "
-            "Responde con lenguaje claro, directo y humano. "
-            "Si el usuario pide clima, eventos o info de cliente, hazlo de forma amistosa. "
-            "Evita sonar robótico o enciclopédico. "
-            "Si te preguntan que puedes hacer responde con las funciones que puedes correr."
-            f"Nota: la fecha y hora actuales son {today_str} a las {time_str}."
-            "Cuando el usuario pida un recordatorio, sigue estas reglas:\n"
-            " 1. Si detectas “dentro de X horas/minutos”, calcula la hora actual y súmale ese intervalo.\n"
-            " 2. Si indica fecha con hora (ej. '25/6 a las 16:00'), úsala tal cual para agendar.\n"
-            " 3. Si sólo indica fecha sin hora(ej. '3/7 ir al dentista'), responda: “¿A qué hora te gustaría que te recuerde ir al dentista el 3/7?”\n"
-            " 4. Si no indica fecha, asume que es para hoy.\n"
-            " 5. Si no indica ni fecha ni hora (ej. “Recuérdame ir al super”), devuelva: “¿A qué hora te gustaría que te lo recuerde?”\n"
-            " 6. Extrae siempre la actividad a recordar (por ejemplo “ir al supermercado”) y devuelve el timestamp exacto para guardarlo en la BD."
-        )
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": message}
-        ]
-
-        # 4) Primera llamada al modelo con function-calling
-        completion = self.client.chat.completions.create(
-            model="gpt-4o-mini",
+            catalog = json.load(f)
+        self.functions, self.renderers = split_catalog(catalog)
+        self.tools = [{"type": "function", "function": f} for f in self.functions]
+        # Timeout por herramienta: clave local "timeout" del catálogo
+        self.tool_names = {f["name"] for f in self.functions}
+        self.tool_timeouts = {f["name"]: float(f["timeout"]) for f in catalog if "timeout" in f}
+        # Argumentos declarados por herramienta: lo que el modelo mande de más se descarta
+        self.tool_params = {
+            f["name"]: set(f.get("parameters", {}).get("properties", {})) for f in self.functions
+        }
+        self._tool_pool = None
+        self._tool_pool_lock = threading.Lock()
+        self.prompts = PromptBuilder(self.functions)
+        # Versión de prompt + catálogo (con plantillas) para la clave de la cache de respuestas:
+        # cambiar las instrucciones invalida la cache sin tocar nada más
+        self.prompt_version = hashlib.sha256(
+            f"{self.prompts.prefix_hash}:{json.dumps(catalog, sort_keys=True)}".encode("utf-8")
+        ).hexdigest()[:16]
+
+    def handle_message(self, message: str, phone: str, name: str | None = None) -> str | dict:
+        # 0) Registramos o buscamos usuario automático; su contexto viaja explícito
+        # (el orchestrator es un singleton compartido entre threads: no guarda estado por request)
+        with tracing.span("customer_lookup"):
+            customer = CustomerService.find_or_create(phone, name)
+        ctx = ConversationContext(phone=phone, customer=customer)
+
+        try:
+            reply = self._respond(message, ctx)
+        except LLMUnavailableError as e:
+            # Circuito abierto o deadline vencido: respuesta enlatada, sin ensuciar la memoria
+            logging.warning(f"🚦 LLM no disponible ({e}); respuesta enlatada para {phone}")
+            return llm_gateway.CANNED_REPLY
+        # Memoria de la conversación: permite seguimientos como "a las 5"
+        conversation_store.append(phone, message, self._reply_text(reply))
+        return reply
+
+    def _respond(self, message: str, ctx: ConversationContext) -> str | dict:
+        # 1) Ruteo de intenciones: BotLogic, funciones locales o LLM
+        with tracing.span("intent_router"):
+            match = self.router.route(message)
+        local = self._handle_locally(match, message, ctx)
+        self.router.record(match, handled_locally=local is not None)
+        if local is not None:
+            return local
+
+        # 2) Intención de crear evento: forzamos la función en el modelo
+        should_create_event = match.intent == "create_event"
+        tool_choice = {"type": "function", "function": {"name": match.target}} if match.target else "auto"
+
+        # Historial reciente (resumen + ventana acotada por tokens)
+        ctx.history = conversation_store.history(ctx.phone)
+
+        # Cache exacta: sólo sin historial (la respuesta depende del contexto), sin forzar
+        # create_event y para preguntas que no dependen de la fecha/hora del prompt.
+        # La decisión se toma antes de llamar al modelo: lo cacheable se comparte
+        # entre usuarios y por eso se responde sin los datos del cliente en el prompt
+        cacheable = not should_create_event and not ctx.history and not response_cache.is_time_sensitive(message)
+        if cacheable:
+            cached = response_cache.get(self._cache_version(), message)
+            if cached is not None:
+                logging.info("🗃️ Respuesta servida desde la cache")
+                return cached
+        # 3) Construcción del prompt: prefijo fijo + contexto dinámico al final
+        messages = self.prompts.build(message, customer=None if cacheable else ctx.customer, history=ctx.history)
+
+        # 4) Primera llamada al modelo con tools (puede pedir varias en paralelo)
+        completion = self._complete(
             messages=messages,
-            functions=self.functions,
-            function_call=initial_call
+            tools=self.tools,
+            tool_choice=tool_choice
         )
         msg = completion.choices[0].message
 
-        # 5) Si el modelo invocó una función, la ejecutamos
-        if getattr(msg, "function_call", None):
-            name = msg.function_call.name
+        # 5) Si el modelo invocó herramientas, las ejecutamos concurrentemente
+        tool_calls = getattr(msg, "tool_calls", None) or []
+        if tool_calls:
+            names = [call.function.name for call in tool_calls]
+            results = self._run_tool_calls(tool_calls, ctx)
+
+            # Una sola create_event: devolvemos el dict para que el template de WhatsApp lo procese
+            if names == ["create_event"] and "error" not in results[0]:
+                return {"title": results[0].get("title"), "date": results[0].get("date")}
+
+            cacheable = cacheable and not any(name in self.UNCACHEABLE_FUNCTIONS for name in names)
+
+            # Si todas las funciones declaran plantilla, respondemos sin segunda llamada al modelo
+            rendered = [self._render_tool(name, result) for name, result in zip(names, results)]
+            if all(text is not None for text in rendered):
+                content = "\n".join(rendered)
+                if cacheable:
+                    self._cache_put(message, content)
+                return content
+
+            # Reinyección: todos los resultados vuelven al modelo en una sola llamada
+            messages.append({
+                "role": "assistant",
+                "content": msg.content,
+                "tool_calls": [
+                    {
+                        "id": call.id,
+                        "type": "function",
+                        "function": {"name": call.function.name, "arguments": call.function.arguments},
+                    }
+                    for call in tool_calls
+                ],
+            })
+            for call, result in zip(tool_calls, results):
+                messages.append({"role": "tool", "tool_call_id": call.id, "content": json.dumps(result, default=str)})
+
+            final = self._complete(messages=messages)
+            content = final.choices[0].message.content
+            if cacheable:
+                self._cache_put(message, content)
+            return content
+
+        # 6) Si no hubo herramientas, devolvemos el mensaje directo
+        if cacheable:
+            self._cache_put(message, msg.content)
+        return msg.content
+
+    def _run_tool_calls(self, tool_calls: list, ctx: ConversationContext) -> list:
+        """
+        Ejecuta las tool calls en el pool, cada una con su timeout (clave "timeout"
+        del catálogo o TOOL_TIMEOUT), salvo las de SIDE_EFFECT_FUNCTIONS, que se
+        esperan hasta el final. Devuelve los resultados en el mismo orden; una
+        llamada que falla o vence devuelve {"error": ...} y el resto sigue.
+        """
+        try:
+            app = current_app._get_current_object()
+        except RuntimeError:
+            app = None
+        default_timeout = app.config.get("TOOL_TIMEOUT", self.DEFAULT_TOOL_TIMEOUT) if app else self.DEFAULT_TOOL_TIMEOUT
+
+        pool = self._get_tool_pool(app)
+        submitted = []
+        for call in tool_calls:
+            name = call.function.name
             try:
-                args = json.loads(msg.function_call.arguments or "{}")
+                args = json.loads(call.function.arguments or "{}")
             except json.JSONDecodeError:
                 args = {}
+            timeout = None if name in self.SIDE_EFFECT_FUNCTIONS else self.tool_timeouts.get(name, default_timeout)
+            submitted.append((name, timeout, time.monotonic(), pool.submit(tracing.bind(self._call_tool), app, name, args, ctx)))
+
+        results = []
+        for name, timeout, started, future in submitted:
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeout:
+                logging.warning(f"⏱️ La herramienta {name} superó {timeout}s")
+                results.append({"error": f"Function '{name}' timed out."})
+            except Exception as e:
+                logging.error(f"Error ejecutando {name}: {e}")
+                results.append({"error": f"Function '{name}' failed."})
+        return results
+
+    def _call_tool(self, app, name: str, args: dict, ctx: ConversationContext) -> dict:
+        if name not in self.tool_names or not hasattr(self, name):
+            return {"error": f"Function '{name}' not implemented."}
+        args = {k: v for k, v in args.items() if k in self.tool_params[name]}
+        with tracing.span("tool"):
+            if app is None:
+                return getattr(self, name)(ctx, **args)
+            # Los workers del pool no heredan el contexto de Flask (create_event usa current_app)
+            with app.app_context():
+                return getattr(self, name)(ctx, **args)
+
+    def _get_tool_pool(self, app) -> ThreadPoolExecutor:
+        with self._tool_pool_lock:
+            if self._tool_pool is None:
+                workers = app.config.get("TOOL_WORKERS", self.DEFAULT_TOOL_WORKERS) if app else self.DEFAULT_TOOL_WORKERS
+                self._tool_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool")
+            return self._tool_pool
+
+    def _render_tool(self, name: str, result: dict) -> str | None:
+        if name == "create_event" and isinstance(result, dict) and "error" not in result:
+            return self._reply_text(result)
+        return self.renderers.render(name, result)
+
+    def _cache_put(self, message: str, content: str | None) -> None:
+        """
+        Guarda una respuesta ya decidida como cacheable en _respond (sin historial
+        ni datos del cliente en el prompt, sin herramientas de UNCACHEABLE_FUNCTIONS).
+        """
+        if content:
+            response_cache.put(self._cache_version(), message, content)
+
+    def _cache_version(self) -> str:
+        # El contexto del prompt lleva la fecha de hoy: las entradas no sobreviven al día
+        return f"{self.prompt_version}:{local_now().date().isoformat()}"
+
+    @staticmethod
+    def _reply_text(reply: str | dict | None) -> str | None:
+        if isinstance(reply, dict):
+            return f"Evento «{reply.get('title')}» agendado para el {reply.get('date')}."
+        return reply
+
+    def _complete(self, **kwargs):
+        """Llamada a chat.completions (vía el gateway) que registra tokens cacheados y latencia."""
+        start = time.perf_counter()
+        with tracing.span("llm"):
+            completion = llm_gateway.create(self.client, model="gpt-4o-mini", **kwargs)
+        self.prompts.record_usage(
+            getattr(completion, "usage", None), elapsed_ms=(time.perf_counter() - start) * 1000
+        )
+        return completion
 
-            # Si es invocación de create_event, ejecutamos y devolvemos dict
-            if name == "create_event":
-                result = self.create_event(**args)
-                # Devolvemos el dict para que el template de WhatsApp lo procese
+    def _handle_locally(self, match: IntentMatch, message: str, ctx: ConversationContext) -> str | dict | None:
+        """
+        Ejecuta la ruta local del intent. Devuelve None si la ruta es el LLM
+        o si el handler local no pudo responder.
+        """
+        if match.route == ROUTE_BOTLOGIC:
+            return getattr(self.logic, match.target)(message)
+        if match.route == ROUTE_LOCAL:
+            return getattr(self, match.target)()
+        if match.route == ROUTE_TOOL:
+            result = getattr(self, match.target)(ctx, **match.args)
+            if match.target == "create_event":
+                # Fecha y actividad resueltas por el parser local: agendamos sin el LLM
                 return {"title": result.get("title"), "date": result.get("date")}
+            return self.renderers.render(match.target, result)
+        return None
 
-            # Para otras funciones, hacemos el flujo normal
-            if name == "lookup_customer":
-                args.setdefault("customer_id", self.current_customer_id)
-            if hasattr(self, name):
-                result = getattr(self, name)(**args)
-            else:
-                result = {"error": f"Function '{name}' not implemented."}
-
-            # Reinyección para que el LLM genere el mensaje final
-            messages.append({"role": "assistant", "content": None, "function_call": {"name": name, "arguments": msg.function_call.arguments}})
-            messages.append({"role": "function", "name": name, "content": json.dumps(result)})
-
-            final = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages
-            )
-            return final.choices[0].message.content
-
-        # 6) Si no hubo función, devolvemos el mensaje directo
-        return msg.content
+    def describe_capabilities(self) -> str:
+        lines = [f"• {f['description']}" for f in self.functions]
+        return (
+            "¡Hola! Esto es lo que puedo hacer por vos:\n"
+            + "\n".join(lines)
+            + "\n• Decirte qué día cae una fecha o cuántos días faltan (YYYY-MM-DD)."
+            + "\nY cualquier otra consulta, ¡preguntame!"
+        )
 
-    # --- Métodos expuestos al LLM ---
+    # --- Métodos expuestos al LLM (reciben el contexto de la conversación primero) ---
 
-    def get_weather(self, location: str, date: str) -> dict:
+    def get_weather(self, ctx: ConversationContext, location: str, date: str | None = None) -> dict:
         # Stub: reemplazar con llamada real a API de clima
         return {"location": location, "forecast": "sunny", "date": date}
 
-    def create_event(self, date: str, title: str) -> dict:
-        print(f"[DEBUG] Orchestrator.create_event → customer_id={self.current_customer_id}, date={date}, title={title}")
+    def create_event(self, ctx: ConversationContext, date: str, title: str) -> dict:
+        logging.debug(f"📅 create_event → customer_id={ctx.customer_id}, date={date}, title={title}")
         # 1) Guarda en la BD, pasando primero el customer_id
         cs = CalendarService()
         event_id = cs.create(
-            self.current_customer_id,  # <- customer_id
+            ctx.customer_id,           # <- customer_id
             date,                      # <- fecha como string "YYYY-MM-DD HH:MM:SS"
             title                      # <- título del evento
         )
@@ -152,6 +328,7 @@ class Orchestrator:
         # Devolvemos también title y date para templates
         return {"event_id": event_id, "date": date, "title": title}
 
-    def lookup_customer(self, customer_id: int) -> dict:
-        customer = CustomerService.get(customer_id)
+    def lookup_customer(self, ctx: ConversationContext) -> dict:
+        # Siempre el cliente de la conversación: nunca un ID elegido por el modelo
+        customer = CustomerService.get(ctx.customer_id)
         return {"customer": customer}
@@ -0,0 +1,242 @@
+import atexit
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.services.executor import QueueFullError
+from app.utils.lru import LRUCache
+from app.utils import tracing
+
+# Prioridades: menor valor sale primero
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REMINDER = 1
+
+# Variables internas
+_dispatcher = None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Consume un token si hay; si no, devuelve los segundos hasta el próximo."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        while (wait := self.try_acquire()) > 0:
+            time.sleep(wait)
+
+
+def percentiles(samples, points=(50, 95, 99)) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {f"p{p}": None for p in points}
+    return {
+        f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 2)
+        for p in points
+    }
+
+
+class OutboundDispatcher:
+    """
+    Cola de salida hacia la Graph API:
+     - cola de prioridad acotada (las respuestas interactivas salen antes que los recordatorios);
+     - token bucket por PHONE_NUMBER_ID (throughput del número) y por destinatario;
+     - orden FIFO por destinatario (nunca hay dos envíos en vuelo al mismo número);
+     - varios threads enviando en paralelo a destinatarios distintos.
+    """
+    def __init__(
+        self,
+        send_fn,
+        phone_number_id: str,
+        workers: int = 4,
+        queue_size: int = 1000,
+        rate_per_number: float = 80,
+        burst_per_number: float = 80,
+        rate_per_recipient: float = 1,
+        burst_per_recipient: float = 5,
+    ):
+        self._send_fn = send_fn
+        self.phone_number_id = phone_number_id
+        self.queue_size = queue_size
+        self._number_bucket = TokenBucket(rate_per_number, burst_per_number)
+        self._recipient_rate = (rate_per_recipient, burst_per_recipient)
+        self._recipient_buckets = LRUCache(maxsize=10000)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._ready = []     # heap (priority, seq, item)
+        self._delayed = []   # heap (ready_at, priority, seq, item): esperan token del destinatario
+        self._held = {}      # recipient -> deque de entradas esperando su turno
+        self._busy = {}      # recipient -> seq del envío en vuelo o demorado
+        self._pending = 0
+        self._accepting = True
+        self._latencies = deque(maxlen=2048)
+        self.sent = 0
+        self.failed = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outbound")
+        self._thread = threading.Thread(target=self._schedule, name="outbound-scheduler", daemon=True)
+        self._thread.start()
+
+    def dispatch(self, payload: dict, priority: int = PRIORITY_INTERACTIVE, recipient: str | None = None) -> Future:
+        """
+        Encola payload. recipient sólo hace falta cuando el payload no trae 'to'
+        (p. ej. marcas de leído / typing indicator).
+        """
+        future = Future()
+        item = {
+            "payload": payload,
+            "recipient": recipient or payload.get("to"),
+            "future": future,
+            "enqueued": time.monotonic(),
+            # El envío corre en otro thread: conserva el trace id del mensaje que lo originó
+            "send": tracing.bind(self._send_fn),
+        }
+        with self._cond:
+            if not self._accepting:
+                raise QueueFullError("outbound está apagándose")
+            if self._pending >= self.queue_size:
+                raise QueueFullError(f"outbound: cola llena ({self.queue_size})")
+            self._pending += 1
+            heapq.heappush(self._ready, (priority, next(self._seq), item))
+            self._cond.notify()
+        return future
+
+    def _recipient_bucket(self, recipient) -> TokenBucket:
+        bucket = self._recipient_buckets.get(recipient)
+        if bucket is None:
+            bucket = TokenBucket(*self._recipient_rate)
+            self._recipient_buckets.set(recipient, bucket)
+        return bucket
+
+    def _next(self):
+        """Bloquea hasta tener una entrada enviable; None si se apagó y no queda nada."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, priority, seq, item = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (priority, seq, item))
+                if not self._ready:
+                    if not self._accepting and self._pending == 0:
+                        return None
+                    timeout = self._delayed[0][0] - now if self._delayed else None
+                    self._cond.wait(timeout)
+                    continue
+
+                priority, seq, item = heapq.heappop(self._ready)
+                recipient = item["recipient"]
+                owner = self._busy.get(recipient)
+                if owner is not None and owner != seq:
+                    # Otro mensaje a este destinatario va antes: esperamos nuestro turno
+                    self._held.setdefault(recipient, deque()).append((priority, seq, item))
+                    continue
+                wait = self._recipient_bucket(recipient).try_acquire()
+                self._busy[recipient] = seq
+                if wait > 0:
+                    heapq.heappush(self._delayed, (now + wait, priority, seq, item))
+                    continue
+                return item
+
+    def _schedule(self):
+        while (item := self._next()) is not None:
+            # El token del número es global: si no hay, nadie puede salir y esperamos acá
+            self._number_bucket.acquire()
+            waited = time.monotonic() - item["enqueued"]
+            with self._cond:
+                self._latencies.append(waited * 1000)
+            tracing.observe("outbound_queue", waited)
+            self._pool.submit(self._send, item)
+
+    def _send(self, item):
+        ok = False
+        try:
+            item["future"].set_result(item["send"](item["payload"]))
+            ok = True
+        except Exception as e:
+            item["future"].set_exception(e)
+        finally:
+            recipient = item["recipient"]
+            # Los contadores se tocan desde varios senders: siempre bajo el lock, como lee stats()
+            with self._cond:
+                if ok:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                self._pending -= 1
+                self._busy.pop(recipient, None)
+                held = self._held.get(recipient)
+                if held:
+                    heapq.heappush(self._ready, held.popleft())
+                    if not held:
+                        del self._held[recipient]
+                self._cond.notify_all()
+
+    def shutdown(self, timeout: float | None = 30) -> None:
+        """Deja de aceptar envíos y espera (hasta timeout) que se vacíe la cola."""
+        with self._cond:
+            self._accepting = False
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": self._pending,
+                "ready": len(self._ready),
+                "delayed": len(self._delayed),
+                "held": sum(len(q) for q in self._held.values()),
+                "in_flight_recipients": len(self._busy),
+                "sent": self.sent,
+                "failed": self.failed,
+                "queue_latency_ms": percentiles(self._latencies),
+            }
+
+
+def init_outbound(app, send_fn):
+    """Debe llamarse desde create_app después de init_graph_client."""
+    global _dispatcher
+    _dispatcher = OutboundDispatcher(
+        send_fn,
+        phone_number_id=app.config["PHONE_NUMBER_ID"],
+        workers=app.config["OUTBOUND_WORKERS"],
+        queue_size=app.config["OUTBOUND_QUEUE_SIZE"],
+        rate_per_number=app.config["OUTBOUND_RATE_PER_NUMBER"],
+        burst_per_number=app.config["OUTBOUND_BURST_PER_NUMBER"],
+        rate_per_recipient=app.config["OUTBOUND_RATE_PER_RECIPIENT"],
+        burst_per_recipient=app.config["OUTBOUND_BURST_PER_RECIPIENT"],
+    )
+    atexit.register(_dispatcher.shutdown)
+    logging.info(
+        f"📤 Outbound: {app.config['OUTBOUND_WORKERS']} senders, "
+        f"{app.config['OUTBOUND_RATE_PER_NUMBER']} msg/s por número, "
+        f"{app.config['OUTBOUND_RATE_PER_RECIPIENT']} msg/s por destinatario"
+    )
+
+
+def dispatch(payload: dict, priority: int = PRIORITY_INTERACTIVE, recipient: str | None = None) -> Future:
+    if _dispatcher is None:
+        raise RuntimeError("Outbound no iniciado: llama a init_outbound(app) desde create_app()")
+    return _dispatcher.dispatch(payload, priority, recipient)
+
+
+def stats() -> dict:
+    if _dispatcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **_dispatcher.stats()}
@@ -0,0 +1,303 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+from app.services.db import get_connection, close_connection
+from app.services.executor import QueueFullError
+from app.services.outbound import PRIORITY_INTERACTIVE
+
+# Variables internas
+_flusher = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | sent | dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, next_attempt_at);
+"""
+
+
+def ensure_schema(conn) -> None:
+    conn.executescript(SCHEMA)
+
+
+def enqueue(conn, payload: dict, priority: int = PRIORITY_INTERACTIVE) -> int:
+    """
+    Inserta el mensaje en el outbox usando la conexión (y la transacción) del
+    llamador: se persiste atómicamente junto con el cambio de estado. No hace commit.
+    """
+    now = time.time()
+    cur = conn.execute(
+        """
+        INSERT INTO outbox (recipient, payload, priority, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (payload.get("to"), json.dumps(payload, ensure_ascii=False), priority, now, now),
+    )
+    return cur.lastrowid
+
+
+class OutboxFlusher:
+    """
+    Thread que drena el outbox por lotes a través del dispatcher de salida.
+    Entrega at-least-once: una fila sólo pasa a 'sent' cuando la Graph API respondió OK;
+    los fallos se reintentan con backoff exponencial hasta max_attempts ('dead').
+    Si el dispatcher está lleno la fila no cuenta como intento: se libera y se
+    reprograma, así la contrapresión sola nunca descarta un mensaje.
+    Una fila despachada conserva su lease (renovado) hasta que el envío termina:
+    aunque el dispatcher tarde (rate limit por destinatario, backoff ante 429),
+    nunca se reclama ni se despacha dos veces.
+    """
+    LEASE = 120          # segundos que una fila queda reservada para este flusher
+    RETENTION = 7 * 86400
+
+    def __init__(self, db_path: str, dispatch_fn, batch_size: int = 50, interval: float = 1.0,
+                 max_attempts: int = 8):
+        self.db_path = db_path
+        self._dispatch = dispatch_fn
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._in_flight = set()          # ids despachados cuyo envío no terminó
+        self._done = queue.SimpleQueue()  # (id, attempts, error) que completan los callbacks
+        self._lease_renewed = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.deferred = 0
+        self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+        self._thread.start()
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self):
+        conn = get_connection(self.db_path)
+        last_purge = 0.0
+        try:
+            while True:
+                try:
+                    flushed = self.flush_once(conn)
+                    if time.time() - last_purge > 3600:
+                        last_purge = time.time()
+                        with conn:
+                            conn.execute(
+                                "DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?",
+                                (time.time() - self.RETENTION,),
+                            )
+                except Exception:
+                    logging.error("❌ [outbox] Error drenando el outbox", exc_info=True)
+                    flushed = 0
+                if self._stop.is_set() and flushed == 0 and not self._in_flight:
+                    return
+                if flushed < self.batch_size:
+                    self._wake.wait(self.interval)
+                    self._wake.clear()
+        finally:
+            close_connection()
+
+    def _claim(self, conn, limit: int) -> list:
+        now = time.time()
+        with conn:
+            rows = conn.execute(
+                """
+                SELECT id, payload, priority, attempts FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                  AND (locked_until IS NULL OR locked_until < ?)
+                ORDER BY priority, id
+                LIMIT ?
+                """,
+                (now, now, limit),
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                cur = conn.execute(
+                    "UPDATE outbox SET locked_until = ? WHERE id = ? AND (locked_until IS NULL OR locked_until < ?)",
+                    (now + self.LEASE, row[0], now),
+                )
+                if cur.rowcount == 1:
+                    claimed.append(row)
+        return claimed
+
+    def _renew_leases(self, conn) -> None:
+        """Extiende el lease de las filas en vuelo antes de que venza."""
+        now = time.time()
+        if not self._in_flight or now - self._lease_renewed < self.LEASE / 3:
+            return
+        self._lease_renewed = now
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET locked_until = ? WHERE id = ?",
+                [(now + self.LEASE, outbox_id) for outbox_id in self._in_flight],
+            )
+
+    def _on_done(self, outbox_id: int, attempts: int, future) -> None:
+        # Corre en el thread del dispatcher: sólo encola el resultado, la BD la escribe el flusher
+        self._done.put((outbox_id, attempts, future.exception()))
+        self._wake.set()
+
+    def _record(self, conn, results: list) -> None:
+        now = time.time()
+        with conn:
+            for outbox_id, attempts, error in results:
+                self._in_flight.discard(outbox_id)
+                if error is None:
+                    self.sent += 1
+                    conn.execute(
+                        "UPDATE outbox SET status = 'sent', sent_at = ?, locked_until = NULL WHERE id = ?",
+                        (now, outbox_id),
+                    )
+                    continue
+                attempts += 1
+                status = "dead" if attempts >= self.max_attempts else "pending"
+                if status == "dead":
+                    self.dead += 1
+                    logging.error(f"☠️ [outbox] Mensaje {outbox_id} descartado tras {attempts} intentos: {error}")
+                else:
+                    self.retried += 1
+                    logging.warning(f"⚠️ [outbox] Mensaje {outbox_id} falló (intento {attempts}): {error}")
+                delay = random.uniform(0, min(600, 2 ** attempts))
+                conn.execute(
+                    """
+                    UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?,
+                                      locked_until = NULL, last_error = ?
+                    WHERE id = ?
+                    """,
+                    (status, attempts, now + delay, str(error)[:500], outbox_id),
+                )
+
+    def _defer(self, conn, ids: list) -> None:
+        """Libera filas que no se llegaron a despachar, sin sumar intentos."""
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET locked_until = NULL, next_attempt_at = ? WHERE id = ?",
+                [(time.time() + self.interval, outbox_id) for outbox_id in ids],
+            )
+        self.deferred += len(ids)
+
+    def flush_once(self, conn) -> int:
+        """
+        Registra los envíos terminados, renueva los leases en vuelo y despacha
+        filas nuevas hasta tener batch_size en vuelo. Devuelve las filas despachadas.
+        """
+        results = []
+        while True:
+            try:
+                results.append(self._done.get_nowait())
+            except queue.Empty:
+                break
+        if results:
+            self._record(conn, results)
+        self._renew_leases(conn)
+
+        room = self.batch_size - len(self._in_flight)
+        rows = self._claim(conn, room) if room > 0 else []
+        rejected = []
+        deferred = []
+        for outbox_id, payload, priority, attempts in rows:
+            if deferred:
+                deferred.append(outbox_id)
+                continue
+            try:
+                future = self._dispatch(json.loads(payload), priority)
+            except QueueFullError as e:
+                # Cola de salida llena: ni esta fila ni las siguientes se intentaron
+                logging.warning(f"⏳ [outbox] Dispatcher lleno, se reprograman las filas pendientes: {e}")
+                deferred.append(outbox_id)
+                continue
+            except Exception as e:
+                rejected.append((outbox_id, attempts, e))
+                continue
+            self._in_flight.add(outbox_id)
+            future.add_done_callback(
+                lambda f, outbox_id=outbox_id, attempts=attempts: self._on_done(outbox_id, attempts, f)
+            )
+        if rejected:
+            self._record(conn, rejected)
+        if deferred:
+            self._defer(conn, deferred)
+        return len(rows) - len(deferred)
+
+    def shutdown(self, timeout: float | None = 30) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        rows = get_connection(self.db_path).execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")
+        counts = {status: n for status, n in rows}
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "deferred": self.deferred,
+            "in_flight": len(self._in_flight),
+            "rows": counts,
+        }
+
+
+def init_outbox(app, dispatch_fn):
+    """
+    Debe llamarse desde create_app después de init_outbound (atexit es LIFO:
+    el flusher termina antes de que se apague el dispatcher).
+    """
+    global _flusher
+    if not app.config.get("OUTBOX_ENABLED", True):
+        return
+    conn = get_connection(app.config["DATABASE_PATH"])
+    with conn:
+        ensure_schema(conn)
+    _flusher = OutboxFlusher(
+        app.config["DATABASE_PATH"],
+        dispatch_fn,
+        batch_size=app.config["OUTBOX_BATCH_SIZE"],
+        interval=app.config["OUTBOX_FLUSH_INTERVAL"],
+        max_attempts=app.config["OUTBOX_MAX_ATTEMPTS"],
+    )
+    atexit.register(_flusher.shutdown)
+
+
+def is_enabled() -> bool:
+    return _flusher is not None
+
+
+def enqueue_message(payload: dict, priority: int = PRIORITY_INTERACTIVE) -> int:
+    """
+    Persiste un mensaje suelto en su propia transacción y despierta al flusher.
+    Para mensajes sin cambio de estado en la BD que deba confirmarse junto con
+    el envío (respuestas al webhook, aviso de inicio de evento); si lo hay, usar
+    enqueue(conn, ...) dentro de la transacción del llamador, como los recordatorios.
+    """
+    conn = get_connection(_flusher.db_path)
+    with conn:
+        outbox_id = enqueue(conn, payload, priority)
+    _flusher.notify()
+    return outbox_id
+
+
+def notify() -> None:
+    """Despierta al flusher tras un commit para no esperar al próximo intervalo."""
+    if _flusher is not None:
+        _flusher.notify()
+
+
+def stats() -> dict:
+    if _flusher is None:
+        return {"enabled": False}
+    return {"enabled": True, **_flusher.stats()}
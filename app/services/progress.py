@@ -0,0 +1,112 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from app.utils import tracing
+
+PROGRESS_TEXT = "⏳ Dame un momento, estoy procesando tu mensaje..."
+
+# Variables internas
+_notifier = None
+
+
+class ProgressNotifier:
+    """
+    Envía un aviso intermedio sólo si la respuesta tarda más de `threshold` segundos.
+    Modos:
+     - 'typing': marca el mensaje como leído y muestra "escribiendo..." (sin mensaje extra).
+     - 'read':   sólo marca el mensaje como leído.
+     - 'text':   envía PROGRESS_TEXT como mensaje de texto.
+     - 'none':   no envía nada.
+    """
+    MODES = ("typing", "read", "text", "none")
+
+    def __init__(self, threshold: float, mode: str, dispatch_fn):
+        if mode not in self.MODES:
+            raise ValueError(f"PROGRESS_MODE inválido: {mode} (opciones: {', '.join(self.MODES)})")
+        self.threshold = threshold
+        self.mode = mode
+        self._dispatch = dispatch_fn
+        self._lock = threading.Lock()
+        self.fast = 0
+        self.notified = 0
+
+    def _payload(self, recipient: str, message_id: str | None) -> dict | None:
+        if self.mode == "text":
+            return {
+                "messaging_product": "whatsapp",
+                "recipient_type": "individual",
+                "to": recipient,
+                "type": "text",
+                "text": {"preview_url": False, "body": PROGRESS_TEXT},
+            }
+        if not message_id:
+            return None
+        payload = {"messaging_product": "whatsapp", "status": "read", "message_id": message_id}
+        if self.mode == "typing":
+            payload["typing_indicator"] = {"type": "text"}
+        return payload
+
+    def _notify(self, recipient: str, message_id: str | None, fired: list):
+        payload = self._payload(recipient, message_id)
+        if payload is None:
+            return
+        fired.append(True)
+        with self._lock:
+            self.notified += 1
+        logging.info(f"⏳ Respuesta lenta para {recipient}: enviando aviso '{self.mode}'")
+        try:
+            self._dispatch(payload, recipient=recipient)
+        except Exception:
+            logging.warning("⚠️ No se pudo enviar el aviso de progreso", exc_info=True)
+
+    @contextmanager
+    def watch(self, recipient: str, message_id: str | None = None):
+        """Envuelve la generación de la respuesta; si supera el umbral, avisa al usuario."""
+        if self.mode == "none":
+            yield
+            return
+        fired = []
+        timer = threading.Timer(self.threshold, tracing.bind(self._notify), args=(recipient, message_id, fired))
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        finally:
+            timer.cancel()
+            if not fired:
+                with self._lock:
+                    self.fast += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "threshold_ms": int(self.threshold * 1000),
+            "fast_replies": self.fast,
+            "notices_sent": self.notified,
+        }
+
+
+def init_progress(app, dispatch_fn):
+    """Debe llamarse desde create_app después de init_outbound."""
+    global _notifier
+    _notifier = ProgressNotifier(
+        threshold=app.config["PROGRESS_THRESHOLD_MS"] / 1000,
+        mode=app.config["PROGRESS_MODE"],
+        dispatch_fn=dispatch_fn,
+    )
+
+
+@contextmanager
+def watch(recipient: str, message_id: str | None = None):
+    if _notifier is None:
+        yield
+        return
+    with _notifier.watch(recipient, message_id):
+        yield
+
+
+def stats() -> dict:
+    if _notifier is None:
+        return {"enabled": False}
+    return {"enabled": True, **_notifier.stats()}
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+
+from app.utils.datetime_utils import local_now
+
+# Instrucciones fijas: no interpolar aquí nada que cambie entre requests
+# (fecha, cliente, historial) o se pierde el prefijo cacheado del proveedor.
+SYSTEM_INSTRUCTIONS = (
+    "Eres un asistente de WhatsApp cálido y natural. "
+    "Responde con lenguaje claro, directo y humano. "
+    "Si el usuario pide clima, eventos o info de cliente, hazlo de forma amistosa. "
+    "Evita sonar robótico o enciclopédico. "
+    "Si te preguntan que puedes hacer responde con las funciones que puedes correr. "
+    "La fecha y hora actuales y los datos del cliente figuran en el mensaje de contexto, "
+    "justo antes del mensaje del usuario.\n"
+    "Cuando el usuario pida un recordatorio, sigue estas reglas:\n"
+    " 1. Si detectas “dentro de X horas/minutos”, calcula la hora actual y súmale ese intervalo.\n"
+    " 2. Si indica fecha con hora (ej. '25/6 a las 16:00'), úsala tal cual para agendar.\n"
+    " 3. Si sólo indica fecha sin hora(ej. '3/7 ir al dentista'), responda: “¿A qué hora te gustaría que te recuerde ir al dentista el 3/7?”\n"
+    " 4. Si no indica fecha, asume que es para hoy.\n"
+    " 5. Si no indica ni fecha ni hora (ej. “Recuérdame ir al super”), devuelva: “¿A qué hora te gustaría que te lo recuerde?”\n"
+    " 6. Extrae siempre la actividad a recordar (por ejemplo “ir al supermercado”) y devuelve el timestamp exacto para guardarlo en la BD."
+)
+
+
+class PromptBuilder:
+    """
+    Arma los mensajes para OpenAI con un prefijo estable byte a byte
+    (instrucciones + catálogo de funciones, idénticos en cada request) y el
+    contexto dinámico (fecha/hora, cliente, historial) al final, de modo que
+    el proveedor pueda reutilizar el prefijo cacheado (prompt caching
+    automático a partir de ~1024 tokens de prefijo común).
+    También acumula los cached_tokens que informa `usage` para medir la ganancia.
+    """
+    def __init__(self, functions: list, instructions: str = SYSTEM_INSTRUCTIONS):
+        self.functions = functions
+        self._prefix = ({"role": "system", "content": instructions},)
+        # Huella del prefijo: cambia sólo si cambian las instrucciones o el catálogo
+        self.prefix_hash = hashlib.sha256(
+            json.dumps([instructions, functions], sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:16]
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.calls_with_cache = 0
+        self._latency_ms = {"cached": 0.0, "uncached": 0.0}
+
+    def context(self, now: datetime | None = None, customer: dict | None = None) -> str:
+        now = now or local_now()
+        lines = [f"Contexto: hoy es {now.strftime('%d/%m/%Y')} y son las {now.strftime('%H:%M')} (America/Montevideo)."]
+        if customer and customer.get("name"):
+            lines.append(f"Cliente: {customer['name']} (#{customer.get('id')}).")
+        return "\n".join(lines)
+
+    def build(self, message: str, now: datetime | None = None,
+              customer: dict | None = None, history: list | None = None) -> list:
+        """
+        [instrucciones fijas] + [historial] + [contexto dinámico] + [mensaje del usuario].
+        El historial va antes del contexto porque sólo crece por el final entre turnos.
+        """
+        return [
+            *(dict(m) for m in self._prefix),
+            *(history or []),
+            {"role": "system", "content": self.context(now, customer)},
+            {"role": "user", "content": message},
+        ]
+
+    def record_usage(self, usage, elapsed_ms: float | None = None) -> None:
+        """Registra tokens del campo `usage` de la respuesta (prompt_tokens_details.cached_tokens)."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) if details is not None else 0) or 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+            self.cached_tokens += cached
+            if cached:
+                self.calls_with_cache += 1
+            if elapsed_ms is not None:
+                self._latency_ms["cached" if cached else "uncached"] += elapsed_ms
+        logging.debug(f"🧠 Tokens de prompt: {getattr(usage, 'prompt_tokens', 0)} ({cached} cacheados)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            uncached_calls = self.calls - self.calls_with_cache
+            return {
+                "prefix_hash": self.prefix_hash,
+                "calls": self.calls,
+                "calls_with_cache": self.calls_with_cache,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+                "avg_latency_ms": {
+                    "cached": round(self._latency_ms["cached"] / self.calls_with_cache, 1) if self.calls_with_cache else None,
+                    "uncached": round(self._latency_ms["uncached"] / uncached_calls, 1) if uncached_calls else None,
+                },
+            }
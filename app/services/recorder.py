@@ -0,0 +1,95 @@
+import copy
+import hashlib
+import json
+import logging
+import secrets
+import threading
+import time
+
+# Variables internas
+_recorder = None
+
+
+def pseudonymize_phone(phone: str, salt: str) -> str:
+    """
+    Reemplaza un número por otro ficticio y estable dentro de la grabación
+    (mismo número → mismo seudónimo), para conservar el agrupamiento por remitente.
+    """
+    digest = hashlib.sha256(f"{salt}:{phone}".encode("utf-8")).hexdigest()
+    return "999" + str(int(digest[:12], 16)).zfill(15)[-9:]
+
+
+def anonymize_payload(body: dict, salt: str) -> dict:
+    """
+    Copia del webhook con los teléfonos de usuarios (wa_id, from, recipient_id)
+    seudonimizados y el nombre de perfil reemplazado. El texto de los mensajes se
+    conserva porque determina el ruteo; no grabar tráfico con datos sensibles.
+    """
+    body = copy.deepcopy(body)
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for contact in value.get("contacts") or []:
+                if contact.get("wa_id"):
+                    contact["wa_id"] = pseudonymize_phone(contact["wa_id"], salt)
+                if "profile" in contact:
+                    contact["profile"] = {"name": f"Usuario {contact.get('wa_id', '')[-4:]}"}
+            for msg in value.get("messages") or []:
+                if msg.get("from"):
+                    msg["from"] = pseudonymize_phone(msg["from"], salt)
+            for status in value.get("statuses") or []:
+                if status.get("recipient_id"):
+                    status["recipient_id"] = pseudonymize_phone(status["recipient_id"], salt)
+    return body
+
+
+class TrafficRecorder:
+    """
+    Graba los webhooks recibidos, anonimizados, en un archivo JSON Lines
+    ({"ts": epoch, "body": payload} por línea) para reproducirlos con
+    benchmarks/replay_webhooks.py.
+    """
+    def __init__(self, path: str, salt: str | None = None):
+        self.path = path
+        # Sal aleatoria por proceso: los seudónimos no se pueden cruzar entre grabaciones
+        self.salt = salt or secrets.token_hex(16)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.failed = 0
+
+    def record(self, body: dict) -> None:
+        try:
+            line = json.dumps({"ts": round(time.time(), 3), "body": anonymize_payload(body, self.salt)},
+                              ensure_ascii=False)
+            with self._lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                self.recorded += 1
+        except (OSError, TypeError, ValueError, AttributeError) as e:
+            # Grabar es best-effort: nunca debe romper el webhook
+            with self._lock:
+                self.failed += 1
+            logging.warning(f"🎙️ No se pudo grabar el webhook: {e}")
+
+    def stats(self) -> dict:
+        return {"path": self.path, "recorded": self.recorded, "failed": self.failed}
+
+
+def init_recorder(app):
+    """Debe llamarse desde create_app. Sólo graba con RECORD_WEBHOOKS=true."""
+    global _recorder
+    if not app.config.get("RECORD_WEBHOOKS", False):
+        return
+    _recorder = TrafficRecorder(app.config["RECORD_PATH"], salt=app.config.get("RECORD_SALT"))
+    logging.info(f"🎙️ Grabando webhooks anonimizados en {app.config['RECORD_PATH']}")
+
+
+def record(body) -> None:
+    if _recorder is not None and isinstance(body, dict):
+        _recorder.record(body)
+
+
+def stats() -> dict:
+    if _recorder is None:
+        return {"enabled": False}
+    return {"enabled": True, **_recorder.stats()}
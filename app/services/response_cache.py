@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+
+from app.services.db import get_connection
+from app.utils.lru import LRUCache
+
+# Variables internas
+_cache = None
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+# Preguntas cuya respuesta depende de la fecha/hora que inyecta el prompt o del
+# momento en que se hacen ("¿qué hora es?", "¿llueve?"): nunca pasan por la cache
+_TIME_SENSITIVE = re.compile(
+    r"\b(?:hoy|ahora|ayer|manana|pasado|hora|horas|fecha|dia|dias|semana|mes|ano|"
+    r"clima|tiempo|temperatura|pronostico|lluvia|llueve|llover)\b"
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza el mensaje para que "¿Qué podés hacer?" y "que podes hacer" compartan entrada:
+    minúsculas, sin tildes, sin signos de puntuación y con espacios colapsados.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def is_time_sensitive(text: str) -> bool:
+    return bool(_TIME_SENSITIVE.search(normalize_text(text)))
+
+
+class ResponseCache:
+    """
+    Cache exacta de respuestas del LLM, con clave = hash(versión del prompt/catálogo + texto normalizado).
+     - Nivel 1: LRU en memoria con TTL por entrada.
+     - Nivel 2 (opcional): tabla SQLite para mantener la cache caliente entre reinicios.
+    """
+    def __init__(self, maxsize: int = 1000, ttl: float = 3600, db_path: str | None = None):
+        self.ttl = ttl
+        self.db_path = db_path
+        self._memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.disk_hits = 0
+        if db_path:
+            conn = get_connection(db_path)
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        key TEXT PRIMARY KEY,
+                        response TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                    """
+                )
+
+    @staticmethod
+    def make_key(version: str, text: str) -> str | None:
+        normalized = normalize_text(text)
+        if not normalized:
+            return None
+        return hashlib.sha256(f"{version}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, version: str, text: str) -> str | None:
+        key = self.make_key(version, text)
+        if key is None:
+            return None
+        response = self._memory.get(key)
+        if response is not None or not self.db_path:
+            return response
+        row = get_connection(self.db_path).execute(
+            "SELECT response, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        self.disk_hits += 1
+        self._memory.set(key, row[0], ttl=row[1] - time.time())
+        return row[0]
+
+    def set(self, version: str, text: str, response: str, ttl: float | None = None) -> None:
+        key = self.make_key(version, text)
+        if key is None or not response:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        self._memory.set(key, response, ttl=ttl)
+        if not self.db_path:
+            return
+        conn = get_connection(self.db_path)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, time.time() + ttl),
+            )
+            conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    def stats(self) -> dict:
+        return {"persistent": bool(self.db_path), "disk_hits": self.disk_hits, **self._memory.stats()}
+
+
+def init_response_cache(app):
+    """Debe llamarse desde create_app. RESPONSE_CACHE_SIZE=0 la desactiva."""
+    global _cache
+    if app.config.get("RESPONSE_CACHE_SIZE", 0) <= 0:
+        return
+    _cache = ResponseCache(
+        maxsize=app.config["RESPONSE_CACHE_SIZE"],
+        ttl=app.config["RESPONSE_CACHE_TTL"],
+        db_path=app.config["DATABASE_PATH"] if app.config.get("RESPONSE_CACHE_PERSIST") else None,
+    )
+    logging.info(f"🗃️ Cache de respuestas LLM: {app.config['RESPONSE_CACHE_SIZE']} entradas")
+
+
+def get(version: str, text: str) -> str | None:
+    if _cache is None:
+        return None
+    return _cache.get(version, text)
+
+
+def put(version: str, text: str, response: str) -> None:
+    if _cache is not None:
+        _cache.set(version, text, response)
+
+
+def stats() -> dict:
+    if _cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_cache.stats()}
@@ -1,10 +1,21 @@
 from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
-import sqlite3
+
+from app.services.db import get_connection
+from app.utils.datetime_utils import parse_iso8601
+from app.utils import tracing
 
 # Variables internas
 _app = None
 
+# Eventos pendientes al arrancar: rango sobre idx_eventos_date (fechas en formato canónico)
+UPCOMING_EVENTS_SQL = """
+    SELECT e.id, e.date, e.titulo, c.phone
+    FROM eventos e
+    JOIN customers c ON e.customer_id = c.id
+    WHERE e.date >= DATE('now')
+"""
+
 # Inicializa y arranca el scheduler independiente del contexto HTTP
 scheduler = BackgroundScheduler()
 scheduler.start()
@@ -29,9 +40,7 @@ def schedule_event_reminder(scheduler, event_id: int, db_path: str, advance: tim
     app = _app
 
     # Recuperar solo el evento indicado
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
+    result = get_connection(db_path).execute(
         """
         SELECT e.date, e.titulo, c.phone
         FROM eventos e
@@ -39,17 +48,12 @@ def schedule_event_reminder(scheduler, event_id: int, db_path: str, advance: tim
         WHERE e.id = ?
         """,
         (event_id,)
-    )
-    result = cursor.fetchone()
-    conn.close()
+    ).fetchone()
     if not result:
         return
 
     event_date_str, title, user_phone = result
-    try:
-        event_dt = datetime.strptime(event_date_str, "%Y-%m-%d %H:%M:%S")
-    except ValueError:
-        event_dt = datetime.strptime(event_date_str, "%Y-%m-%d %H:%M")
+    event_dt = parse_iso8601(event_date_str)
 
     # 1) Recordatorio anticipado
     reminder_dt = event_dt - advance
@@ -57,17 +61,27 @@ def schedule_event_reminder(scheduler, event_id: int, db_path: str, advance: tim
         reminder_dt = datetime.now() + timedelta(seconds=10)
 
     def _send_reminder():
-        with app.app_context():
-            from app.utils.whatsapp_utils import send_message, get_text_message_input
+        # Cada job abre su propio trace: sus logs y el envío quedan correlacionados
+        with tracing.trace(), app.app_context():
+            from app.utils.whatsapp_utils import get_text_message_input
+            from app.services.outbound import PRIORITY_REMINDER
+            from app.services import outbox, outbound
             text = f"⏰ ¡Recordatorio! Tenés el evento «{title}» el {event_date_str}."
             payload = get_text_message_input(user_phone, text)
-            send_message(payload)
+            if outbox.is_enabled():
+                # Borrado del evento y mensaje en la misma transacción: el flusher lo entrega
+                conn = get_connection(db_path)
+                with conn:
+                    conn.execute("DELETE FROM eventos WHERE id = ?", (event_id,))
+                    outbox.enqueue(conn, payload, PRIORITY_REMINDER)
+                outbox.notify()
+                return
+            # Sin outbox esperamos el envío: si falla no se borra el evento
+            outbound.dispatch(payload, PRIORITY_REMINDER).result()
             # Borrar evento tras el recordatorio
-            conn2 = sqlite3.connect(db_path)
-            cursor2 = conn2.cursor()
-            cursor2.execute("DELETE FROM eventos WHERE id = ?", (event_id,))
-            conn2.commit()
-            conn2.close()
+            conn = get_connection(db_path)
+            with conn:
+                conn.execute("DELETE FROM eventos WHERE id = ?", (event_id,))
 
     reminder_job_id = f"reminder_event_{event_id}"
     if scheduler.get_job(reminder_job_id):
@@ -86,11 +100,13 @@ def schedule_event_reminder(scheduler, event_id: int, db_path: str, advance: tim
         notify_dt = datetime.now() + timedelta(seconds=10)
 
     def _send_notification():
-        with app.app_context():
-            from app.utils.whatsapp_utils import send_message, get_text_message_input
+        # Cada job abre su propio trace: sus logs y el envío quedan correlacionados
+        with tracing.trace(), app.app_context():
+            from app.utils.whatsapp_utils import queue_message, get_text_message_input
+            from app.services.outbound import PRIORITY_REMINDER
             text = f"🚀 ¡Tu evento «{title}» está empezando ahora!"
             payload = get_text_message_input(user_phone, text)
-            send_message(payload)
+            queue_message(payload, PRIORITY_REMINDER)
 
     notify_job_id = f"notify_event_{event_id}"
     if scheduler.get_job(notify_job_id):
@@ -106,18 +122,7 @@ def schedule_event_reminder(scheduler, event_id: int, db_path: str, advance: tim
 
 def reschedule_all_reminders(scheduler, db_path: str):
     """Recorre la base de datos y programa todos los recordatorios y notificaciones."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT e.id, e.date, e.titulo, c.phone
-        FROM eventos e
-        JOIN customers c ON e.customer_id = c.id
-        WHERE e.date >= DATE('now')
-        """
-    )
-    events = cursor.fetchall()
-    conn.close()
+    events = get_connection(db_path).execute(UPCOMING_EVENTS_SQL).fetchall()
 
     for event_id, event_date, title, user_phone in events:
         schedule_event_reminder(
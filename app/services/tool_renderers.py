@@ -0,0 +1,65 @@
+import logging
+import threading
+
+# Claves del catálogo que son metadata local y no se envían a OpenAI
+# (render: plantilla de respuesta; timeout: segundos máximos de ejecución de la herramienta)
+LOCAL_KEYS = ("render", "timeout")
+
+
+class ToolRendererRegistry:
+    """
+    Plantillas en español para convertir el resultado de una función en la
+    respuesta final sin una segunda llamada al modelo. Se declaran en
+    functions_catalog.json con la clave "render" junto a cada función; la
+    plantilla usa la sintaxis de str.format sobre el dict resultado
+    (p. ej. "{customer[name]}").
+    """
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.fallbacks = 0
+
+    def register(self, name: str, template: str) -> None:
+        self._templates[name] = template
+
+    def has(self, name: str) -> bool:
+        return name in self._templates
+
+    def render(self, name: str, result: dict) -> str | None:
+        """
+        Devuelve el texto renderizado, o None si la función no tiene plantilla o el
+        resultado no encaja (error, campo faltante): en ese caso se reinyecta al LLM.
+        """
+        template = self._templates.get(name)
+        if template is None:
+            return None
+        try:
+            if not isinstance(result, dict) or "error" in result:
+                raise KeyError("error")
+            text = template.format_map(result)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logging.info(f"🧾 Sin render local para {name} ({e!r}); se reinyecta al modelo")
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        with self._lock:
+            self.rendered += 1
+        return text
+
+    def stats(self) -> dict:
+        return {"tools": sorted(self._templates), "rendered": self.rendered, "fallbacks": self.fallbacks}
+
+
+def split_catalog(catalog: list) -> tuple[list, ToolRendererRegistry]:
+    """
+    Separa el catálogo en (funciones para OpenAI, registro de renderers),
+    quitando de cada entrada las claves locales.
+    """
+    registry = ToolRendererRegistry()
+    functions = []
+    for entry in catalog:
+        if entry.get("render"):
+            registry.register(entry["name"], entry["render"])
+        functions.append({k: v for k, v in entry.items() if k not in LOCAL_KEYS})
+    return functions, registry
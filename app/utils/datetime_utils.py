@@ -1,28 +1,281 @@
 # app/utils/datetime_utils.py
-from datetime import datetime,date
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo("America/Montevideo")
+
+# Formato canónico con el que se guardan las fechas en la BD
+DB_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Formatos aceptados además de ISO-8601 (datetime.fromisoformat)
+_FALLBACK_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+)
+
+
+def local_now() -> datetime:
+    """Fecha y hora actuales en America/Montevideo, sin tzinfo (como se guardan en la BD)."""
+    return datetime.now(TZ).replace(tzinfo=None, second=0, microsecond=0)
+
 
 def parse_iso8601(date_str: str) -> datetime:
     """
     Intenta parsear cadenas ISO-8601 con o sin zona horaria,
-    o bien formatos 'YYYY-MM-DD HH:MM:SS' y 'YYYY-MM-DD'.
+    o bien formatos 'YYYY-MM-DD HH:MM[:SS]', 'YYYY-MM-DD', 'DD/MM/YYYY [HH:MM]'.
+    Sólo hora 'HH:MM' → asumimos la fecha de hoy en Montevideo.
     """
+    date_str = date_str.strip()
     try:
-        # Python 3.7+: soporta 'YYYY-MM-DD' o 'YYYY-MM-DDTHH:MM:SS'
+        # Python 3.11+: soporta 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM' y 'YYYY-MM-DDTHH:MM:SS'
         return datetime.fromisoformat(date_str)
     except ValueError:
-        # Intenta con espacios y segundos
+        pass
+    for fmt in _FALLBACK_FORMATS:
         try:
-            return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
+            return datetime.strptime(date_str, fmt)
         except ValueError:
-            # Solo fecha
-            try:
-                return datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                # Solo hora HH:MM → asumimos fecha de hoy
-                try:
-                    t = datetime.strptime(date_str, "%H:%M").time()
-                    today = date.today()
-                    return datetime.combine(today, t)
-                except ValueError:
-                    # Ningún formato válido
-                    raise ValueError(f"Formato de fecha inválido: {date_str}")
+            continue
+    try:
+        t = datetime.strptime(date_str, "%H:%M").time()
+        return datetime.combine(local_now().date(), t)
+    except ValueError:
+        # Ningún formato válido
+        raise ValueError(f"Formato de fecha inválido: {date_str}")
+
+
+def format_db_datetime(dt: datetime) -> str:
+    """Formato canónico y ordenable para guardar en la columna eventos.date."""
+    return dt.strftime(DB_FORMAT)
+
+
+# --- Parser de expresiones de fecha/hora en español ---
+
+_NUMBERS = {
+    "un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+    "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "once": 11, "doce": 12,
+    "quince": 15, "veinte": 20, "treinta": 30, "media": 0.5,
+}
+_WEEKDAYS = {"lunes": 0, "martes": 1, "miercoles": 2, "jueves": 3, "viernes": 4, "sabado": 5, "domingo": 6}
+_MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+_NUM = r"(\d+|" + "|".join(_NUMBERS) + r")"
+
+_RELATIVE = re.compile(
+    r"\b(?:dentro\s+de|en)\s+" + _NUM + r"\s+(horas?|hs|minutos?|mins?)(\s+y\s+media)?\b"
+)
+_ISO_DATE = re.compile(r"\b(?:el\s+)?(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_NUMERIC_DATE = re.compile(r"\b(?:el\s+(?:dia\s+)?)?(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2}|\d{4}))?\b")
+_TEXT_DATE = re.compile(
+    r"\b(?:el\s+(?:dia\s+)?)?(\d{1,2})\s+de\s+(" + "|".join(_MONTHS) + r")(?:\s+(?:de|del)\s+(\d{4}))?\b"
+)
+_WEEKDAY = re.compile(
+    r"\b(?:el\s+|este\s+|el\s+proximo\s+|proximo\s+)?(" + "|".join(_WEEKDAYS) + r")(?:\s+que\s+viene)?\b"
+)
+_DAY_WORD = re.compile(r"\b(pasado\s+manana|manana|hoy)\b")
+_TIME = re.compile(
+    r"\b(?:a\s+las?|a\s+eso\s+de\s+las?|tipo|para\s+las?)\s+(\d{1,2})(?:[:.h](\d{2}))?(?:\s*(?:hs|h|horas)\b)?"
+    r"(?:\s+(?:de|en|por)\s+la\s+(manana|tarde|noche)|\s*(am|pm))?\b"
+    r"|\b(\d{1,2})[:.](\d{2})(?:\s*(?:hs|h)\b)?(?:\s*(am|pm))?\b"
+    r"|\b(\d{1,2})\s*hs\b"
+)
+_NOON = re.compile(r"\b(?:al|a\s+el)\s+mediodia\b|\ba\s+la\s+medianoche\b")
+_TRIGGERS = re.compile(
+    r"\b(?:poneme|pone|pon|agregame|agrega|crea|crear|haceme|hace)\s+(?:un\s+)?(?:recordatorio|evento|alarma)"
+    r"|\b(?:recordame|recuerdame|recordarme|recorda|recordar|acordame|avisame|agendame|agendar|agenda"
+    r"|programame|programar|crear\s+evento|un\s+recordatorio|recordatorio)\b"
+    r"|\bpor\s+favor\b|\bporfa\b"
+)
+_LEADING = re.compile(r"^(?:(?:que|de|para|a|y|el|la)\s+)*", re.IGNORECASE)
+_TRAILING = re.compile(r"(?:\s+(?:y|de|el|la|a|para|que))+$", re.IGNORECASE)
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin tildes, carácter por carácter (misma longitud que el original)."""
+    out = []
+    for c in text:
+        base = "".join(x for x in unicodedata.normalize("NFKD", c.lower()) if not unicodedata.combining(x))
+        out.append(base if len(base) == 1 else c.lower())
+    return "".join(out)
+
+
+def _search(regex, folded: str, spans: list):
+    """Primer match de regex que no se solape con expresiones ya reconocidas."""
+    for m in regex.finditer(folded):
+        if all(m.end() <= start or m.start() >= end for start, end in spans):
+            return m
+    return None
+
+
+def _number(token: str) -> float:
+    return float(token) if token.isdigit() else _NUMBERS[token]
+
+
+@dataclass
+class ParsedDateTime:
+    """Resultado de parse_spanish_datetime. `when` está en hora local de Montevideo, sin tzinfo."""
+    when: datetime | None
+    title: str
+    has_date: bool
+    has_time: bool
+    explicit: bool = False  # el usuario pidió un recordatorio/evento ("recordame", "agendar"...)
+    ambiguous: bool = False  # hora sin período, fecha inexistente o momento ya pasado
+
+    @property
+    def confident(self) -> bool:
+        """
+        Pedido explícito, fecha y hora resueltas sin ambigüedad, en el futuro, y
+        una actividad a recordar: se puede agendar sin el LLM.
+        """
+        return (
+            self.explicit and not self.ambiguous and self.when is not None
+            and self.has_time and bool(self.title)
+        )
+
+    @property
+    def date_str(self) -> str | None:
+        return self.when.strftime("%Y-%m-%d %H:%M") if self.when else None
+
+
+def _resolve_hour(hour: int, minute: int, period: str | None) -> tuple[int, int] | None:
+    if period in ("tarde", "noche", "pm") and hour < 12:
+        hour += 12
+    elif period in ("manana", "am") and hour == 12:
+        hour = 0
+    elif period is None and 1 <= hour <= 7:
+        # "a las 5" sin más contexto suele ser de la tarde, pero "a las 7 ir al
+        # gimnasio" puede no serlo: se propone PM y el caller lo marca ambiguo
+        hour += 12
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return hour, minute
+
+
+def parse_spanish_datetime(text: str, now: datetime | None = None) -> ParsedDateTime | None:
+    """
+    Interpreta expresiones como "mañana a las 16", "dentro de 2 horas",
+    "25/6 a las 16:00", "el viernes a las 9 de la mañana" o "3 de julio a las 10"
+    en hora de Montevideo, y extrae la actividad a recordar quitando del texto las
+    palabras disparadoras y las expresiones de fecha/hora.
+    Devuelve None si no encuentra ninguna referencia temporal.
+    """
+    now = now or local_now()
+    folded = _fold(text)
+    spans = []
+    day = None
+    clock = None
+    relative = None
+    ambiguous = False
+
+    # Relativos primero: en "en 2 hs" el 2 no es una hora del reloj
+    if m := _RELATIVE.search(folded):
+        amount = _number(m.group(1)) + (0.5 if m.group(3) else 0)
+        unit = m.group(2)
+        delta = timedelta(hours=amount) if unit.startswith("h") else timedelta(minutes=amount)
+        relative = now + delta
+        spans.append(m.span())
+
+    # Hora antes que el día: "de la mañana" no debe leerse como el día "mañana"
+    if m := _search(_TIME, folded, spans):
+        if m.group(1) is not None:
+            hour, minute, period = int(m.group(1)), int(m.group(2) or 0), m.group(3) or m.group(4)
+        elif m.group(5) is not None:
+            hour, minute, period = int(m.group(5)), int(m.group(6)), m.group(7)
+        else:
+            hour, minute, period = int(m.group(8)), 0, None
+        clock = _resolve_hour(hour, minute, period)
+        if clock is not None:
+            spans.append(m.span())
+            ambiguous = period is None and 1 <= hour <= 7
+    elif m := _NOON.search(folded):
+        clock = (0, 0) if "medianoche" in m.group(0) else (12, 0)
+        spans.append(m.span())
+
+
+    # Una fecha escrita que no existe ("31/2") no se descarta en silencio: el
+    # pedido queda ambiguo en vez de agendarse para otro día
+    if m := _search(_ISO_DATE, folded, spans):
+        try:
+            day = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+            spans.append(m.span())
+        except ValueError:
+            ambiguous = True
+    if day is None and (m := _search(_NUMERIC_DATE, folded, spans)):
+        day = _build_date(now, int(m.group(1)), int(m.group(2)), m.group(3))
+        if day is not None:
+            spans.append(m.span())
+        else:
+            ambiguous = True
+    if day is None and (m := _search(_TEXT_DATE, folded, spans)):
+        day = _build_date(now, int(m.group(1)), _MONTHS[m.group(2)], m.group(3))
+        if day is not None:
+            spans.append(m.span())
+        else:
+            ambiguous = True
+    if day is None and (m := _search(_DAY_WORD, folded, spans)):
+        offset = {"hoy": 0, "manana": 1}.get(m.group(1), 2)
+        day = now.date() + timedelta(days=offset)
+        spans.append(m.span())
+    if day is None and (m := _search(_WEEKDAY, folded, spans)):
+        ahead = (_WEEKDAYS[m.group(1)] - now.weekday()) % 7 or 7
+        day = now.date() + timedelta(days=ahead)
+        spans.append(m.span())
+
+    if relative is None and clock is None and day is None:
+        return None
+
+    if relative is not None:
+        when, has_date, has_time = relative.replace(second=0, microsecond=0), True, True
+    elif clock is not None:
+        has_date = day is not None
+        when = datetime.combine(day or now.date(), datetime.min.time()).replace(hour=clock[0], minute=clock[1])
+        if not has_date and when <= now:
+            # Sin fecha y la hora ya pasó hoy: es para mañana
+            when += timedelta(days=1)
+        elif when <= now:
+            # Fecha explícita con una hora que ya pasó ("hoy a las 10" a las 15:30)
+            ambiguous = True
+        has_time = True
+    else:
+        when, has_date, has_time = datetime.combine(day, datetime.min.time()), True, False
+
+    return ParsedDateTime(
+        when=when,
+        title=_extract_title(text, folded, spans),
+        has_date=has_date,
+        has_time=has_time,
+        explicit=_TRIGGERS.search(folded) is not None,
+        ambiguous=ambiguous,
+    )
+
+
+def _build_date(now: datetime, day: int, month: int, year: str | None) -> date | None:
+    try:
+        if year:
+            y = int(year)
+            return date(y + 2000 if y < 100 else y, month, day)
+        candidate = date(now.year, month, day)
+        # Sin año y la fecha ya pasó: es la del año próximo
+        return candidate if candidate >= now.date() else date(now.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def _extract_title(text: str, folded: str, spans: list) -> str:
+    mask = [True] * len(text)
+    for start, end in spans + [m.span() for m in _TRIGGERS.finditer(folded)]:
+        for i in range(start, end):
+            mask[i] = False
+    kept = "".join(c if keep else " " for c, keep in zip(text, mask))
+    kept = re.sub(r"[¿?¡!.,;:]+", " ", kept)
+    kept = re.sub(r"\s+", " ", kept).strip()
+    kept = _LEADING.sub("", kept)
+    return _TRAILING.sub("", kept).strip()
@@ -0,0 +1,120 @@
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets (segundos) para latencias de etapas: de 1 ms a 30 s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Métricas registradas en el proceso, en orden de creación
+_registry = []
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monótono con labels, thread-safe."""
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Histograma acumulado estilo Prometheus. observe() es O(log buckets) bajo un
+    lock corto: apto para el camino caliente.
+    """
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labelvalues -> [counts por bucket (+Inf al final), sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labelvalues) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            snapshot = {k: ([*v[0]], v[1], v[2]) for k, v in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = (*self.labelnames, "le")
+        for labelvalues, (counts, total, count) in sorted(snapshot.items()):
+            running = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                running += n
+                lines.append(f"{self.name}_bucket{_labels(names, (*labelvalues, _number(bound)))} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+
+def family(kind: str, name: str, help: str, samples: list, labelnames: tuple = ()) -> list:
+    """
+    Familia gauge/counter calculada al momento del scrape a partir de los stats()
+    que ya llevan los servicios: samples = [(labelvalues, valor)].
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labelvalues, value in samples:
+        lines.append(f"{name}{_labels(labelnames, tuple(labelvalues))} {_number(value)}")
+    return lines
+
+
+def histogram_family(name: str, help: str, series: list, labelnames: tuple = ()) -> list:
+    """
+    Histograma ya acumulado por otro componente:
+    series = [(labelvalues, [(límite superior, cuenta acumulada)...], suma, cuenta)].
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    names = (*labelnames, "le")
+    for labelvalues, buckets, total, count in series:
+        for bound, cumulative in buckets:
+            lines.append(f"{name}_bucket{_labels(names, (*labelvalues, _number(bound)))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labelnames, labelvalues)} {_number(total)}")
+        lines.append(f"{name}_count{_labels(labelnames, labelvalues)} {count}")
+    return lines
+
+
+def render(extra: list | None = None) -> str:
+    """Texto de exposición de Prometheus: métricas registradas + familias calculadas (extra)."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,88 @@
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+from app.utils.metrics import Histogram
+
+_log = logging.getLogger(__name__)
+
+# Trace id del request/mensaje en curso; "-" fuera de un trace
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+STAGE_SECONDS = Histogram(
+    "whatsapp_stage_duration_seconds",
+    "Duración de cada etapa del procesamiento de un mensaje",
+    labelnames=("stage",),
+)
+
+
+def current_trace_id() -> str | None:
+    return _trace_id.get()
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def trace(trace_id: str | None = None):
+    """Activa un trace id (nuevo si no se pasa) para el thread/contexto actual."""
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """Mide la etapa y la registra en el histograma; el costo es un par de perf_counter y un bisect."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug(f"⏱️ {stage}: {elapsed * 1000:.1f} ms")
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Registra una duración medida por otro lado (p. ej. espera en una cola)."""
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+def traced(stage: str):
+    """Decorador: abre un trace nuevo y un span con toda la ejecución (p. ej. el webhook)."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace(), span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn):
+    """
+    Envuelve fn para que corra con el trace id actual en otro thread
+    (los contextvars no pasan solos a los pools ni a los Timers).
+    Sin trace activo, el thread destino abre uno nuevo.
+    """
+    trace_id = _trace_id.get()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with trace(trace_id):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class TraceIdFilter(logging.Filter):
+    """Agrega %(trace_id)s a cada registro de log."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get() or "-"
+        return True
@@ -1,17 +1,15 @@
 import logging
 import json
-import requests
 import os
-import tempfile
-import openai
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import current_app
-from app.services.openai_service import generate_response
-from app.services.bot_logic import BotLogic
-
-# Inicializar la lógica de fecha
-g_logic = BotLogic()
+from app.services.openai_service import generate_response, transcribe_audio
+from app.services.graph_client import get_graph_client
+from app.services import outbound, outbox, progress
+from app.services.outbound import PRIORITY_INTERACTIVE
+from app.utils import tracing
 
 def log_http_response(response):
     logging.info(f"Status: {response.status_code}")
@@ -73,66 +71,135 @@ def send_message(payload: dict) -> dict:
     """
     Envía un mensaje a través de la Graph API de WhatsApp y registra la respuesta.
     """
-    url = f"https://graph.facebook.com/v{current_app.config['GRAPH_API_VERSION']}/{current_app.config['PHONE_NUMBER_ID']}/messages"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {current_app.config['ACCESS_TOKEN']}"
-    }
-
     logging.info(f"🚀 [send_message] Payload:\n{payload!r}")
-    resp = requests.post(url, json=payload, headers=headers, timeout=10)
-    if resp.status_code != 200:
-        logging.error(f"❌ [send_message] Error {resp.status_code}:\n{resp.text}")
-    else:
-        try:
-            body = resp.json()
-        except ValueError:
-            body = resp.text
-        logging.info(f"✅ [send_message] Success, response:\n{body!r}")
-    resp.raise_for_status()
-    return resp.json()
+    with tracing.span("graph_send"):
+        body = get_graph_client().send_message(payload)
+    logging.info(f"✅ [send_message] Success, response:\n{body!r}")
+    return body
+
+
+def queue_message(payload: dict, priority: int = PRIORITY_INTERACTIVE) -> None:
+    """
+    Entrega el mensaje de forma confiable, sin esperar el envío: lo persiste en
+    el outbox y el flusher lo envía por el dispatcher de salida (rate limiting
+    por número y destinatario). Sin outbox, lo encola directo en el dispatcher.
+    Para esperar el resultado del envío usar outbound.dispatch(...).result().
+    Va en una transacción propia: las respuestas no cambian estado en la BD que
+    deba confirmarse con el envío (la memoria de conversación ya se guardó y
+    no depende de él). Si lo cambian, usar outbox.enqueue(conn, ...) en la
+    transacción del llamador.
+    """
+    if outbox.is_enabled():
+        outbox.enqueue_message(payload, priority)
+        return
+    future = outbound.dispatch(payload, priority)
+    future.add_done_callback(_log_send_failure)
+
+
+def _log_send_failure(future):
+    if future.exception() is not None:
+        logging.error(f"❌ [queue_message] Error enviando mensaje: {future.exception()}")
+
+
+def iter_whatsapp_messages(body: dict):
+    """
+    Recorre en una sola pasada todas las entries, changes y messages del payload.
+    Genera tuplas (msg, contact), donde contact es el contacto del remitente
+    (Meta agrupa varios mensajes y contactos en una misma entrega durante ráfagas).
+    """
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            messages = value.get("messages") or []
+            if not messages:
+                continue
+            contacts = {c.get("wa_id"): c for c in value.get("contacts") or []}
+            for msg in messages:
+                sender = msg.get("from")
+                contact = contacts.get(sender) or {"wa_id": sender, "profile": {"name": sender}}
+                yield msg, contact
+
+
+def group_messages_by_sender(messages) -> dict:
+    """
+    Agrupa (msg, contact) por wa_id respetando el orden de llegada dentro de cada remitente.
+    """
+    groups = {}
+    for msg, contact in messages:
+        groups.setdefault(msg.get("from"), []).append((msg, contact))
+    return groups
+
+
+def merge_text_messages(items: list) -> tuple:
+    """
+    Combina varios (msg, contact) de texto del mismo remitente en un único mensaje
+    cuyo cuerpo es la concatenación de los textos, en orden de llegada.
+    """
+    if len(items) == 1:
+        return items[0]
+    last_msg, contact = items[-1]
+    merged = dict(last_msg)
+    merged["text"] = {"body": "\n".join(m["text"]["body"] for m, _ in items)}
+    merged["coalesced_ids"] = [m.get("id") for m, _ in items]
+    return merged, contact
 
 
 def process_whatsapp_message(body: dict):
+    """
+    Procesa todos los mensajes del payload. Cada remitente se atiende en orden;
+    remitentes distintos se procesan en paralelo.
+    """
+    process_message_groups(group_messages_by_sender(iter_whatsapp_messages(body)))
+
+
+def process_message_groups(groups: dict):
+    if len(groups) <= 1:
+        for items in groups.values():
+            process_sender_messages(items)
+        return
+
+    app = current_app._get_current_object()
+
+    def _run(items):
+        with app.app_context():
+            process_sender_messages(items)
+
+    with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="sender") as pool:
+        list(pool.map(tracing.bind(_run), groups.values()))
+
+
+def process_sender_messages(items: list):
+    """Procesa secuencialmente los mensajes de un mismo remitente."""
+    for msg, contact in items:
+        with tracing.span("process_message"):
+            process_message(msg, contact)
+
+
+def process_message(msg: dict, contact: dict):
     try:
-        msg = body["entry"][0]["changes"][0]["value"]["messages"][0]
         msg_type = msg.get("type")
         logging.info(f"📩 Tipo de mensaje recibido: {msg_type}")
 
         sender = msg["from"]
 
-        contact = body["entry"][0]["changes"][0]["value"]["contacts"][0]
         recipient = contact["wa_id"]
-        name = contact["profile"]["name"]
+        name = contact.get("profile", {}).get("name", sender)
 
         if msg_type == "text":
             text = msg["text"]["body"]
             logging.info(f"🔎 Procesando texto: {text!r}")
 
-            # 1) Preprocesamiento local
-            response = None
-            if g_logic.validate_date_format(text):
-                response = f"✅ La fecha {text.strip()} es válida."
-            elif (day := g_logic.get_day_of_date(text)):
-                response = day
-            elif (until := g_logic.calculate_days_until(text)):
-                response = until
-
-            # 2) Fallback a ChatGPT
-            if not response:
-                logging.info("   → Ningún handler local, llamando a ChatGPT")
-                send_message(get_text_message_input(recipient, "⏳ Consultando API de ChatGPT..."))
-
+            # El orchestrator rutea localmente (IntentRouter) o llama a ChatGPT;
+            # el aviso intermedio sólo sale si tarda más que el umbral
+            with progress.watch(recipient, msg.get("id")):
                 response = generate_response(text, sender, name)
-                logging.info(f"   → generate_response retornó: {response!r}")
-
-                send_message(get_text_message_input(recipient, "✅ Respuesta de ChatGPT recibida, enviando mensaje final..."))
+            logging.info(f"   → generate_response retornó: {response!r}")
 
             # Normalizar respuesta
             response = str(response)
 
         elif msg_type == "audio":
-            response = handle_audio_message(body)
+            response = handle_audio_message(msg)
             if not response:
                 response = "❌ Error al procesar audio"
 
@@ -154,44 +221,29 @@ def process_whatsapp_message(body: dict):
                 )
         else:
             payload = get_text_message_input(recipient, str(response))
-        send_message(payload)
+        queue_message(payload)
 
     except Exception as e:
-        logging.error("❌ Error en process_whatsapp_message:", exc_info=True)
+        logging.error("❌ Error en process_message:", exc_info=True)
 
 
-def handle_audio_message(body: dict) -> str | None:
+def handle_audio_message(msg: dict) -> str | None:
     try:
-        msg = body["entry"][0]["changes"][0]["value"]["messages"][0]
         if msg.get("type") != "audio":
             return None
         logging.info("🎙️ Procesando audio")
         media_id = msg["audio"]["id"]
-        url = f"https://graph.facebook.com/{current_app.config['VERSION']}/{media_id}?access_token={current_app.config['ACCESS_TOKEN']}"
-        media_resp = requests.get(url, timeout=10)
-        media_resp.raise_for_status()
-        audio_url = media_resp.json().get("url")
-
-        audio_data = requests.get(audio_url, timeout=10).content
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".ogg") as tmp:
-            tmp.write(audio_data)
-            path = tmp.name
-        logging.info(f"📁 Audio guardado en {path}")
-
-        with open(path, "rb") as f:
-            transcript = openai.Audio.transcribe("whisper-1", f)
-        os.remove(path)
-        return transcript.get("text")
+        graph = get_graph_client()
+        audio_url = graph.get_media_url(media_id)
+
+        audio_data = graph.download_media(audio_url)
+        logging.info(f"📁 Audio descargado ({len(audio_data)} bytes)")
+
+        return transcribe_audio(audio_data)
     except Exception:
         logging.error("❌ Error al procesar audio", exc_info=True)
         return None
 
 
 def is_valid_whatsapp_message(body: dict) -> bool:
-    return (
-        body.get("object") and
-        body.get("entry") and
-        body["entry"][0].get("changes") and
-        body["entry"][0]["changes"][0].get("value") and
-        body["entry"][0]["changes"][0]["value"].get("messages")
-    )
+    return bool(body and body.get("object")) and next(iter_whatsapp_messages(body), None) is not None
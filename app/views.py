@@ -1,18 +1,68 @@
 import logging
 import json
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from app.services.scheduler import scheduler  # Importa desde el nuevo módulo
+from app.services import ingest, dedup, coalescer, outbound, outbox, progress, response_cache, conversation_store, llm_gateway, recorder
+from app.services import customer_service
+from app.services.executor import QueueFullError
+from app.services.openai_service import orchestrator
+from app.utils import metrics, tracing
 
 from .decorators.security import signature_required
 from .utils.whatsapp_utils import (
-    process_whatsapp_message,
+    iter_whatsapp_messages,
+    group_messages_by_sender,
+    process_message_groups,
+    process_sender_messages,
+    merge_text_messages,
     is_valid_whatsapp_message,
 )
 
 webhook_blueprint = Blueprint("webhook", __name__)
 
 
+def dispatch_sender_messages(sender: str, items: list) -> list:
+    """
+    Encola los mensajes de un remitente en su partición del ingest. Con la
+    agrupación activa, los textos se acumulan en el coalescer y cualquier otro
+    tipo de mensaje vacía antes el buffer para conservar el orden.
+    Devuelve los mensajes que no se pudieron encolar (vacía si entraron todos).
+    """
+    if not coalescer.is_enabled():
+        try:
+            ingest.submit(sender, process_sender_messages, items)
+        except QueueFullError as e:
+            logging.warning(f"⚠️ Ingest saturado para {sender}: {e}")
+            return items
+        return []
+    for i, (msg, contact) in enumerate(items):
+        if msg.get("type") == "text":
+            coalescer.add(sender, (msg, contact))
+            continue
+        coalescer.flush(sender)
+        try:
+            if coalescer.is_buffered(sender):
+                # El lote de textos previo no entró en el ingest: este mensaje no puede adelantarlo
+                raise QueueFullError(f"lote agrupado de {sender} pendiente")
+            ingest.submit(sender, process_sender_messages, [(msg, contact)])
+        except QueueFullError as e:
+            logging.warning(f"⚠️ Ingest saturado para {sender}: {e}")
+            return items[i:]
+    return []
+
+
+def dispatch_coalesced(sender: str, items: list):
+    """Callback del coalescer: procesa el lote como un único mensaje de texto."""
+    try:
+        ingest.submit(sender, process_sender_messages, [merge_text_messages(items)])
+    except QueueFullError as e:
+        # El webhook ya respondió 200 y los ids quedaron marcados: el lote vuelve
+        # al buffer y se reintenta en vez de procesarse en el thread del Timer
+        logging.warning(f"⚠️ Ingest saturado al vaciar lote de {sender}, se reintenta: {e}")
+        coalescer.requeue(sender, items)
+
+
 def handle_message():
     try:
         body = request.get_json(force=True)
@@ -24,6 +74,9 @@ def handle_message():
     raw_data = request.data
     logging.info(f"📜 Contenido bruto recibido (request.data): {raw_data}")
 
+    # Grabación opcional (anonimizada) para replay de carga
+    recorder.record(body)
+
     # Mostrar payload solo si DEBUG está activado
     if current_app.config.get("DEBUG", False):
         try:
@@ -33,20 +86,37 @@ def handle_message():
             logging.warning(f"No se pudo formatear el payload: {e}")
             logging.info(f"Payload bruto: {body}")
 
-    # Verifica si es una actualización de estado (sent/delivered/read)
-    if (
-        body.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-        .get("statuses")
-    ):
-        logging.info("Received a WhatsApp status update.")
-        return jsonify({"status": "ok"}), 200
-
     try:
         if is_valid_whatsapp_message(body):
             logging.info("✅ is_valid_whatsapp_message devolvió True")
-            process_whatsapp_message(body)
+            # Descartamos redeliveries antes de hacer cualquier trabajo
+            messages = [
+                (msg, contact)
+                for msg, contact in iter_whatsapp_messages(body)
+                if not dedup.is_duplicate(msg.get("id"))
+            ]
+            groups = group_messages_by_sender(messages)
+            if ingest.is_async():
+                # Respondemos 200 de inmediato; cada remitente se procesa en orden en su partición
+                rejected = []
+                for sender, items in groups.items():
+                    rejected.extend(dispatch_sender_messages(sender, items))
+                if rejected:
+                    # Liberamos sólo los ids que no se encolaron para que la redelivery
+                    # de Meta no se descarte como duplicado; los aceptados ya se procesan
+                    for msg, _ in rejected:
+                        dedup.forget(msg.get("id"))
+                    return jsonify({"status": "error", "message": "Busy, retry later"}), 503
+            else:
+                process_message_groups(groups)
+            return jsonify({"status": "ok"}), 200
+        elif any(
+            change.get("value", {}).get("statuses")
+            for entry in (body or {}).get("entry") or []
+            for change in entry.get("changes") or []
+        ):
+            # Actualización de estado (sent/delivered/read)
+            logging.info("Received a WhatsApp status update.")
             return jsonify({"status": "ok"}), 200
         else:
             logging.warning("❌ Mensaje no válido según is_valid_whatsapp_message")
@@ -86,6 +156,7 @@ def webhook_get():
 
 
 @webhook_blueprint.route("/webhook", methods=["POST"])
+@tracing.traced("webhook")
 @signature_required
 def webhook_post():
     return handle_message()
@@ -106,6 +177,169 @@ def list_jobs():
     return jsonify(jobs)
 
 
+@debug_bp.route("/ingest")
+def ingest_stats():
+    return jsonify(ingest.stats())
+
+
+@debug_bp.route("/coalescer")
+def coalescer_stats():
+    return jsonify(coalescer.stats())
+
+
+@debug_bp.route("/outbound")
+def outbound_stats():
+    return jsonify(outbound.stats())
+
+
+@debug_bp.route("/outbox")
+def outbox_stats():
+    return jsonify(outbox.stats())
+
+
+@debug_bp.route("/progress")
+def progress_stats():
+    return jsonify(progress.stats())
+
+
+@debug_bp.route("/response-cache")
+def response_cache_stats():
+    return jsonify(response_cache.stats())
+
+
+@debug_bp.route("/customers")
+def customer_cache_stats():
+    return jsonify(customer_service.stats())
+
+
+@debug_bp.route("/renderers")
+def renderer_stats():
+    return jsonify(orchestrator.renderers.stats())
+
+
+@debug_bp.route("/prompt")
+def prompt_stats():
+    return jsonify(orchestrator.prompts.stats())
+
+
+@debug_bp.route("/conversations")
+def conversation_stats():
+    return jsonify(conversation_store.stats())
+
+
+@debug_bp.route("/llm")
+def llm_stats():
+    return jsonify(llm_gateway.stats())
+
+
+@debug_bp.route("/router")
+def router_stats():
+    return jsonify(orchestrator.router.stats())
+
+
+@debug_bp.route("/recorder")
+def recorder_stats():
+    return jsonify(recorder.stats())
+
+
+@debug_bp.route("/dedup")
+def dedup_stats():
+    return jsonify(dedup.stats())
+
+
+# Métricas en formato Prometheus, fuera de /_debug para que el scraper no dependa del prefijo
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(_runtime_metrics()), mimetype=metrics.CONTENT_TYPE)
+
+
+def _runtime_metrics() -> list:
+    """
+    Familias calculadas en el scrape a partir de los stats() de cada servicio:
+    el camino caliente sólo paga los spans de tracing.
+    """
+    lines = []
+
+    ingest_stats = ingest.stats()
+    if ingest_stats["mode"] == "async":
+        lines += metrics.family("gauge", "whatsapp_ingest_queue_depth", "Tareas esperando un worker del ingest",
+                                [((), ingest_stats["pool"]["queue_depth"])])
+        lines += metrics.family("gauge", "whatsapp_ingest_active_senders", "Remitentes con mensajes en proceso",
+                                [((), ingest_stats["active_keys"])])
+
+    outbound_stats = outbound.stats()
+    if outbound_stats["enabled"]:
+        lines += metrics.family(
+            "gauge", "whatsapp_outbound_queue", "Mensajes salientes en cola por estado",
+            [((state,), outbound_stats[state]) for state in ("pending", "ready", "delayed", "held")],
+            labelnames=("state",),
+        )
+        lines += metrics.family("counter", "whatsapp_outbound_messages_total", "Envíos a la Graph API por resultado",
+                                [(("sent",), outbound_stats["sent"]), (("failed",), outbound_stats["failed"])],
+                                labelnames=("result",))
+
+    outbox_stats = outbox.stats()
+    if outbox_stats["enabled"]:
+        lines += metrics.family("gauge", "whatsapp_outbox_rows", "Filas del outbox por estado",
+                                [((status,), n) for status, n in sorted(outbox_stats["rows"].items())],
+                                labelnames=("status",))
+
+    jobs = {}
+    for job in scheduler.get_jobs():
+        kind = job.id.split("_", 1)[0]
+        jobs[kind] = jobs.get(kind, 0) + 1
+    lines += metrics.family("gauge", "whatsapp_scheduler_jobs", "Jobs programados en APScheduler por tipo",
+                            sorted(((kind,), n) for kind, n in jobs.items()), labelnames=("kind",))
+
+    prompt_stats = orchestrator.prompts.stats()
+    lines += metrics.family(
+        "counter", "whatsapp_llm_tokens_total", "Tokens informados por OpenAI en usage",
+        [((kind,), prompt_stats[f"{kind}_tokens"]) for kind in ("prompt", "cached", "completion")],
+        labelnames=("kind",),
+    )
+
+    router_stats = orchestrator.router.stats()
+    lines += metrics.family("counter", "whatsapp_router_messages_total", "Mensajes ruteados por destino",
+                            [(("local",), router_stats["handled_locally"]), (("llm",), router_stats["sent_to_llm"])],
+                            labelnames=("route",))
+
+    llm_stats = llm_gateway.stats()
+    if llm_stats["enabled"]:
+        lines += metrics.family("gauge", "whatsapp_llm_in_flight", "Requests a OpenAI en vuelo",
+                                [((), llm_stats["in_flight"])])
+        lines += metrics.family("gauge", "whatsapp_llm_breaker_open", "1 si el circuito hacia OpenAI está abierto",
+                                [((), int(llm_stats["breaker"]["state"] == "open"))])
+        lines += metrics.family(
+            "counter", "whatsapp_llm_calls_total", "Llamadas al gateway del LLM por resultado",
+            [((k,), llm_stats[k]) for k in ("calls", "timeouts", "errors", "rejected", "short_circuited", "hedges_fired")],
+            labelnames=("result",),
+        )
+        lines += metrics.histogram_family(
+            "whatsapp_llm_request_duration_seconds", "Latencia de chat.completions por modelo",
+            [
+                (
+                    (model,),
+                    [(float("inf") if b == "+Inf" else float(b) / 1000, n) for b, n in h["buckets_ms"].items()],
+                    h["sum_ms"] / 1000,
+                    h["count"],
+                )
+                for model, h in sorted(llm_stats["latency"].items())
+            ],
+            labelnames=("model",),
+        )
+
+    for name, stats in (("dedup", dedup.stats()), ("response_cache", response_cache.stats()),
+                        ("customer_cache", customer_service.stats())):
+        if stats["enabled"]:
+            lines += metrics.family("counter", f"whatsapp_{name}_lookups_total", f"Consultas a {name} por resultado",
+                                    [(("hit",), stats["hits"]), (("miss",), stats["misses"])],
+                                    labelnames=("result",))
+    return lines
+
+
 # if current_app.config.get("DEBUG", False):
 #     @webhook_blueprint.route("/webhook", methods=["GET"])
 #     def webhook_post():
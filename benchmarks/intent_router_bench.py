@@ -0,0 +1,74 @@
+"""
+Benchmark del IntentRouter sobre el corpus etiquetado data/intents_es.jsonl.
+
+Uso:
+    python -m benchmarks.intent_router_bench [--repeat 2000]
+
+Reporta accuracy por intent, qué porcentaje del corpus se resuelve sin OpenAI
+y el costo de ruteo por mensaje en microsegundos.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+from app.services.intent_router import IntentRouter, ROUTE_LLM
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "intents_es.jsonl")
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(router: IntentRouter, corpus: list) -> dict:
+    errors = []
+    per_intent = Counter()
+    correct = Counter()
+    local = 0
+    for sample in corpus:
+        match = router.route(sample["text"])
+        per_intent[sample["intent"]] += 1
+        if match.intent == sample["intent"]:
+            correct[sample["intent"]] += 1
+        else:
+            errors.append({"text": sample["text"], "expected": sample["intent"], "got": match.intent})
+        if match.route != ROUTE_LLM:
+            local += 1
+    return {
+        "samples": len(corpus),
+        "accuracy": round(sum(correct.values()) / len(corpus), 4),
+        "per_intent": {k: f"{correct[k]}/{n}" for k, n in sorted(per_intent.items())},
+        "routed_locally": round(local / len(corpus), 4),
+        "errors": errors,
+    }
+
+
+def time_routing(router: IntentRouter, corpus: list, repeat: int) -> dict:
+    texts = [sample["text"] for sample in corpus]
+    for text in texts:  # warm-up
+        router.route(text)
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        for text in texts:
+            router.route(text)
+    elapsed = time.perf_counter_ns() - start
+    return {"messages": repeat * len(texts), "us_per_message": round(elapsed / (repeat * len(texts)) / 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000, help="pasadas sobre el corpus para medir tiempos")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    args = parser.parse_args()
+
+    router = IntentRouter()
+    corpus = load_corpus(args.corpus)
+    result = {**evaluate(router, corpus), **time_routing(router, corpus, args.repeat)}
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Microbenchmarks de las piezas de CPU pura que se ejecutan en cada mensaje.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.microbench [--filter parse] [--rounds 5] [--min-time 0.2] \\
+        [--output benchmarks/results/latest.json] \\
+        [--compare benchmarks/results/baseline.json] [--threshold 0.10]
+
+Por cada caso mide throughput (ops/s, mediana y mejor de --rounds rondas
+calibradas para durar ~--min-time), el pico de memoria asignada por llamada
+(tracemalloc) y los bloques que quedan vivos tras muchas llamadas (fugas).
+Los resultados se guardan en JSON junto con la versión de Python y el commit.
+Con --compare se contrastan contra una corrida previa y el proceso sale con
+código 1 si algún caso empeoró más que --threshold.
+
+CustomerService.find_or_create corre contra una BD temporal sembrada con
+--customers clientes.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from itertools import count, cycle
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+
+SECRET = "microbench-secret"
+
+
+def sample_webhook(phone: str = "59891234567", text: str = "hola, ¿qué día cae 2030-05-17?") -> dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "1000000000",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550000000", "phone_number_id": "2000000000"},
+                    "contacts": [{"profile": {"name": "Cliente"}, "wa_id": phone}],
+                    "messages": [{
+                        "from": phone,
+                        "id": "wamid.HBgLNTk4OTEyMzQ1NjcVAgASGBQzQUI2",
+                        "timestamp": "1760000000",
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }
+
+
+def build_cases(app, seeded_phones: list) -> dict:
+    """name → función sin argumentos a medir."""
+    from app.decorators.security import validate_signature
+    from app.services.bot_logic import BotLogic
+    from app.services.customer_service import CustomerService
+    from app.utils.datetime_utils import parse_iso8601
+    from app.utils.whatsapp_utils import (
+        get_cita_template_input, get_text_message_input, is_valid_whatsapp_message,
+    )
+
+    body = sample_webhook()
+    raw = json.dumps(body)
+    raw_bytes = raw.encode("utf-8")
+    signature = hmac.new(SECRET.encode("latin-1"), raw_bytes, hashlib.sha256).hexdigest()
+    bot = BotLogic()
+    future = (date.today() + timedelta(days=90)).isoformat()
+    existing = cycle(seeded_phones).__next__
+    # Régimen estable: los clientes sembrados ya pasaron por la cache de CustomerService
+    for phone in seeded_phones:
+        CustomerService.find_or_create(phone)
+    fresh = count(1).__next__
+
+    def flask_get_json():
+        with app.test_request_context("/webhook", method="POST", data=raw_bytes,
+                                      content_type="application/json"):
+            from flask import request
+            return request.get_json(force=True)
+
+    return {
+        "validate_signature": lambda: validate_signature(raw, signature),
+        "is_valid_whatsapp_message": lambda: is_valid_whatsapp_message(body),
+        "json_loads_webhook": lambda: json.loads(raw_bytes),
+        "flask_get_json_webhook": flask_get_json,
+        "botlogic_validate_date_format": lambda: bot.validate_date_format("17/05/2030"),
+        "botlogic_validate_date_format_miss": lambda: bot.validate_date_format("hola, ¿cómo estás?"),
+        "botlogic_get_day_of_date": lambda: bot.get_day_of_date("¿qué día cae 2030-05-17?"),
+        "botlogic_calculate_days_until": lambda: bot.calculate_days_until(f"¿cuántos días faltan para {future}?"),
+        "parse_iso8601": lambda: parse_iso8601("2030-05-17T10:30:00-03:00"),
+        "parse_iso8601_fallback": lambda: parse_iso8601("17/05/2030 10:30"),
+        "get_text_message_input": lambda: get_text_message_input("59891234567", "Tu cita quedó agendada."),
+        "get_cita_template_input": lambda: get_cita_template_input("59891234567", "Control anual", "17/05 10:30"),
+        "customer_find_or_create_hit": lambda: CustomerService.find_or_create(existing()),
+        "customer_find_or_create_new": lambda: CustomerService.find_or_create(f"5990{fresh():08d}"),
+    }
+
+
+def time_case(fn, rounds: int, min_time: float) -> dict:
+    # Calibración: duplicar iteraciones hasta que una ronda dure ~min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4 or number >= 1 << 24:
+            break
+        number *= 2
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    # Ronda de calentamiento descartada: caches que se llenan en las primeras llamadas
+    for _ in range(number):
+        fn()
+    per_op = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_op.append((time.perf_counter() - start) / number)
+    median = statistics.median(per_op)
+    return {
+        "iterations": number,
+        "rounds": rounds,
+        "ns_per_op": round(median * 1e9, 1),
+        "ops_per_s": round(1 / median, 1),
+        "best_ops_per_s": round(1 / min(per_op), 1),
+        "stdev_pct": round(statistics.pstdev(per_op) / median * 100, 2),
+    }
+
+
+def allocation_case(fn, calls: int = 200) -> dict:
+    """Pico de memoria por llamada y bloques retenidos tras `calls` llamadas."""
+    fn()  # caches y lazy imports fuera de la medición
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(20):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+        before = tracemalloc.take_snapshot()
+        for _ in range(calls):
+            fn()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "peak_bytes_per_op": int(statistics.median(peaks)),
+        "retained_bytes_per_op": round(max(0, retained) / calls, 1),
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Casos cuyo throughput bajó más que threshold respecto de la línea base."""
+    rows, regressions = [], []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        change = result["ops_per_s"] / base["ops_per_s"] - 1
+        rows.append((name, base["ops_per_s"], result["ops_per_s"], change))
+        if change < -threshold:
+            regressions.append(name)
+    width = max((len(r[0]) for r in rows), default=10)
+    print(f"\n{'caso'.ljust(width)}  {'base ops/s':>14}  {'actual ops/s':>14}  {'cambio':>8}", file=sys.stderr)
+    for name, base_ops, ops, change in rows:
+        flag = "  ⚠️" if name in regressions else ""
+        print(f"{name.ljust(width)}  {base_ops:>14,.1f}  {ops:>14,.1f}  {change:>+8.1%}{flag}", file=sys.stderr)
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="sólo casos cuyo nombre contenga este texto")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="duración objetivo de cada ronda (s)")
+    parser.add_argument("--customers", type=int, default=10000, help="clientes sembrados en la BD temporal")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--compare", help="JSON de una corrida previa para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=0.10, help="caída de throughput tolerada (0.10 = 10%%)")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # Importar antes del chdir: el paquete app carga el catálogo relativo a la raíz.
+    # openai_service crea el cliente al importarse; nunca se llama en estos casos
+    os.environ.setdefault("OPENAI_API_KEY", "microbench")
+    from flask import Flask
+    from app.services.db import init_db
+    from app.services.customer_service import init_customer_cache
+    from app.services.migrations import migrate
+
+    # BD temporal con el esquema migrado
+    workdir = tempfile.mkdtemp(prefix="microbench_")
+    os.chdir(workdir)
+    migrate(os.path.join(workdir, "threads_db.sqlite"))
+    seeded_phones = [f"5989{i:07d}" for i in range(args.customers)]
+    with sqlite3.connect("threads_db.sqlite") as conn:
+        conn.executemany("INSERT INTO customers (phone, name) VALUES (?, ?)",
+                         ((p, f"Cliente {p}") for p in seeded_phones))
+
+    app = Flask("microbench")
+    app.config.update(APP_SECRET=SECRET, DATABASE_PATH=os.path.join(workdir, "threads_db.sqlite"),
+                      CUSTOMER_CACHE_SIZE=args.customers)
+    init_db(app)
+    init_customer_cache(app)
+    ctx = app.app_context()
+    ctx.push()
+    cases = {name: fn for name, fn in build_cases(app, seeded_phones).items() if args.filter in name}
+
+    results = {}
+    for name, fn in cases.items():
+        results[name] = {**time_case(fn, args.rounds, args.min_time), **allocation_case(fn)}
+        r = results[name]
+        print(f"{name:<36} {r['ops_per_s']:>14,.1f} ops/s  {r['ns_per_op']:>12,.1f} ns/op  "
+              f"pico {r['peak_bytes_per_op']:>7,} B", file=sys.stderr)
+    ctx.pop()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"rounds": args.rounds, "min_time": args.min_time, "customers": args.customers},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados en {output}", file=sys.stderr)
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ Regresiones (> {args.threshold:.0%}): {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
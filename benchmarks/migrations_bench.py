@@ -0,0 +1,146 @@
+"""
+Benchmark de las migraciones del esquema sobre una BD grande con el formato
+histórico de init_db.py (sin índices ni FK, fechas en formatos mezclados).
+
+Uso:
+    python -m benchmarks.migrations_bench [--events 1000000] [--customers 50000] \\
+        [--future-ratio 0.02] [--lookups 200]
+
+Mide, antes y después de migrar:
+ - la consulta de arranque de reschedule_all_reminders (UPCOMING_EVENTS_SQL),
+ - la búsqueda de eventos por cliente,
+junto con el plan de ejecución de cada una, y el tiempo de la migración.
+Antes de migrar la consulta de arranque además devuelve filas equivocadas:
+las fechas 'DD/MM/YYYY' no se comparan bien como texto ('31/01/2024' >= '2026-…').
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+CUSTOMER_EVENTS_SQL = "SELECT id, titulo, date FROM eventos WHERE customer_id = ?"
+
+# Formatos que fueron llegando a eventos.date antes de normalizar
+LEGACY_FORMATS = (("%Y-%m-%d %H:%M:%S", 0.7), ("%Y-%m-%dT%H:%M", 0.2), ("%d/%m/%Y %H:%M", 0.1))
+
+
+def build_legacy_db(path: str, customers: int, events: int, future_ratio: float, orphans: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            phone TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            date TEXT NOT NULL,
+            customer_id INTEGER NOT NULL
+        );
+        """
+    )
+    with conn:
+        conn.executemany(
+            "INSERT INTO customers (phone, name) VALUES (?, ?)",
+            ((f"5989{i:07d}", f"Cliente {i}") for i in range(customers)),
+        )
+    now = datetime.now()
+    formats, weights = zip(*LEGACY_FORMATS)
+    rng = random.Random(42)
+
+    def rows():
+        for i in range(events):
+            if rng.random() < future_ratio:
+                dt = now + timedelta(minutes=rng.randint(60, 60 * 24 * 60))
+            else:
+                dt = now - timedelta(minutes=rng.randint(60 * 24 * 2, 60 * 24 * 730))
+            fmt = rng.choices(formats, weights)[0]
+            customer_id = customers + 1 + i if i < orphans else rng.randint(1, customers)
+            yield f"evento {i}", dt.strftime(fmt), customer_id
+
+    with conn:
+        conn.executemany("INSERT INTO eventos (titulo, date, customer_id) VALUES (?, ?, ?)", rows())
+    conn.close()
+
+
+def measure(conn, startup_sql: str, customers: int, lookups: int, repeat: int = 3) -> dict:
+    startup = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(startup_sql).fetchall()
+        startup.append(time.perf_counter() - start)
+
+    rng = random.Random(7)
+    ids = [rng.randint(1, customers) for _ in range(lookups)]
+    start = time.perf_counter()
+    for customer_id in ids:
+        conn.execute(CUSTOMER_EVENTS_SQL, (customer_id,)).fetchall()
+    per_customer = (time.perf_counter() - start) / lookups
+
+    plan = lambda sql, *args: [r[-1] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", args)]
+    return {
+        "startup_query_ms": round(statistics.median(startup) * 1000, 2),
+        "startup_rows": len(rows),
+        "startup_plan": plan(startup_sql),
+        "customer_lookup_us": round(per_customer * 1e6, 2),
+        "customer_lookup_plan": plan(CUSTOMER_EVENTS_SQL, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=50_000)
+    parser.add_argument("--future-ratio", type=float, default=0.02, help="fracción de eventos pendientes")
+    parser.add_argument("--orphans", type=int, default=100, help="eventos con customer_id inexistente")
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    # openai_service crea el cliente al importarse; no se usa acá
+    os.environ.setdefault("OPENAI_API_KEY", "migrations-bench")
+    from app.services.db import connect
+    from app.services.migrations import migrate
+    from app.services.scheduler_service import UPCOMING_EVENTS_SQL
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="migrations_bench_"), "threads_db.sqlite")
+    start = time.perf_counter()
+    build_legacy_db(db_path, args.customers, args.events, args.future_ratio, args.orphans)
+    seed_s = time.perf_counter() - start
+
+    conn = connect(db_path)
+    before = measure(conn, UPCOMING_EVENTS_SQL, args.customers, args.lookups)
+    conn.close()
+
+    start = time.perf_counter()
+    applied = migrate(db_path)
+    migrate_s = time.perf_counter() - start
+
+    conn = connect(db_path)
+    after = measure(conn, UPCOMING_EVENTS_SQL, args.customers, args.lookups)
+    orphans = conn.execute("SELECT COUNT(*) FROM eventos_orphans").fetchone()[0]
+    conn.close()
+
+    result = {
+        "events": args.events,
+        "customers": args.customers,
+        "seed_s": round(seed_s, 2),
+        "migrations_applied": applied,
+        "migrate_s": round(migrate_s, 2),
+        "orphans_moved": orphans,
+        "before": before,
+        "after": after,
+        "startup_speedup": round(before["startup_query_ms"] / after["startup_query_ms"], 1),
+        "customer_lookup_speedup": round(before["customer_lookup_us"] / after["customer_lookup_us"], 1),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
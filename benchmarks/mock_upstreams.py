@@ -0,0 +1,305 @@
+"""
+Servidor local que imita la Graph API de WhatsApp y OpenAI para pruebas de
+carga sin red (en conjunto con benchmarks/replay_webhooks.py).
+
+Uso:
+    python -m benchmarks.mock_upstreams [--port 8090] \\
+        [--graph-latency-ms 80] [--openai-latency-ms 600] [--jitter 0.3] \\
+        [--error-rate 0.01] [--throttle-rate 0.02] [--retry-after 1]
+
+Y en el .env de la app:
+    GRAPH_API_BASE_URL=http://127.0.0.1:8090
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1
+
+Endpoints:
+    Graph:  GET /v{ver}/me, POST /v{ver}/{phone_id}/messages,
+            GET /v{ver}/{media_id}, GET /media/{media_id}
+    OpenAI: POST /v1/chat/completions (texto o tool calls según tools/tool_choice),
+            POST /v1/audio/transcriptions
+    Admin:  GET /_mock/stats, POST /_mock/config (cambia la degradación en caliente)
+
+La latencia, la tasa de 5xx y la de 429 se configuran por upstream ("graph" u
+"openai") sin reiniciar, p. ej.:
+    curl -X POST localhost:8090/_mock/config -d '{"openai": {"throttle_rate": 0.5}}'
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Código de Meta para "Rate limit hit" (ver THROTTLING_CODES en graph_client)
+GRAPH_THROTTLE_CODE = 130429
+
+# Bytes mínimos de un OGG para las descargas de media
+FAKE_AUDIO = b"OggS" + b"\x00" * 1020
+
+
+class Upstream:
+    """Parámetros de degradación de un upstream, modificables en caliente."""
+    FIELDS = ("latency_ms", "jitter", "error_rate", "throttle_rate", "retry_after")
+
+    def __init__(self, latency_ms: float, jitter: float, error_rate: float, throttle_rate: float, retry_after: float):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+
+    def update(self, values: dict) -> None:
+        for key, value in values.items():
+            if key in self.FIELDS:
+                setattr(self, key, float(value))
+
+    def delay(self) -> float:
+        spread = self.latency_ms * self.jitter
+        return max(0.0, random.uniform(self.latency_ms - spread, self.latency_ms + spread)) / 1000
+
+    def outcome(self) -> str:
+        """'throttle', 'error' u 'ok' según las tasas configuradas."""
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return "throttle"
+        if roll < self.throttle_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+
+def sample_arguments(schema: dict) -> dict:
+    """Argumentos plausibles para una función a partir de su JSON schema."""
+    args = {}
+    properties = schema.get("properties") or {}
+    for name in schema.get("required") or list(properties):
+        kind = (properties.get(name) or {}).get("type", "string")
+        if kind == "integer":
+            args[name] = 1
+        elif kind == "number":
+            args[name] = 1.0
+        elif kind == "boolean":
+            args[name] = True
+        elif "date" in name:
+            args[name] = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d 10:00")
+        else:
+            args[name] = f"{name} simulado"
+    return args
+
+
+def chat_completion(body: dict) -> dict:
+    """
+    Respuesta estilo chat.completions: tool call si tool_choice fuerza una función
+    (o si es 'auto' y el último mensaje es del usuario y menciona la función),
+    texto en cualquier otro caso, incluidos los follow-ups con mensajes 'tool'.
+    """
+    messages = body.get("messages") or []
+    tools = {t["function"]["name"]: t["function"] for t in body.get("tools") or [] if t.get("type") == "function"}
+    last = messages[-1] if messages else {}
+    choice = body.get("tool_choice")
+
+    target = None
+    if isinstance(choice, dict):
+        target = (choice.get("function") or {}).get("name")
+    elif choice != "none" and last.get("role") == "user":
+        text = str(last.get("content") or "").lower()
+        target = next((name for name in tools if name.replace("_", " ") in text), None)
+
+    prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4 + 10
+    if target in tools:
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": target, "arguments": json.dumps(sample_arguments(tools[target].get("parameters") or {}))},
+            }],
+        }
+        finish_reason = "tool_calls"
+    else:
+        message = {"role": "assistant", "content": f"Respuesta simulada a: {str(last.get('content') or '')[:80]}"}
+        finish_reason = "stop"
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 20,
+            "total_tokens": prompt_tokens + 20,
+            # La mitad "cacheada" para que las métricas de prefix caching tengan datos
+            "prompt_tokens_details": {"cached_tokens": prompt_tokens // 2},
+        },
+    }
+
+
+class MockState:
+    def __init__(self, graph: Upstream, openai: Upstream):
+        self.upstreams = {"graph": graph, "openai": openai}
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {"requests": counts, "config": {name: u.to_dict() for name, u in self.upstreams.items()}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como los upstreams reales
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # ── helpers ──────────────────────────────────────────────────────────
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip() or b"0", 16)
+                if not size:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status: int, payload=None, content: bytes | None = None,
+              content_type: str = "application/json", headers: dict | None = None) -> None:
+        data = content if content is not None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _degrade(self, name: str, route: str) -> bool:
+        """Aplica latencia y, según las tasas, responde 429/500. True si ya respondió."""
+        upstream = self.state.upstreams[name]
+        time.sleep(upstream.delay())
+        outcome = upstream.outcome()
+        self.state.count(f"{name}:{route}:{outcome}")
+        if outcome == "ok":
+            return False
+        retry = {"Retry-After": f"{upstream.retry_after:g}"}
+        if name == "graph":
+            if outcome == "throttle":
+                error = {"message": "(#130429) Rate limit hit", "type": "OAuthException", "code": GRAPH_THROTTLE_CODE}
+                self._send(429, {"error": error}, headers=retry)
+            else:
+                self._send(500, {"error": {"message": "An unknown error occurred", "code": 1}})
+        else:
+            if outcome == "throttle":
+                error = {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}
+                self._send(429, {"error": error}, headers=retry)
+            else:
+                self._send(500, {"error": {"message": "The server had an error", "type": "server_error"}})
+        return True
+
+    # ── rutas ────────────────────────────────────────────────────────────
+    def do_HEAD(self):
+        # GraphClient.warm_up
+        self._send(200, content=b"")
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/_mock/stats":
+            return self._send(200, self.state.stats())
+        if re.fullmatch(r"/media/[^/]+", path):
+            if not self._degrade("graph", "download"):
+                self._send(200, content=FAKE_AUDIO, content_type="audio/ogg")
+            return
+        if re.fullmatch(r"/v[\d.]+/me", path):
+            if not self._degrade("graph", "me"):
+                self._send(200, {"id": "1000000000", "name": "Mock Business"})
+            return
+        if match := re.fullmatch(r"/v[\d.]+/([^/]+)", path):
+            if not self._degrade("graph", "media"):
+                host = self.headers.get("Host", f"127.0.0.1:{self.server.server_port}")
+                media_id = match.group(1)
+                self._send(200, {"id": media_id, "mime_type": "audio/ogg",
+                                 "url": f"http://{host}/media/{media_id}"})
+            return
+        self._send(404, {"error": {"message": f"ruta desconocida: {path}"}})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        raw = self._read_body()
+        if path == "/_mock/config":
+            for name, values in json.loads(raw or b"{}").items():
+                if name in self.state.upstreams:
+                    self.state.upstreams[name].update(values)
+            return self._send(200, self.state.stats()["config"])
+        if re.fullmatch(r"/v[\d.]+/[^/]+/messages", path):
+            if not self._degrade("graph", "messages"):
+                to = json.loads(raw or b"{}").get("to", "")
+                self._send(200, {
+                    "messaging_product": "whatsapp",
+                    "contacts": [{"input": to, "wa_id": to}],
+                    "messages": [{"id": f"wamid.mock.{uuid.uuid4().hex}"}],
+                })
+            return
+        if path.endswith("/chat/completions"):
+            if not self._degrade("openai", "chat"):
+                self._send(200, chat_completion(json.loads(raw or b"{}")))
+            return
+        if path.endswith("/audio/transcriptions"):
+            if not self._degrade("openai", "transcription"):
+                self._send(200, {"text": "hola, quiero agendar una cita para mañana a las 10"})
+            return
+        self._send(404, {"error": {"message": f"ruta desconocida: {path}"}})
+
+
+def make_server(host: str, port: int, graph: Upstream, openai: Upstream) -> ThreadingHTTPServer:
+    handler = type("Handler", (MockHandler,), {"state": MockState(graph, openai)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--graph-latency-ms", type=float, default=80)
+    parser.add_argument("--openai-latency-ms", type=float, default=600)
+    parser.add_argument("--jitter", type=float, default=0.3, help="variación relativa de la latencia (0-1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fracción de respuestas 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="segundos en Retry-After de los 429")
+    args = parser.parse_args()
+
+    common = dict(jitter=args.jitter, error_rate=args.error_rate,
+                  throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    server = make_server(
+        args.host, args.port,
+        graph=Upstream(args.graph_latency_ms, **common),
+        openai=Upstream(args.openai_latency_ms, **common),
+    )
+    print(f"Mock de Graph/OpenAI escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
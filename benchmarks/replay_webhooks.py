@@ -0,0 +1,157 @@
+"""
+Reproduce contra /webhook los payloads grabados con RECORD_WEBHOOKS=true.
+
+Uso:
+    APP_SECRET=... python -m benchmarks.replay_webhooks \\
+        [--file requests.jsonl] [--url http://localhost:8000/webhook] \\
+        [--rate 20] [--concurrency 8] [--loops 1] [--keep-ids]
+
+Cada request se firma con X-Hub-Signature-256 calculada con APP_SECRET, igual
+que Meta. Por defecto se reescriben los ids de mensaje en cada pasada para que
+la deduplicación del servidor no descarte el replay. Reporta throughput,
+percentiles de latencia y tasa de error en JSON.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def load_payloads(path: str) -> tuple[list, int]:
+    """Devuelve (payloads, líneas ignoradas): sólo se reproducen líneas con "body"."""
+    payloads, skipped = [], 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict) and isinstance(record.get("body"), dict):
+                payloads.append(record["body"])
+            else:
+                skipped += 1
+    return payloads, skipped
+
+
+def sign(raw: bytes, secret: str) -> str:
+    # Mismo cálculo que app/decorators/security.validate_signature
+    return "sha256=" + hmac.new(bytes(secret, "latin-1"), msg=raw, digestmod=hashlib.sha256).hexdigest()
+
+
+def with_fresh_ids(body: dict, run: str) -> dict:
+    """Sufijo por pasada en los ids de mensaje para esquivar la deduplicación."""
+    body = json.loads(json.dumps(body))
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            for msg in (change.get("value") or {}).get("messages") or []:
+                if msg.get("id"):
+                    msg["id"] = f"{msg['id']}.replay-{run}"
+    return body
+
+
+class Pacer:
+    """Reparte los envíos a `rate` req/s entre todos los threads (0 = sin límite)."""
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            slot = max(self._next, time.monotonic())
+            self._next = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def percentile(ordered: list, p: float):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 2)
+
+
+def replay(payloads: list, url: str, secret: str, rate: float, concurrency: int,
+           loops: int, keep_ids: bool, timeout: float) -> dict:
+    pacer = Pacer(rate)
+    session = requests.Session()
+    session.mount(url, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def fire(body: dict):
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-Hub-Signature-256": sign(raw, secret)}
+        pacer.wait()
+        start = time.perf_counter()
+        try:
+            status = session.post(url, data=raw, headers=headers, timeout=timeout).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+    jobs = []
+    for _ in range(loops):
+        run = uuid.uuid4().hex[:8]
+        jobs.extend(body if keep_ids else with_fresh_ids(body, run) for body in payloads)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, jobs))
+    wall = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    errors = sum(n for status, n in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        "requests": len(jobs),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(jobs) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": round(ordered[-1], 2) if ordered else None,
+        },
+        "status": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "error_rate": round(errors / len(jobs), 4) if jobs else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default="requests.jsonl")
+    parser.add_argument("--url", default="http://localhost:8000/webhook")
+    parser.add_argument("--rate", type=float, default=0, help="requests por segundo (0 = sin límite)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--loops", type=int, default=1, help="pasadas sobre el archivo")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--keep-ids", action="store_true", help="no reescribir los ids de mensaje")
+    parser.add_argument("--secret", default=os.getenv("APP_SECRET"), help="por defecto $APP_SECRET")
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("falta APP_SECRET (variable de entorno o --secret)")
+
+    payloads, skipped = load_payloads(args.file)
+    if not payloads:
+        parser.error(f"{args.file} no tiene payloads grabados")
+    result = replay(payloads, args.url, args.secret, args.rate, args.concurrency,
+                    args.loops, args.keep_ids, args.timeout)
+    print(json.dumps({"file": args.file, "payloads": len(payloads), "skipped_lines": skipped, **result},
+                     indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
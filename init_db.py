@@ -1,31 +1,37 @@
-import sqlite3
-
-conn = sqlite3.connect('threads_db.sqlite')
-cur = conn.cursor()
-
-# Eliminar tablas si existen
-cur.execute('DROP TABLE IF EXISTS eventos;')
-cur.execute('DROP TABLE IF EXISTS customers;')
-
-# Crear tabla de clientes
-cur.execute('''
-CREATE TABLE customers (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    phone TEXT NOT NULL UNIQUE
-);
-''')
-
-# Crear tabla de eventos con relación al cliente
-cur.execute('''
-CREATE TABLE eventos (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    titulo TEXT NOT NULL,
-    date TEXT NOT NULL,  -- Aquí usamos TEXT para guardar fecha con hora
-    customer_id INTEGER NOT NULL
-);
-''')
-
-conn.commit()
-conn.close()
-print("Base de datos inicializada correctamente con soporte de fecha y hora.")
+"""
+Crea o actualiza el esquema de la base de datos aplicando las migraciones
+pendientes (lo mismo que hace create_app al arrancar). No borra datos.
+
+Uso:
+    python init_db.py [--reset]
+
+--reset elimina customers, eventos y eventos_orphans antes de migrar.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+from app.services.db import connect
+from app.services.migrations import MIGRATIONS, migrate
+
+load_dotenv()
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--reset", action="store_true", help="borra las tablas de dominio antes de migrar")
+args, _ = parser.parse_known_args()
+
+db_path = os.getenv("DB_PATH", "threads_db.sqlite")
+
+if args.reset:
+    conn = connect(db_path)
+    conn.execute("PRAGMA foreign_keys=OFF")
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS eventos;")
+        conn.execute("DROP TABLE IF EXISTS eventos_orphans;")
+        conn.execute("DROP TABLE IF EXISTS customers;")
+        conn.execute("PRAGMA user_version = 0;")
+    conn.close()
+
+applied = migrate(db_path)
+latest = max(version for version, _, _ in MIGRATIONS)
+print(f"Base de datos {db_path} en la versión {latest} del esquema ({len(applied)} migraciones aplicadas).")
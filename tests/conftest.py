@@ -0,0 +1,5 @@
+import os
+
+# Importar cualquier módulo de app carga app/__init__, y openai_service crea el
+# cliente al importarse: estos tests nunca llaman a OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "tests")
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from app.services.coalescer import MessageCoalescer
+
+
+class Collector:
+    def __init__(self):
+        self.batches = []
+        self._cond = threading.Condition()
+
+    def __call__(self, key, items):
+        with self._cond:
+            self.batches.append((key, list(items)))
+            self._cond.notify_all()
+
+    def wait_for(self, n: int, timeout: float = 2) -> list:
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.batches) >= n, timeout)
+            return list(self.batches)
+
+
+@pytest.fixture
+def collector():
+    return Collector()
+
+
+def test_burst_is_delivered_as_one_batch_after_the_window(collector):
+    coalescer = MessageCoalescer(window=0.05, flush_fn=collector)
+    for text in ("hola", "mañana", "a las 5 recordame el dentista"):
+        coalescer.add("598991", text)
+    assert collector.batches == []
+    assert collector.wait_for(1) == [("598991", ["hola", "mañana", "a las 5 recordame el dentista"])]
+    assert coalescer.stats()["llm_calls_saved"] == 2
+
+
+def test_senders_are_batched_separately(collector):
+    coalescer = MessageCoalescer(window=0.05, flush_fn=collector)
+    coalescer.add("a", 1)
+    coalescer.add("b", 2)
+    coalescer.add("a", 3)
+    assert sorted(collector.wait_for(2)) == [("a", [1, 3]), ("b", [2])]
+
+
+def test_max_messages_flushes_immediately(collector):
+    coalescer = MessageCoalescer(window=10, flush_fn=collector, max_messages=3)
+    for i in range(3):
+        coalescer.add("a", i)
+    assert collector.batches == [("a", [0, 1, 2])]
+    assert not coalescer.is_buffered("a")
+
+
+def test_max_wait_bounds_a_never_ending_burst(collector):
+    coalescer = MessageCoalescer(window=0.05, flush_fn=collector, max_wait=0.12)
+    started = time.monotonic()
+    for i in range(8):
+        coalescer.add("a", i)
+        time.sleep(0.03)
+    first = collector.wait_for(1)[0]
+    assert first[1][0] == 0 and len(first[1]) < 8
+    assert time.monotonic() - started < 0.5
+
+
+def test_flush_delivers_now(collector):
+    coalescer = MessageCoalescer(window=10, flush_fn=collector)
+    coalescer.add("a", "texto")
+    coalescer.flush("a")
+    assert collector.batches == [("a", ["texto"])]
+    coalescer.flush("a")  # sin buffer: no entrega nada
+    assert len(collector.batches) == 1
+
+
+def test_requeued_batch_goes_first_and_is_retried(collector):
+    coalescer = MessageCoalescer(window=0.05, flush_fn=collector)
+    coalescer.requeue("a", ["viejo 1", "viejo 2"])
+    coalescer.add("a", "nuevo")
+    assert collector.wait_for(1) == [("a", ["viejo 1", "viejo 2", "nuevo"])]
+    assert coalescer.stats()["requeued"] == 1
+
+
+def test_flush_fn_errors_do_not_escape(collector):
+    def failing(key, items):
+        raise RuntimeError("ingest caído")
+
+    coalescer = MessageCoalescer(window=10, flush_fn=failing, max_messages=1)
+    coalescer.add("a", "texto")  # no lanza
+    assert not coalescer.is_buffered("a")
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from app.services import customer_service, db
+from app.services.customer_service import CustomerService
+from app.services.migrations import migrate
+from app.utils.lru import LRUCache
+
+
+@pytest.fixture(params=[0, 100], ids=["sin_cache", "con_cache"])
+def customers(request, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "threads_db.sqlite")
+    migrate(db_path)
+    monkeypatch.setattr(db, "_db_path", db_path)
+    monkeypatch.setattr(customer_service, "_cache", LRUCache(maxsize=request.param) if request.param else None)
+    return db_path
+
+
+def count(db_path, phone):
+    return db.get_connection(db_path).execute("SELECT COUNT(*) FROM customers WHERE phone = ?", (phone,)).fetchone()[0]
+
+
+def test_creates_once_and_returns_the_same_customer(customers):
+    first = CustomerService.find_or_create("598991", "Ana")
+    again = CustomerService.find_or_create("598991", "Ana")
+    assert first == again == {"id": first["id"], "phone": "598991", "name": "Ana"}
+    assert count(customers, "598991") == 1
+
+
+def test_without_a_profile_name_uses_a_placeholder(customers):
+    # Sin contacto en el payload el "nombre" que llega es el propio número
+    assert CustomerService.find_or_create("598991", "598991")["name"] == "Cliente 598991"
+    assert CustomerService.find_or_create("598992")["name"] == "Cliente 598992"
+
+
+def test_profile_name_is_updated_but_never_erased(customers):
+    customer_id = CustomerService.find_or_create("598991", "Ana")["id"]
+    assert CustomerService.find_or_create("598991", "Ana María") == {
+        "id": customer_id, "phone": "598991", "name": "Ana María",
+    }
+    assert CustomerService.find_or_create("598991")["name"] == "Ana María"
+    assert CustomerService.get(customer_id)["name"] == "Ana María"
+
+
+def test_returned_dict_is_a_copy(customers):
+    CustomerService.find_or_create("598991", "Ana")["name"] = "pisado"
+    assert CustomerService.find_or_create("598991")["name"] == "Ana"
+
+
+def test_concurrent_first_messages_get_a_single_row(customers):
+    barrier = threading.Barrier(16)
+    ids = []
+
+    def first_message():
+        barrier.wait()
+        ids.append(CustomerService.find_or_create("598991", "Ana")["id"])
+        db.close_connection()
+
+    threads = [threading.Thread(target=first_message) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(ids)) == 1
+    assert count(customers, "598991") == 1
+
+
+def test_get_unknown_customer(customers):
+    assert CustomerService.get(12345) == {"error": "Cliente no encontrado"}
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.datetime_utils import parse_spanish_datetime
+
+# Domingo 18/10/2026, 15:30 en Montevideo
+NOW = datetime(2026, 10, 18, 15, 30)
+
+
+@pytest.mark.parametrize("text, date_str, title", [
+    ("Recordame ir al dentista mañana a las 16", "2026-10-19 16:00", "ir al dentista"),
+    ("recordame el dentista el 3/11 a las 10", "2026-11-03 10:00", "dentista"),
+    ("agendame el médico el 4/7 a las 9:15", "2027-07-04 09:15", "médico"),
+    ("recordame el viernes a las 9 de la mañana pagar la luz", "2026-10-23 09:00", "pagar la luz"),
+    ("recordame a las 5 de la tarde llamar a Ana", "2026-10-18 17:00", "llamar a Ana"),
+    ("recordame 3 de noviembre a las 10 la reunión", "2026-11-03 10:00", "reunión"),
+    ("dentro de 2 horas avisame que saque la ropa", "2026-10-18 17:30", "saque la ropa"),
+    ("recordame en 2 hs llamar a juan", "2026-10-18 17:30", "llamar a juan"),
+    ("avisame en 45 min que saque la pizza", "2026-10-18 16:15", "saque la pizza"),
+    ("recordame a las 10 comprar pan", "2026-10-19 10:00", "comprar pan"),
+])
+def test_confident(text, date_str, title):
+    parsed = parse_spanish_datetime(text, now=NOW)
+    assert parsed.confident
+    assert parsed.date_str == date_str
+    assert parsed.title == title
+
+
+@pytest.mark.parametrize("text", [
+    # Hora 1–7 sin período: puede ser de la mañana
+    "mañana a las 7 ir al gimnasio",
+    "recordame mañana a las 7 ir al gimnasio",
+    "recordame a las 5 el dentista",
+    "recordame el jueves a las 6:30 correr",
+    # Fecha que no existe: no se agenda para otro día
+    "recordame el 31/2 a las 10 algo",
+    "recordame el 31 de febrero a las 10 algo",
+    "recordame el 2026-02-30 a las 10 algo",
+    # Fecha explícita con una hora que ya pasó
+    "recordame hoy a las 10 x",
+    "recordame el 18/10/2026 a las 9 la reunión",
+    # Sin hora, sin pedido explícito o sin actividad
+    "recordame el 3/11 ir al dentista",
+    "tengo reunión a las 15:30",
+    "recordame mañana a las 16",
+])
+def test_not_confident(text):
+    parsed = parse_spanish_datetime(text, now=NOW)
+    assert parsed is not None
+    assert not parsed.confident
+
+
+def test_time_without_date_that_already_passed_is_tomorrow():
+    parsed = parse_spanish_datetime("recordame a las 9 de la mañana sacar la basura", now=NOW)
+    assert parsed.date_str == "2026-10-19 09:00"
+    assert parsed.confident
+
+
+def test_no_time_reference():
+    assert parse_spanish_datetime("recordame ir al super", now=NOW) is None
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from app.services import db
+from app.services.dedup import MessageDeduplicator
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "dedup.sqlite")
+
+
+def test_redelivery_is_a_duplicate(db_path):
+    dedup = MessageDeduplicator(db_path)
+    assert dedup.seen("wamid.1") is False
+    assert dedup.seen("wamid.1") is True
+    assert dedup.seen("wamid.2") is False
+    assert dedup.stats()["hits"] == 1 and dedup.stats()["misses"] == 2
+
+
+def test_survives_a_restart_and_lru_eviction(db_path):
+    MessageDeduplicator(db_path).seen("wamid.1")
+    # Otro proceso / reinicio: la LRU está vacía y responde la tabla
+    restarted = MessageDeduplicator(db_path, maxsize=1)
+    assert restarted.seen("wamid.1") is True
+    restarted.seen("wamid.2")  # desaloja wamid.1 de la LRU
+    assert restarted.seen("wamid.1") is True
+
+
+def test_expired_ids_count_as_new(db_path):
+    dedup = MessageDeduplicator(db_path, ttl=0.05)
+    dedup.seen("wamid.1")
+    time.sleep(0.1)
+    assert dedup.seen("wamid.1") is False
+    assert dedup.seen("wamid.1") is True
+
+
+def test_forget_lets_the_redelivery_through(db_path):
+    dedup = MessageDeduplicator(db_path)
+    dedup.seen("wamid.1")
+    dedup.forget("wamid.1")
+    assert dedup.seen("wamid.1") is False
+
+
+def test_purge_expired(db_path):
+    dedup = MessageDeduplicator(db_path, ttl=0.05)
+    dedup.seen("wamid.1")
+    time.sleep(0.1)
+    dedup.seen("wamid.2")
+    assert dedup.purge_expired() == 1
+
+
+def test_concurrent_deliveries_are_processed_once(db_path):
+    # Dos instancias sobre la misma BD simulan dos procesos
+    instances = [MessageDeduplicator(db_path), MessageDeduplicator(db_path)]
+    barrier = threading.Barrier(12)
+    results = []
+
+    def deliver(dedup):
+        barrier.wait()
+        results.append(dedup.seen("wamid.1"))
+        db.close_connection()
+
+    threads = [threading.Thread(target=deliver, args=(instances[i % 2],)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(False) == 1
@@ -0,0 +1,111 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+from app.services.executor import BoundedExecutor, KeyedExecutor, QueueFullError
+
+
+@pytest.fixture
+def pool():
+    pool = BoundedExecutor(workers=8, queue_size=1000, name="test")
+    yield pool
+    pool.shutdown(drain=False, timeout=5)
+
+
+def wait_idle(keyed: KeyedExecutor, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while keyed.stats()["queued"] and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert keyed.stats()["queued"] == 0
+
+
+def test_tasks_of_a_key_run_in_order_and_one_at_a_time(pool):
+    keyed = KeyedExecutor(pool, max_per_key=100)
+    seen = defaultdict(list)
+    running = defaultdict(int)
+    overlaps = []
+    lock = threading.Lock()
+
+    def task(key, i):
+        with lock:
+            running[key] += 1
+            if running[key] > 1:
+                overlaps.append(key)
+        time.sleep(random.uniform(0, 0.002))
+        with lock:
+            seen[key].append(i)
+            running[key] -= 1
+
+    for i in range(30):
+        for key in ("a", "b", "c", "d"):
+            keyed.submit(key, task, key, i)
+    wait_idle(keyed)
+    assert overlaps == []
+    assert all(seen[key] == list(range(30)) for key in ("a", "b", "c", "d"))
+
+
+def test_different_keys_run_in_parallel(pool):
+    keyed = KeyedExecutor(pool)
+    barrier = threading.Barrier(2, timeout=2)
+    results = []
+    for key in ("a", "b"):
+        # Si las claves se serializaran, la barrera vencería
+        keyed.submit(key, lambda: results.append(barrier.wait()))
+    wait_idle(keyed)
+    assert sorted(results) == [0, 1]
+
+
+def test_a_failing_task_does_not_block_the_key(pool):
+    keyed = KeyedExecutor(pool)
+    seen = []
+    keyed.submit("a", lambda: 1 / 0)
+    keyed.submit("a", seen.append, "después")
+    wait_idle(keyed)
+    assert seen == ["después"]
+
+
+def test_per_key_limit(pool):
+    keyed = KeyedExecutor(pool, max_per_key=2)
+    release = threading.Event()
+    keyed.submit("a", release.wait, 2)
+    keyed.submit("a", lambda: None)
+    with pytest.raises(QueueFullError):
+        keyed.submit("a", lambda: None)
+    # Otra clave no se ve afectada
+    keyed.submit("b", lambda: None)
+    release.set()
+    wait_idle(keyed)
+    assert keyed.stats()["rejected_per_key"] == 1
+
+
+def test_full_pool_rejects_without_leaving_the_key_stuck():
+    pool = BoundedExecutor(workers=1, queue_size=1, name="tiny")
+    keyed = KeyedExecutor(pool)
+    release = threading.Event()
+    started = threading.Event()
+    keyed.submit("a", lambda: (started.set(), release.wait(2)))
+    started.wait(2)
+    keyed.submit("b", lambda: None)  # ocupa el único lugar de la cola
+    with pytest.raises(QueueFullError):
+        keyed.submit("c", lambda: None)
+    release.set()
+    wait_idle(keyed)
+    seen = []
+    keyed.submit("c", seen.append, 1)
+    wait_idle(keyed)
+    assert seen == [1]
+    pool.shutdown(timeout=2)
+
+
+def test_shutdown_drains_pending_tasks():
+    pool = BoundedExecutor(workers=1, queue_size=10, name="drain")
+    seen = []
+    for i in range(5):
+        pool.submit(seen.append, i)
+    pool.shutdown(drain=True, timeout=2)
+    assert seen == [0, 1, 2, 3, 4]
+    with pytest.raises(QueueFullError):
+        pool.submit(seen.append, 5)
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from app.services.graph_client import GraphAPIError, GraphClient
+
+
+def response(status: int, body: dict | None = None, headers: dict | None = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body or {}).encode()
+    resp.headers.update(headers or {})
+    return resp
+
+
+def refused() -> requests.ConnectionError:
+    reason = NewConnectionError(None, "Connection refused")
+    return requests.ConnectionError(MaxRetryError(None, "https://graph.facebook.com", reason=reason))
+
+
+def error(status: int, code: int | None = None) -> requests.Response:
+    return response(status, {"error": {"code": code, "message": "boom"}})
+
+
+OK = response(200, {"messages": [{"id": "wamid.1"}]})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = GraphClient("token", "123", max_retries=3, backoff_base=0)
+    client.calls = []
+
+    def fake_request(method, url, **kwargs):
+        outcome = client.script.pop(0)
+        client.calls.append(method)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(client.session, "request", fake_request)
+    monkeypatch.setattr("app.services.graph_client.time.sleep", lambda s: None)
+    return client
+
+
+@pytest.mark.parametrize("first", [
+    error(503),
+    error(500),
+    requests.ReadTimeout("read timed out"),
+    requests.ConnectionError("connection reset"),
+])
+def test_get_is_retried_on_transient_errors(client, first):
+    client.script = [first, OK]
+    assert client.me() == OK.json()
+    assert client.calls == ["GET", "GET"]
+    assert client.retries == 1
+
+
+@pytest.mark.parametrize("first", [
+    error(503),
+    error(500),
+    requests.ReadTimeout("read timed out"),
+    requests.ConnectionError("connection reset"),
+])
+def test_post_is_not_retried_when_meta_may_have_processed_it(client, first):
+    # Un reintento podría entregar el mensaje dos veces
+    client.script = [first, OK]
+    with pytest.raises((GraphAPIError, requests.RequestException)):
+        client.send_message({"to": "598991"})
+    assert client.calls == ["POST"]
+
+
+@pytest.mark.parametrize("first", [
+    error(429),
+    error(400, code=131056),  # pair rate limit
+    error(400, code=80007),
+    requests.ConnectTimeout("connect timed out"),
+    refused(),
+])
+def test_post_is_retried_when_meta_did_not_process_it(client, first):
+    client.script = [first, OK]
+    assert client.send_message({"to": "598991"}) == OK.json()
+    assert client.calls == ["POST", "POST"]
+
+
+def test_throttling_is_counted(client):
+    client.script = [error(429), error(400, code=130429), OK]
+    client.send_message({"to": "598991"})
+    assert client.stats() == {"retries": 2, "throttled": 2}
+
+
+def test_client_errors_are_not_retried(client):
+    client.script = [error(400, code=100), OK]
+    with pytest.raises(GraphAPIError) as exc:
+        client.me()
+    assert exc.value.status == 400 and exc.value.code == 100
+    assert client.calls == ["GET"]
+
+
+def test_gives_up_after_max_retries(client):
+    client.script = [error(503)] * 4 + [OK]
+    with pytest.raises(GraphAPIError):
+        client.me()
+    assert len(client.calls) == 4
+
+
+def test_backoff_honours_retry_after_up_to_the_cap():
+    client = GraphClient("token", "123", backoff_max=5)
+    assert client._backoff(0, "2") == 2
+    assert client._backoff(0, "60") == 5
+    assert 0 <= client._backoff(10, "no-es-un-numero") <= 5
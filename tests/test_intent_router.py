@@ -0,0 +1,24 @@
+import pytest
+
+from app.services.intent_router import IntentRouter, ROUTE_LLM
+from benchmarks.intent_router_bench import load_corpus
+
+router = IntentRouter()
+
+
+@pytest.mark.parametrize("sample", load_corpus(), ids=lambda s: s["text"])
+def test_corpus(sample):
+    assert router.route(sample["text"]).intent == sample["intent"]
+
+
+@pytest.mark.parametrize("text", [
+    "que tengo en la agenda?",
+    "como fue la reunion de ayer?",
+    "abren a las 9?",
+    "cerramos a las 18:30 hoy?",
+    "el 3/11 a las 10",
+])
+def test_date_or_time_alone_does_not_force_create_event(text):
+    match = router.route(text)
+    assert match.intent == "fallback"
+    assert match.route == ROUTE_LLM and match.target is None
@@ -0,0 +1,106 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from app.services.llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailableError
+
+# Las excepciones de openai sólo leen estos atributos de la request/response HTTP
+REQUEST = SimpleNamespace(method="POST", url="https://api.openai.com/v1/chat/completions")
+
+
+def status_error(cls, code):
+    response = SimpleNamespace(status_code=code, request=REQUEST, headers={})
+    return cls(f"HTTP {code}", response=response, body=None)
+
+
+class FakeClient:
+    """chat.completions.create que ejecuta, en orden, las acciones de `script`."""
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, timeout=None, **kwargs):
+        with self._lock:
+            action = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+        delay, result = action
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.mark.parametrize("error", [
+    status_error(openai.BadRequestError, 400),
+    status_error(openai.AuthenticationError, 401),
+    status_error(openai.UnprocessableEntityError, 422),
+])
+def test_client_errors_do_not_open_the_breaker(error):
+    gateway = LLMGateway(failure_threshold=2)
+    client = FakeClient((0, error))
+    for _ in range(5):
+        with pytest.raises(type(error)):
+            gateway.create(client, model="m")
+    assert gateway.breaker.state == "closed"
+    assert client.calls == 5
+
+
+@pytest.mark.parametrize("error", [
+    status_error(openai.RateLimitError, 429),
+    status_error(openai.InternalServerError, 500),
+    openai.APITimeoutError(request=REQUEST),
+    openai.APIConnectionError(request=REQUEST),
+])
+def test_provider_failures_open_the_breaker(error):
+    gateway = LLMGateway(failure_threshold=2)
+    client = FakeClient((0, error))
+    for _ in range(2):
+        with pytest.raises(type(error)):
+            gateway.create(client, model="m")
+    with pytest.raises(LLMUnavailableError):
+        gateway.create(client, model="m")
+    assert gateway.breaker.state == "open"
+    assert client.calls == 2
+
+
+def test_deadline_counts_as_a_failure():
+    gateway = LLMGateway(failure_threshold=1)
+    with pytest.raises(LLMUnavailableError):
+        gateway.create(FakeClient((0.3, "tarde")), timeout=0.05, model="m")
+    assert gateway.breaker.state == "open"
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_client_error_on_the_probe_frees_it_for_the_next_call():
+    gateway = LLMGateway(failure_threshold=1, reset_timeout=0.01)
+    gateway.breaker.record_failure()
+    time.sleep(0.02)
+    with pytest.raises(openai.BadRequestError):
+        gateway.create(FakeClient((0, status_error(openai.BadRequestError, 400))), model="m")
+    assert gateway.create(FakeClient((0, "ok")), model="m") == "ok"
+    assert gateway.breaker.state == "closed"
+
+
+def test_hedge_fires_past_p95_and_the_fast_copy_wins():
+    gateway = LLMGateway(hedge=True, hedge_min_samples=1)
+    # p95 holgado: la request original ya llegó al cliente cuando sale el hedge
+    gateway.histogram("m").observe(100)
+    client = FakeClient((1.0, "lenta"), (0, "rápida"))
+    assert gateway.create(client, model="m") == "rápida"
+    assert gateway.stats()["hedges_fired"] == 1
+    assert gateway.stats()["hedges_won"] == 1
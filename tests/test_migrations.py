@@ -0,0 +1,127 @@
+import sqlite3
+
+import pytest
+
+from app.services import migrations
+from app.services.db import connect
+from app.services.migrations import current_version, migrate
+
+LATEST = max(version for version, _, _ in migrations.MIGRATIONS)
+
+# Esquema que creaba el init_db.py histórico (sin FK ni índices, fechas en cualquier formato)
+LEGACY_SCHEMA = """
+CREATE TABLE customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    phone TEXT NOT NULL UNIQUE
+);
+CREATE TABLE eventos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    titulo TEXT NOT NULL,
+    date TEXT NOT NULL,
+    customer_id INTEGER NOT NULL
+);
+"""
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "threads_db.sqlite")
+
+
+@pytest.fixture
+def legacy_db(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO customers (id, name, phone) VALUES (?, ?, ?)",
+                     [(1, "Ana", "598991"), (2, "Juan", "598992")])
+    conn.executemany(
+        "INSERT INTO eventos (id, titulo, date, customer_id) VALUES (?, ?, ?, ?)",
+        [
+            (1, "dentista", "2026-11-03T10:00", 1),
+            (2, "médico", "04/07/2027 09:15", 2),
+            (3, "ya canónico", "2026-12-01 08:00:00", 1),
+            (4, "fecha rota", "el martes", 2),
+            (5, "sin cliente", "2026-11-05 10:00", 99),
+            (9, "borrado", "2026-11-06 10:00", 1),
+        ],
+    )
+    # El id 9 se borró: su id no debe volver a usarse (jobs reminder_event_{id})
+    conn.execute("DELETE FROM eventos WHERE id = 9")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def read(db_path, sql, params=()):
+    conn = connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_empty_database_is_migrated_to_the_latest_version(db_path):
+    assert migrate(db_path) == list(range(1, LATEST + 1))
+    conn = connect(db_path)
+    assert current_version(conn) == LATEST
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_eventos_date", "idx_eventos_customer_id"} <= indexes
+    with pytest.raises(sqlite3.IntegrityError):
+        with conn:
+            conn.execute("INSERT INTO eventos (titulo, date, customer_id) VALUES ('x', '2026-01-01 00:00:00', 1)")
+    conn.close()
+
+
+def test_legacy_database_keeps_its_data(legacy_db):
+    assert migrate(legacy_db) == [1, 2, 3]
+    rows = read(legacy_db, "SELECT id, date, customer_id FROM eventos ORDER BY id")
+    assert [tuple(r) for r in rows] == [
+        (1, "2026-11-03 10:00:00", 1),
+        (2, "2027-07-04 09:15:00", 2),
+        (3, "2026-12-01 08:00:00", 1),
+        (4, "el martes", 2),  # no reconocida: se deja como estaba
+    ]
+    orphans = read(legacy_db, "SELECT id, customer_id FROM eventos_orphans")
+    assert [tuple(r) for r in orphans] == [(5, 99)]
+
+
+def test_autoincrement_counter_survives_the_table_rebuild(legacy_db):
+    migrate(legacy_db)
+    conn = connect(legacy_db)
+    with conn:
+        cur = conn.execute("INSERT INTO eventos (titulo, date, customer_id) VALUES ('nuevo', '2026-11-07 10:00:00', 1)")
+    conn.close()
+    assert cur.lastrowid == 10
+
+
+def test_deleting_a_customer_cascades_to_its_events(legacy_db):
+    migrate(legacy_db)
+    conn = connect(legacy_db)
+    with conn:
+        conn.execute("DELETE FROM customers WHERE id = 1")
+    conn.close()
+    assert [r[0] for r in read(legacy_db, "SELECT id FROM eventos ORDER BY id")] == [2, 4]
+
+
+def test_migrate_is_idempotent(legacy_db):
+    migrate(legacy_db)
+    before = read(legacy_db, "SELECT * FROM eventos ORDER BY id")
+    assert migrate(legacy_db) == []
+    assert read(legacy_db, "SELECT * FROM eventos ORDER BY id") == before
+
+
+def test_failed_migration_rolls_back_with_its_version(db_path, monkeypatch):
+    migrate(db_path)
+
+    def broken(conn):
+        conn.execute("CREATE TABLE a_medias (id INTEGER)")
+        raise RuntimeError("falla a mitad de camino")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [(LATEST + 1, "rota", broken)])
+    with pytest.raises(RuntimeError):
+        migrate(db_path)
+    conn = connect(db_path)
+    assert current_version(conn) == LATEST
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'a_medias'").fetchone() is None
+    conn.close()
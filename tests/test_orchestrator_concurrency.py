@@ -0,0 +1,82 @@
+"""
+Estrés de concurrencia del Orchestrator: muchos usuarios piden crear un evento
+a la vez sobre una misma instancia y cada evento debe quedar en su propio cliente.
+"""
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from app.services import db
+from app.services.migrations import migrate
+from app.services.orchestrator import Orchestrator
+from app.services.scheduler_service import init_scheduler, scheduler
+from app.utils.datetime_utils import format_db_datetime, local_now
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 60
+THREADS = 16
+
+
+class FakeCompletions:
+    """Imita chat.completions.create: siempre pide create_event para el teléfono del mensaje."""
+    def __init__(self, date: str, jitter: float = 0.005):
+        self.date = date
+        self.jitter = jitter
+
+    def create(self, messages, **kwargs):
+        # Latencia aleatoria para que los threads se intercalen dentro del orchestrator
+        time.sleep(random.uniform(0, self.jitter))
+        phone = messages[-1]["content"].rsplit(" ", 1)[-1]
+        call = SimpleNamespace(
+            id=f"call_{phone}",
+            type="function",
+            function=SimpleNamespace(
+                name="create_event",
+                arguments=json.dumps({"date": self.date, "title": f"cita {phone}"}),
+            ),
+        )
+        message = SimpleNamespace(content=None, tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # init_db cambia la BD por defecto del módulo: se restaura al terminar
+    monkeypatch.setattr(db, "_db_path", db._db_path)
+    db_path = str(tmp_path / "threads_db.sqlite")
+    migrate(db_path)
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, EVENT_ADVANCE=timedelta(minutes=1))
+    db.init_db(app)
+    init_scheduler(app)
+    yield app
+    scheduler.remove_all_jobs()
+
+
+def test_concurrent_events_land_on_their_own_customer(app):
+    date = format_db_datetime(local_now() + timedelta(days=1))
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(date)))
+    orchestrator = Orchestrator(client, catalog_path=os.path.join(ROOT, "functions_catalog.json"))
+    phones = [f"5989{i:07d}" for i in range(USERS)]
+
+    def one(phone):
+        with app.app_context():
+            return orchestrator.handle_message(f"recordame la cita del cliente {phone}", phone)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(one, phones))
+
+    rows = db.get_connection(app.config["DATABASE_PATH"]).execute(
+        "SELECT e.titulo, c.phone FROM eventos e JOIN customers c ON c.id = e.customer_id"
+    ).fetchall()
+    misassigned = [(title, phone) for title, phone in rows if title != f"cita {phone}"]
+    assert misassigned == []
+    assert len(rows) == USERS
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+from app.services.executor import QueueFullError
+from app.services.outbound import (
+    PRIORITY_INTERACTIVE, PRIORITY_REMINDER, OutboundDispatcher, TokenBucket,
+)
+
+FAST = dict(rate_per_number=1e6, burst_per_number=1e6, rate_per_recipient=1e6, burst_per_recipient=1e6)
+
+
+def dispatcher(send_fn, **kwargs):
+    return OutboundDispatcher(send_fn, "123", **{"workers": 4, **FAST, **kwargs})
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert 0.05 < bucket.try_acquire() <= 0.1
+
+
+def test_interactive_replies_overtake_queued_reminders():
+    sent = []
+    lock = threading.Lock()
+
+    def send(payload):
+        with lock:
+            sent.append(payload["text"])
+
+    # Un token por número cada 50 ms: la cola se arma mientras el scheduler espera
+    out = dispatcher(send, workers=1, rate_per_number=20, burst_per_number=1)
+    out.dispatch({"to": "a", "text": "primero"})
+    out.dispatch({"to": "b", "text": "relleno"})
+    time.sleep(0.01)
+    futures = [
+        out.dispatch({"to": "c", "text": "recordatorio 1"}, PRIORITY_REMINDER),
+        out.dispatch({"to": "d", "text": "recordatorio 2"}, PRIORITY_REMINDER),
+        out.dispatch({"to": "e", "text": "respuesta 1"}, PRIORITY_INTERACTIVE),
+        out.dispatch({"to": "f", "text": "respuesta 2"}, PRIORITY_INTERACTIVE),
+    ]
+    for future in futures:
+        future.result(timeout=2)
+    out.shutdown(timeout=2)
+    assert sent[2:] == ["respuesta 1", "respuesta 2", "recordatorio 1", "recordatorio 2"]
+
+
+def test_messages_to_a_recipient_are_sent_in_order_one_at_a_time():
+    seen = defaultdict(list)
+    in_flight = defaultdict(int)
+    overlaps = []
+    lock = threading.Lock()
+
+    def send(payload):
+        with lock:
+            in_flight[payload["to"]] += 1
+            if in_flight[payload["to"]] > 1:
+                overlaps.append(payload["to"])
+        time.sleep(0.001)
+        with lock:
+            in_flight[payload["to"]] -= 1
+            seen[payload["to"]].append(payload["i"])
+
+    out = dispatcher(send, workers=8)
+    futures = [out.dispatch({"to": to, "i": i}) for i in range(25) for to in ("a", "b", "c")]
+    for future in futures:
+        future.result(timeout=5)
+    out.shutdown(timeout=2)
+    assert overlaps == []
+    assert all(seen[to] == list(range(25)) for to in ("a", "b", "c"))
+
+
+def test_per_recipient_rate_limit():
+    out = dispatcher(lambda payload: None, rate_per_recipient=20, burst_per_recipient=1)
+    started = time.monotonic()
+    for future in [out.dispatch({"to": "a", "i": i}) for i in range(5)]:
+        future.result(timeout=2)
+    # 1 de ráfaga + 4 a 20 msg/s
+    assert time.monotonic() - started >= 0.18
+    out.shutdown(timeout=2)
+
+
+def test_full_queue_rejects():
+    release = threading.Event()
+    out = dispatcher(lambda payload: release.wait(2), queue_size=2)
+    out.dispatch({"to": "a"})
+    out.dispatch({"to": "b"})
+    with pytest.raises(QueueFullError):
+        out.dispatch({"to": "c"})
+    release.set()
+    out.shutdown(timeout=2)
+
+
+def test_results_errors_and_counters():
+    def send(payload):
+        if payload["i"] % 3 == 0:
+            raise RuntimeError("Graph 400")
+        return {"messages": [{"id": payload["i"]}]}
+
+    out = dispatcher(send, workers=8)
+    futures = [out.dispatch({"to": str(i % 7), "i": i}) for i in range(300)]
+    errors = 0
+    for i, future in enumerate(futures):
+        if i % 3 == 0:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+            errors += 1
+        else:
+            assert future.result(timeout=5) == {"messages": [{"id": i}]}
+    out.shutdown(timeout=2)
+    stats = out.stats()
+    assert (stats["sent"], stats["failed"], stats["pending"]) == (300 - errors, errors, 0)
@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from app.services import outbox
+from app.services.db import get_connection
+from app.services.executor import QueueFullError
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.futures = []
+        self.full = False
+
+    def __call__(self, payload, priority):
+        if self.full:
+            raise QueueFullError("outbound: cola llena (0)")
+        future = Future()
+        self.futures.append((payload, future))
+        return future
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = get_connection(str(tmp_path / "outbox.sqlite"))
+    with conn:
+        outbox.ensure_schema(conn)
+    return conn
+
+
+@pytest.fixture
+def dispatcher():
+    return FakeDispatcher()
+
+
+def make_flusher(conn, dispatcher, **kwargs):
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    flusher = outbox.OutboxFlusher(db_path, dispatcher, interval=0.01, **kwargs)
+    # Sin thread de fondo: el test maneja flush_once a mano
+    flusher.shutdown()
+    return flusher
+
+
+def enqueue(conn, text="hola"):
+    with conn:
+        return outbox.enqueue(conn, {"to": "598991", "text": {"body": text}})
+
+
+def row(conn, outbox_id):
+    return conn.execute(
+        "SELECT status, attempts, locked_until FROM outbox WHERE id = ?", (outbox_id,)
+    ).fetchone()
+
+
+def test_row_is_sent_once_and_marked_sent(conn, dispatcher):
+    flusher = make_flusher(conn, dispatcher)
+    outbox_id = enqueue(conn)
+
+    assert flusher.flush_once(conn) == 1
+    # En vuelo: no se vuelve a reclamar aunque el envío tarde
+    assert flusher.flush_once(conn) == 0
+    assert len(dispatcher.futures) == 1
+
+    dispatcher.futures[0][1].set_result({"messages": []})
+    flusher.flush_once(conn)
+    assert row(conn, outbox_id)["status"] == "sent"
+    assert flusher.stats()["sent"] == 1
+
+
+def test_lease_is_renewed_while_the_send_is_in_flight(conn, dispatcher):
+    flusher = make_flusher(conn, dispatcher)
+    flusher.LEASE = 0.05
+    enqueue(conn)
+
+    flusher.flush_once(conn)
+    time.sleep(0.1)
+    flusher.flush_once(conn)
+    assert len(dispatcher.futures) == 1
+
+
+def test_failed_send_is_retried_then_dead_lettered(conn, dispatcher):
+    flusher = make_flusher(conn, dispatcher, max_attempts=2)
+    outbox_id = enqueue(conn)
+
+    flusher.flush_once(conn)
+    dispatcher.futures[0][1].set_exception(RuntimeError("500"))
+    flusher.flush_once(conn)
+    status, attempts, locked_until = row(conn, outbox_id)
+    assert (status, attempts, locked_until) == ("pending", 1, None)
+
+    conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (outbox_id,))
+    conn.commit()
+    flusher.flush_once(conn)
+    dispatcher.futures[1][1].set_exception(RuntimeError("500"))
+    flusher.flush_once(conn)
+    assert row(conn, outbox_id)["status"] == "dead"
+    assert flusher.stats()["dead"] == 1
+
+
+def test_full_dispatcher_defers_without_counting_an_attempt(conn, dispatcher):
+    flusher = make_flusher(conn, dispatcher, max_attempts=1)
+    ids = [enqueue(conn, f"m{i}") for i in range(3)]
+
+    dispatcher.full = True
+    for _ in range(5):
+        assert flusher.flush_once(conn) == 0
+        conn.execute("UPDATE outbox SET next_attempt_at = 0")
+        conn.commit()
+    for outbox_id in ids:
+        assert tuple(row(conn, outbox_id)) == ("pending", 0, None)
+    assert flusher.stats()["deferred"] == 15
+
+    dispatcher.full = False
+    assert flusher.flush_once(conn) == 3
+    for _, future in dispatcher.futures:
+        future.set_result({})
+    flusher.flush_once(conn)
+    assert all(row(conn, outbox_id)["status"] == "sent" for outbox_id in ids)
@@ -0,0 +1,92 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import db, response_cache
+from app.services.migrations import migrate
+from app.services.orchestrator import Orchestrator
+from app.services.response_cache import ResponseCache, is_time_sensitive
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_normalized_texts_share_an_entry():
+    cache = ResponseCache()
+    cache.set("v1", "¿Qué podés hacer?", "respuesta")
+    assert cache.get("v1", "que podes   hacer") == "respuesta"
+    assert cache.get("v2", "que podes hacer") is None
+    assert cache.get("v1", "¿?") is None
+
+
+def test_entries_expire():
+    cache = ResponseCache(ttl=0.05)
+    cache.set("v1", "hola", "respuesta")
+    time.sleep(0.1)
+    assert cache.get("v1", "hola") is None
+
+
+def test_persistent_level_survives_a_restart(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    ResponseCache(db_path=db_path).set("v1", "hola", "respuesta")
+    ResponseCache(db_path=db_path).set("v1", "vencida", "vieja", ttl=-1)
+    restarted = ResponseCache(db_path=db_path)
+    assert restarted.get("v1", "hola") == "respuesta"
+    assert restarted.get("v1", "vencida") is None
+    assert restarted.stats()["disk_hits"] == 1
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("¿Qué día es hoy?", True),
+    ("qué hora es", True),
+    ("¿Llueve?", True),
+    ("¿Cómo está el clima?", True),
+    ("¿Qué fecha es pasado mañana?", True),
+    ("¿Cuánto falta para fin de mes?", True),
+    ("¿Qué podés hacer?", False),
+    ("contame un chiste", False),
+    ("¿Cuál es la capital de Francia?", False),
+])
+def test_time_sensitive_questions(text, expected):
+    assert is_time_sensitive(text) is expected
+
+
+class RecordingCompletions:
+    def __init__(self):
+        self.prompts = []
+
+    def create(self, messages, **kwargs):
+        self.prompts.append(json.dumps(messages, ensure_ascii=False))
+        message = SimpleNamespace(content=f"respuesta {len(self.prompts)}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def orchestrator(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "threads_db.sqlite")
+    migrate(db_path)
+    monkeypatch.setattr(db, "_db_path", db_path)
+    monkeypatch.setattr(response_cache, "_cache", ResponseCache())
+    completions = RecordingCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    orchestrator = Orchestrator(client, catalog_path=os.path.join(ROOT, "functions_catalog.json"))
+    orchestrator.completions = completions
+    return orchestrator
+
+
+def test_cacheable_answer_is_shared_without_customer_data(orchestrator):
+    first = orchestrator.handle_message("contame un chiste", "598991", "Ana Pérez")
+    second = orchestrator.handle_message("Contame un chiste!", "598992", "Juan Gómez")
+    assert first == second
+    assert len(orchestrator.completions.prompts) == 1
+    assert "Ana Pérez" not in orchestrator.completions.prompts[0]
+
+
+def test_time_sensitive_answer_is_never_cached(orchestrator):
+    orchestrator.handle_message("¿qué hora es?", "598991", "Ana Pérez")
+    orchestrator.handle_message("¿qué hora es?", "598992", "Juan Gómez")
+    assert len(orchestrator.completions.prompts) == 2
+    # Lo que no se cachea sí lleva los datos del cliente
+    assert "Juan Gómez" in orchestrator.completions.prompts[1]
@@ -0,0 +1,41 @@
+import logging
+import threading
+
+import pytest
+
+from app.config import configure_logging
+from app.utils import tracing
+
+
+@pytest.fixture
+def root_logging():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers:
+        if handler not in handlers:
+            handler.close()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_log_lines_carry_the_trace_id(root_logging, capsys):
+    # Un módulo que configure logging al importarse no debe pisar el formato
+    logging.basicConfig(level=logging.INFO)
+    configure_logging()
+    with tracing.trace("abc123def4567890"), tracing.span("test"):
+        logging.getLogger("app.test").info("dentro del trace")
+    logging.getLogger("app.test").info("fuera del trace")
+
+    inside, outside = capsys.readouterr().out.splitlines()[-2:]
+    assert "[abc123def4567890] dentro del trace" in inside
+    assert "[-] fuera del trace" in outside
+
+
+def test_bind_propagates_the_trace_id_to_other_threads():
+    seen = []
+    with tracing.trace("feedbeef00000000"):
+        worker = threading.Thread(target=tracing.bind(lambda: seen.append(tracing.current_trace_id())))
+    worker.start()
+    worker.join()
+    assert seen == ["feedbeef00000000"]